@@ -0,0 +1,125 @@
+"""
+Throughput benchmark of the credit document pipeline on a synthetic corpus.
+Reports per-stage latency percentiles, documents per second of a full collector run and peak RSS.
+
+    python -m benchmarks.bench_collect --documents 200 --max-pages 30 --noise 0.1 --workers 1 4
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+from typing import Dict, List
+
+import credit.company as cp
+import credit.credit_collector as cc
+import credit.credit_document as cd
+import credit.credit_request as cr
+from benchmarks import synthetic_reports as sr
+
+STAGES = ["open", "locate_sections", "locate_fields", "company_parse", "request_parse"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Get a percentile of a list of values, by nearest rank
+    :param values: values
+    :param q: percentile, between 0 and 100
+    :return: percentile value, nan if values is empty
+    """
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of the process and of its terminated children, in MB
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in kB on linux
+    return max(usage, children) / 1024.0
+
+
+def bench_stages(path: str, names: List[str]) -> Dict[str, List[float]]:
+    """
+    Time each stage of the pipeline on each document
+    :param path: corpus directory
+    :param names: document file names
+    :return: dict of stage: list of latencies in seconds
+    """
+    latencies = {stage: [] for stage in STAGES}
+    for name in names:
+        t0 = time.perf_counter()
+        docu = cd.CreditDocument(path=path, name=name)
+        t1 = time.perf_counter()
+        # fields are only read from these sections: the pages after them are not extracted
+        docu.locate_sections(["Summary", "Identity"])
+        t2 = time.perf_counter()
+        for section_name, section in [("Summary", docu.summary_section), ("Identity", docu.identity_section)]:
+            for field_name in section.fields.keys():
+                docu.locate_field_in_section(section_name, field_name)
+        t3 = time.perf_counter()
+        company = cp.Company()
+        company.link_to_document(docu)
+        company.detect_document_language()
+        company.fill_text_from_credit_document()
+        company.parse()
+        t4 = time.perf_counter()
+        request = cr.CreditRequest(req_id=name.split(".")[0])
+        request.link_to_company(document=docu, cp=company)
+        request.fill_text_from_credit_document()
+        request.parse()
+        t5 = time.perf_counter()
+        for stage, latency in zip(STAGES, [t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4]):
+            latencies[stage].append(latency)
+    return latencies
+
+
+def bench_collect(path: str, names: List[str], workers: int) -> float:
+    """
+    Time a full collector run
+    :param path: corpus directory
+    :param names: document file names, the documents of the corpus that are collected
+    :param workers: number of worker processes
+    :return: documents per second
+    """
+    collector = cc.CreditCollector(path)
+    start = time.perf_counter()
+    # the documents timed by stage are collected, whatever other files the corpus directory holds
+    collector.collect_objects(doclist=names, types_to_collect=3, workers=workers)
+    return len(collector.document_table) / (time.perf_counter() - start)
+
+
+def report(latencies: Dict[str, List[float]], throughputs: Dict[int, float]):
+    print(f"{'stage':<18}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'total s':>10}")
+    for stage, values in latencies.items():
+        print(f"{stage:<18}{1000 * percentile(values, 50):>10.2f}{1000 * percentile(values, 90):>10.2f}"
+              f"{1000 * percentile(values, 99):>10.2f}{sum(values):>10.2f}")
+    for workers, docs_per_second in throughputs.items():
+        print(f"collect_objects, {workers} worker(s): {docs_per_second:.1f} docs/s")
+    print(f"peak RSS: {peak_rss_mb():.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the credit document pipeline")
+    parser.add_argument("--corpus", default="", help="corpus directory, a synthetic corpus is generated if empty")
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--min-pages", type=int, default=2)
+    parser.add_argument("--max-pages", type=int, default=12)
+    parser.add_argument("--noise", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        corpus = args.corpus
+        if corpus == "":
+            corpus = tmpdir
+            sr.generate_corpus(corpus, args.documents, (args.min_pages, args.max_pages), args.noise, args.seed)
+        names = sorted(n for n in os.listdir(corpus) if n.endswith(".pdf"))[:args.documents]
+        stage_latencies = bench_stages(corpus, names)
+        collect_throughputs = {w: bench_collect(corpus, names, w) for w in args.workers}
+        report(stage_latencies, collect_throughputs)
@@ -0,0 +1,236 @@
+"""
+Generator of synthetic credit report pdfs, laid out like the "Etude client" reports
+(summary, identity, bank, key financials, ... sections), with configurable page counts and noise.
+The pdfs are written directly, with the standard Helvetica font, and contain no real customer data.
+"""
+import argparse
+import os
+import random
+from typing import List, Tuple
+
+TEMPLATES = ["Etude client", "Etude garantie", "Business report"]
+LANGUAGE_MARKERS = {"FR": "Société", "PT": "Sociedade", "EN": "Company"}
+CITIES = [("75002", "Paris"), ("69003", "Lyon"), ("13001", "Marseille"), ("31000", "Toulouse"),
+          ("33000", "Bordeaux"), ("59000", "Lille"), ("44000", "Nantes"), ("67000", "Strasbourg")]
+LEGAL_FORMS = ["SAS", "SARL", "SA", "EURL", "SASU"]
+ACTIVITIES = ["Commerce de détail en magasin non spécialisé",
+              "Travaux de maçonnerie générale et gros œuvre de bâtiment",
+              "Conseil pour les affaires et autres conseils de gestion",
+              "Transports routiers de fret de proximité",
+              "Fabrication de pièces techniques à base de matières plastiques"]
+ACCENTS = str.maketrans("éèêëàâîïôûùçÉÈÊÀÔœ", "eeeeaaiiouucEEEAOo")
+LINES_PER_PAGE = 48
+
+
+class SyntheticReport(object):
+    """
+    A synthetic credit report: a list of pages, each page a list of text lines
+    """
+
+    def __init__(self,
+                 seed: int,
+                 nb_pages: int = 6,
+                 noise: float = 0.0,
+                 language: str = "",
+                 template: str = ""):
+        """
+        :param seed: random seed, a given seed always gives the same report
+        :param nb_pages: minimal number of pages of the report, sections are padded with table rows
+        :param noise: between 0 and 1, probability of layout accidents: extra spaces inside words,
+                      lines split in two, accents dropped
+        :param language: "FR", "PT" or "EN", drawn at random if empty
+        :param template: one of TEMPLATES, drawn at random if empty
+        """
+        self._rng = random.Random(seed)
+        self._seed = seed
+        self._noise = noise
+        self._language = language if language else self._rng.choice(["FR", "FR", "FR", "PT", "EN"])
+        self._template = template if template else self._rng.choice(TEMPLATES)
+        self._pages = self._layout(self._sections(), max(1, nb_pages))
+
+    @property
+    def pages(self) -> List[List[str]]:
+        return self._pages
+
+    @property
+    def language(self):
+        return self._language
+
+    @property
+    def template(self):
+        return self._template
+
+    def _date(self, first_year: int, last_year: int) -> str:
+        rng = self._rng
+        return f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(first_year, last_year)}"
+
+    def _amount(self) -> str:
+        return f"{self._rng.randint(5, 950)} K EUR"
+
+    def _table_rows(self, nb_rows: int) -> List[str]:
+        rng = self._rng
+        labels = ["Chiffre d'affaires", "Résultat net", "Excédent brut d'exploitation", "Capitaux propres",
+                  "Dettes financières", "Stocks", "Créances clients", "Dettes fournisseurs"]
+        return [f"{rng.choice(labels)} {rng.randint(-500, 5000)} {rng.randint(-500, 5000)} "
+                f"{rng.randint(-500, 5000)}" for _ in range(nb_rows)]
+
+    def _sections(self) -> List[List[str]]:
+        rng = self._rng
+        zip_code, city = rng.choice(CITIES)
+        marker = LANGUAGE_MARKERS[self._language]
+        siren = "".join(rng.choice("0123456789") for _ in range(9))
+        if self._language == "PT":
+            requested = [f"Garantia pedida : {self._amount()}", f"Garantia accordada : {self._amount()}"]
+        else:
+            requested = [f"Garantie demandée - durée : {self._amount()} - {rng.choice([6, 12, 24])} mois",
+                         f"Garantie accordée : {self._amount()}"]
+        summary = [self._template,
+                   f"Date : {self._date(2018, 2023)}"] + requested + \
+                  [f"Date début : {self._date(2018, 2020)}",
+                   f"Date fin : {self._date(2021, 2025)}"]
+        identity = ["Identité",
+                    f"Raison sociale : {marker} {rng.choice(['Durand', 'Martin', 'Lefebvre', 'Moreau'])} "
+                    f"{rng.choice(['Industries', 'Services', 'Distribution', 'Bâtiment'])}",
+                    f"Siren : {siren}",
+                    f"N° TVA : FR{rng.randint(10, 99)}{siren}",
+                    f"Date de création : {self._date(1950, 2015)}",
+                    f"Forme juridique : {rng.choice(LEGAL_FORMS)}",
+                    f"Code APE : {rng.randint(1000, 9999)}{rng.choice('ABCDZ')}",
+                    f"Adresse : {rng.randint(1, 120)} rue de la République",
+                    f"Code postal : {zip_code}",
+                    f"CP, Ville : {zip_code} {city}",
+                    f"Capital social : {self._amount()}",
+                    f"Effectif : {rng.randint(1, 800)}",
+                    f"Activité bancaire : {rng.choice(['normale', 'sensible', 'non renseignée'])}",
+                    f"Dirigeant : {rng.choice(['M.', 'Mme'])} {rng.choice(['Bernard', 'Petit', 'Roux'])}",
+                    "Activité - Modèle économique",
+                    rng.choice(ACTIVITIES)]
+        others = [["Informations bancaires", f"Banques : {rng.choice(['BNP', 'SG', 'LCL', 'CIC'])}",
+                   f"Concours bancaires : {self._amount()}"],
+                  ["Informations financières", "Chiffres clés", "Exercice N N-1 N-2"],
+                  ["BFR", "Besoin en fonds de roulement N N-1 N-2"],
+                  ["Analyse structurelle", "Ratios de structure N N-1 N-2"],
+                  ["Ratios de rotation", "Rotation des stocks N N-1 N-2"],
+                  ["Analyse des postes d'achat", "Achats N N-1 N-2"],
+                  ["Défauts de paiements sociaux et fiscaux", f"Privilèges : {rng.randint(0, 3)}"],
+                  ["Analyse de factures fournisseurs", f"Nombre de factures : {rng.randint(10, 900)}"],
+                  ["Votre expérience de paiement", "Aucun incident"]]
+        return [summary + identity] + others
+
+    def _layout(self, sections: List[List[str]], nb_pages: int) -> List[List[str]]:
+        """
+        Lay sections out on pages, padding them with table rows to reach nb_pages, then add noise
+        """
+        nb_lines = sum(len(section) for section in sections)
+        padding = max(0, nb_pages * LINES_PER_PAGE - nb_lines)
+        # the first section stays on the first page, padding goes to the financial sections
+        lines = list(sections[0])
+        padded = sections[1:]
+        for isection, section in enumerate(padded):
+            lines += section
+            lines += self._table_rows(padding // len(padded) + (1 if isection < padding % len(padded) else 0))
+        lines = [noisy for line in lines for noisy in self._add_noise(line)]
+        pages = [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)]
+        return pages
+
+    def _add_noise(self, line: str) -> List[str]:
+        rng = self._rng
+        if self._noise <= 0.0:
+            return [line]
+        if rng.random() < self._noise:
+            line = line.translate(ACCENTS)
+        chars = []
+        for c in line:
+            chars.append(c)
+            if c != " " and rng.random() < self._noise / 4:
+                chars.append(" ")
+        line = "".join(chars)
+        if len(line) > 12 and rng.random() < self._noise / 2:
+            cut = rng.randint(4, len(line) - 4)
+            return [line[:cut], line[cut:]]
+        return [line]
+
+    def to_pdf(self) -> bytes:
+        """
+        Write the report as a pdf document
+        :return: pdf bytes
+        """
+        return write_pdf(self._pages)
+
+
+def _pdf_string(text: str) -> bytes:
+    data = text.encode("cp1252", errors="replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def write_pdf(pages: List[List[str]], font_size: int = 10) -> bytes:
+    """
+    Write a minimal pdf with one Helvetica text block per page
+    :param pages: list of pages, each a list of text lines
+    :param font_size: font size
+    :return: pdf bytes
+    """
+    objects: List[bytes] = [b"", b"",
+                            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    page_ids = []
+    for lines in pages:
+        stream = b"BT /F1 %d Tf %d TL 40 800 Td " % (font_size, font_size + 6)
+        stream += b" ".join(_pdf_string(line) + b" Tj T*" for line in lines) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % i for i in page_ids) + \
+                 b"] /Count %d >>" % len(page_ids)
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for iobj, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % (iobj + 1) + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def generate_corpus(path: str,
+                    nb_documents: int,
+                    pages_range: Tuple[int, int] = (2, 12),
+                    noise: float = 0.0,
+                    seed: int = 0) -> List[str]:
+    """
+    Write a corpus of synthetic reports named like the real ones (Enquete_<number>.pdf)
+    :param path: output directory
+    :param nb_documents: number of reports
+    :param pages_range: minimal and maximal number of pages of a report
+    :param noise: noise level of the reports, see SyntheticReport
+    :param seed: corpus seed
+    :return: list of file names
+    """
+    os.makedirs(path, exist_ok=True)
+    rng = random.Random(seed)
+    names = []
+    for idoc in range(nb_documents):
+        report = SyntheticReport(seed=rng.randrange(2 ** 31),
+                                 nb_pages=rng.randint(pages_range[0], pages_range[1]),
+                                 noise=noise)
+        name = f"Enquete_{100000 + idoc}.pdf"
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(report.to_pdf())
+        names.append(name)
+    return names
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic credit report pdfs")
+    parser.add_argument("path", help="output directory")
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--min-pages", type=int, default=2)
+    parser.add_argument("--max-pages", type=int, default=12)
+    parser.add_argument("--noise", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_corpus(args.path, args.documents, (args.min_pages, args.max_pages), args.noise, args.seed)
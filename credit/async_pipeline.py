@@ -0,0 +1,218 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from . import scheduling as sc
+
+# marks the end of the items of a queue
+_END = object()
+
+
+class PipelineStats(object):
+    """
+    Counts of a pipeline run: items through each stage and time stages spent blocked on a full queue
+    """
+
+    def __init__(self):
+        self.nb_read = 0
+        self.nb_processed = 0
+        self.nb_merged = 0
+        self.nb_written = 0
+        # seconds spent waiting for room in the queue of the next stage, by stage
+        self.blocked: Dict[str, float] = {"read": 0.0, "process": 0.0, "merge": 0.0}
+
+    def to_row(self) -> Dict[str, object]:
+        return {"Nb_read": self.nb_read,
+                "Nb_processed": self.nb_processed,
+                "Nb_merged": self.nb_merged,
+                "Nb_written": self.nb_written,
+                **{f"Blocked_{stage}": seconds for stage, seconds in self.blocked.items()}}
+
+
+async def _put(queue: asyncio.Queue, item: Any, stats: PipelineStats, stage: str):
+    """
+    Put an item in a bounded queue, waiting while it is full: this is how a slow stage slows down the previous ones
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await queue.put(item)
+    stats.blocked[stage] += loop.time() - start
+
+
+async def read_stage(order: sc.ReorderBuffer,
+                     window_open: asyncio.Event,
+                     read: Callable[[str], bytes],
+                     executor: Executor,
+                     out_queue: asyncio.Queue,
+                     stats: PipelineStats):
+    """
+    Read the raw bytes of the documents, in a thread so that the event loop is free while waiting for the disk
+    :param order: dispatch order of the documents
+    :param window_open: event set by the merge when it releases documents, opening the window to the next ones
+    :param read: function reading the bytes of a document from its name
+    :param executor: executor of the reads
+    :param out_queue: queue of (name, bytes)
+    :param stats: counts of the run
+    """
+    loop = asyncio.get_running_loop()
+    while order.nb_to_dispatch > 0:
+        name = order.next_dispatch()
+        if name is None:
+            # every document within the window is read: wait until the first ones are merged
+            window_open.clear()
+            await window_open.wait()
+            continue
+        data = await loop.run_in_executor(executor, read, name)
+        stats.nb_read += 1
+        await _put(out_queue, (name, data), stats, "read")
+    await out_queue.put(_END)
+
+
+async def process_stage(process: Callable[[str, bytes], Any],
+                        executor: Executor,
+                        in_queue: asyncio.Queue,
+                        out_queue: asyncio.Queue,
+                        stats: PipelineStats):
+    """
+    Submit the extraction and parsing of the documents to an executor as they are read.
+    The futures are queued in dispatch order: the queue bounds the number of documents processed ahead of the merge.
+    :param process: function processing a document from its name and bytes
+    :param executor: executor of the processing, usually a process pool
+    :param in_queue: queue of (name, bytes)
+    :param out_queue: queue of (name, future of the processed document)
+    :param stats: counts of the run
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await in_queue.get()
+        if item is _END:
+            break
+        name, data = item
+        future = loop.run_in_executor(executor, process, name, data)
+        await _put(out_queue, (name, future), stats, "process")
+    await out_queue.put(_END)
+
+
+async def merge_stage(merge: Callable[[str, Any], List[Any]],
+                      order: sc.ReorderBuffer,
+                      window_open: asyncio.Event,
+                      in_queue: asyncio.Queue,
+                      out_queue: asyncio.Queue,
+                      stats: PipelineStats,
+                      on_error: Optional[Callable[[str, Exception], Any]] = None):
+    """
+    Merge the processed documents, in listing order, into the records to write:
+    a document processed ahead of an earlier listed one is held back until it is processed
+    :param merge: function giving the records of a processed document, run in the event loop thread
+    :param order: dispatch order of the documents, holding back the documents processed ahead
+    :param window_open: event set when documents are released, opening the window to the next ones
+    :param in_queue: queue of (name, future of the processed document)
+    :param out_queue: queue of lists of records
+    :param stats: counts of the run
+    :param on_error: if given, function giving the processed document of a document whose processing failed,
+                     from its name and error; it may raise the error again to stop the pipeline
+    """
+    while True:
+        item = await in_queue.get()
+        if item is _END:
+            break
+        name, future = item
+        try:
+            processed = await future
+        except Exception as error:
+            if on_error is None:
+                raise
+            processed = on_error(name, error)
+        stats.nb_processed += 1
+        released = order.push(name, (name, processed))
+        if released:
+            window_open.set()
+        for released_name, released_processed in released:
+            records = merge(released_name, released_processed)
+            stats.nb_merged += 1
+            await _put(out_queue, records, stats, "merge")
+    await out_queue.put(_END)
+
+
+async def write_stage(write: Callable[[List[Any]], None],
+                      executor: Executor,
+                      in_queue: asyncio.Queue,
+                      stats: PipelineStats):
+    """
+    Write the records of the documents in a background thread
+    :param write: function writing the records of a document
+    :param executor: executor of the writes, with a single thread so that records are written in order
+    :param in_queue: queue of lists of records
+    :param stats: counts of the run
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        records = await in_queue.get()
+        if records is _END:
+            break
+        await loop.run_in_executor(executor, write, records)
+        stats.nb_written += 1
+
+
+async def run_pipeline(names: Iterable[str],
+                       read: Callable[[str], bytes],
+                       process: Callable[[str, bytes], Any],
+                       merge: Callable[[str, Any], List[Any]],
+                       write: Callable[[List[Any]], None],
+                       read_executor: Executor,
+                       process_executor: Executor,
+                       write_executor: Executor,
+                       queue_size: int = 8,
+                       stats: Optional[PipelineStats] = None,
+                       on_error: Optional[Callable[[str, Exception], Any]] = None,
+                       dispatch_order: Optional[List[str]] = None,
+                       window: int = 0) -> PipelineStats:
+    """
+    Run documents through the read, process, merge and write stages, connected by bounded queues,
+    so that reads and writes overlap with the processing of other documents.
+    If a stage fails, the other stages are cancelled, documents not yet processed are dropped,
+    and the error is raised once all stages are stopped.
+    :param names: names of the documents, in the order they are merged and written
+    :param read: function reading the bytes of a document from its name
+    :param process: function processing a document from its name and bytes
+    :param merge: function giving the records of a processed document
+    :param write: function writing the records of a document
+    :param read_executor: executor of the reads
+    :param process_executor: executor of the processing
+    :param write_executor: single thread executor of the writes
+    :param queue_size: capacity of each queue between stages
+    :param stats: counts of the run, updated as the pipeline runs
+    :param on_error: if given, function giving the processed document of a document whose processing failed,
+                     from its name and error, instead of stopping the pipeline
+    :param dispatch_order: names in the order documents are read and processed, e.g. largest first,
+                           the order of names if None
+    :param window: with a dispatch order, a document is only read once it is less than window documents
+                   past the first one not merged yet, which bounds the number of processed documents held back;
+                   0 for no limit
+    :return: counts of the run
+    """
+    if stats is None:
+        stats = PipelineStats()
+    read_queue = asyncio.Queue(maxsize=queue_size)
+    process_queue = asyncio.Queue(maxsize=queue_size)
+    write_queue = asyncio.Queue(maxsize=queue_size)
+    order = sc.ReorderBuffer(list(names), dispatch_order=dispatch_order, window=window)
+    window_open = asyncio.Event()
+    tasks = [asyncio.ensure_future(read_stage(order, window_open, read, read_executor, read_queue, stats)),
+             asyncio.ensure_future(process_stage(process, process_executor, read_queue, process_queue, stats)),
+             asyncio.ensure_future(merge_stage(merge, order, window_open, process_queue, write_queue, stats,
+                                               on_error)),
+             asyncio.ensure_future(write_stage(write, write_executor, write_queue, stats))]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # processing submitted but not merged yet is cancelled if not started
+        while not process_queue.empty():
+            item = process_queue.get_nowait()
+            if item is not _END:
+                item[1].cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return stats
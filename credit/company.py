@@ -4,9 +4,10 @@ import re
 
 from . import credit_document as cd
 from . import textutils as tu
+from . import tables as tb
 import numpy as np
 import pandas as pd
-from typing import Union
+from typing import Union, Dict
 
 
 class Company(object):
@@ -58,23 +59,12 @@ class Company(object):
 
     def detect_document_language(self):
         """
-        Detect document language
+        Detect document language; the document keeps it, so only the first call scans the pages
         :return:
         """
         doc = self._document
         assert (doc is not None)
-        tag, page, _, _, _ = doc.find_tag_in_document("societe")
-        if page >= 0:
-            self._document.set_language("FR")
-        else:
-            tag, page, _, _, _ = doc.find_tag_in_document("sociedade")
-            if page >= 0:
-                self._document.set_language("PT")
-            else:
-                tag, page, _, _, _ = doc.find_tag_in_document("company")
-                if page >= 0:
-                    self._document.set_language("EN")
-        pass
+        doc.detect_language()
 
     def fill_text_from_credit_document(self):
         """
@@ -83,29 +73,20 @@ class Company(object):
         """
         cdoc = self._document
         self.detect_document_language()
-        self._identifier = cdoc.locate_field_in_section("Identity", "Identifier")
-        self._vat_number = cdoc.locate_field_in_section("Identity", "VatNumber")
-        self._creation_date = cdoc.locate_field_in_section("Identity", "CreationDate")
-        self._full_name = cdoc.locate_field_in_section("Identity",
-                                                       "FullName")
-        self._ape_code = cdoc.locate_field_in_section("Identity",
-                                                      "IndustryCode",)
-        self._zip_code = cdoc.locate_field_in_section("Identity",
-                                                      "ZipCode",)
-        self._city = cdoc.locate_field_in_section("Identity",
-                                                  "City")
-        self._address = cdoc.locate_field_in_section("Identity",
-                                                     "Address")
-        self._activity_description = cdoc.locate_field_in_section("Identity",
-                                                                  "ActivityDescription")
-        self._bank_activity = cdoc.locate_field_in_section("Identity",
-                                                           "BankActivity")
-        self._capital = cdoc.locate_field_in_section("Identity",
-                                                     "Capital")
-        self._legal_form = cdoc.locate_field_in_section("Identity",
-                                                        "LegalForm")
-        self._effectif = cdoc.locate_field_in_section("Identity",
-                                                      "NbEmployees")
+        fields = cdoc.extract_fields_in_section("Identity")
+        self._identifier = fields.get("Identifier", "")
+        self._vat_number = fields.get("VatNumber", "")
+        self._creation_date = fields.get("CreationDate", "")
+        self._full_name = fields.get("FullName", "")
+        self._ape_code = fields.get("IndustryCode", "")
+        self._zip_code = fields.get("ZipCode", "")
+        self._city = fields.get("City", "")
+        self._address = fields.get("Address", "")
+        self._activity_description = fields.get("ActivityDescription", "")
+        self._bank_activity = fields.get("BankActivity", "")
+        self._capital = fields.get("Capital", "")
+        self._legal_form = fields.get("LegalForm", "")
+        self._effectif = fields.get("NbEmployees", "")
 
     def parse(self):
         """
@@ -174,6 +155,28 @@ class Company(object):
                 self._effectif = np.nan
                 self._bug_report += f"Effectif {self._effectif} invalide.\n"
 
+    def to_row(self) -> Dict[str, object]:
+        """
+        Get company features as a row of the company table
+        :return: dict of column name: value
+        """
+        return {"Language": self._document.language if self._document is not None else "",
+                "NbPages": self._document.nb_pages if self._document is not None else 0,
+                "Identifier": self._identifier,
+                "VATNumber": self._vat_number,
+                "CreationDate": self._creation_date,
+                "FullName": self._full_name,
+                "APECode": self._ape_code,
+                "ZipCode": self._zip_code,
+                "City": self._city,
+                "Address": self._address,
+                "ActivityDescription": self._activity_description,
+                "BankActivity": self._bank_activity,
+                "Capital": self._capital,
+                "Effectif": self._effectif,
+                "IsParsed": 1 if self._is_parsed else 0,
+                "BugReport": self._bug_report}
+
     def insert(self, df: pd.DataFrame):
         """
         Insert company into database
@@ -183,22 +186,7 @@ class Company(object):
         doc_idx = self._document.name if self._document is not None else self._identifier
         if doc_idx == "":
             return df
-        df.loc[doc_idx, "Language"] = self._document.language if self._document is not None else ""
-        df.loc[doc_idx, "NbPages"] = self._document.nb_pages if self._document is not None else 0
-        df.loc[doc_idx, "Identifier"] = self._identifier
-        df.loc[doc_idx, "VATNumber"] = self._vat_number
-        df.loc[doc_idx, "CreationDate"] = self._creation_date
-        df.loc[doc_idx, "FullName"] = self._full_name
-        df.loc[doc_idx, "APECode"] = self._ape_code
-        df.loc[doc_idx, "ZipCode"] = self._zip_code
-        df.loc[doc_idx, "City"] = self._city
-        df.loc[doc_idx, "Address"] = self._address
-        df.loc[doc_idx, "ActivityDescription"] = self._activity_description
-        df.loc[doc_idx, "BankActivity"] = self._bank_activity
-        df.loc[doc_idx, "Capital"] = self._capital
-        df.loc[doc_idx, "Effectif"] = self._effectif
-        df.loc[doc_idx, "IsParsed"] = 1 if self._is_parsed else 0
-        df.loc[doc_idx, "BugReport"] = self._bug_report
+        tb.insert_row(df, doc_idx, self.to_row())
         return df
 
 
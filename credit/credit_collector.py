@@ -1,36 +1,453 @@
+import asyncio
 import datetime
 import os
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Callable, Iterable, Iterator, Optional, Dict, List, NamedTuple, Tuple, Union
+from . import async_pipeline as ap
 from . import credit_document as cd
 import pandas as pd
 from . import company as cp
 from . import credit_request as cr
+from . import extraction_spec as es
+from . import layout_priors as lp
+from . import memory_budget as mb
+from . import page_cache as pc
+from . import scheduling as sc
+from . import sharding as sh
+from . import sources as src
+from . import tables as tb
+from . import manifest as mf
+from . import writers as wr
+from . import timing as tm
+from . import watchdog as wd
 from datetime import date
 
+# version of the extraction and parsing rules, recorded in collection manifests:
+# bump it when tags or parsing change so that incremental runs process all documents again
+PARSER_VERSION = "1"
+
+
+class CollectedDocument(NamedTuple):
+    """
+    Rows collected from one credit document
+    """
+    name: str
+    document_row: Dict[str, object]
+    company_row: Optional[Dict[str, object]]
+    company_parsed: bool
+    request_row: Optional[Dict[str, object]]
+    request_parsed: bool
+    timing_row: Dict[str, object]
+    template: str = ""
+    nb_pages: int = 0
+    section_locations: List[lp.SectionLocation] = []
+    prior_hit: Optional[bool] = None
+    # why the document could not be processed, "" if it was
+    failure_reason: str = ""
+    # hash of the bytes the rows were collected from, recorded in manifests without reading the file again
+    content_hash: str = ""
+
+
+class DocumentRecord(NamedTuple):
+    """
+    Row of the document table
+    """
+    name: str
+    row: Dict[str, object]
+    table = "documents"
+
+
+class CompanyRecord(NamedTuple):
+    """
+    Row of the company table
+    """
+    name: str
+    row: Dict[str, object]
+    is_parsed: bool
+    table = "companies"
+
+
+class RequestRecord(NamedTuple):
+    """
+    Row of the credit request table
+    """
+    name: str
+    row: Dict[str, object]
+    is_parsed: bool
+    table = "credit_requests"
+
+
+class TimingRecord(NamedTuple):
+    """
+    Row of the timing table
+    """
+    name: str
+    row: Dict[str, object]
+    table = "timings"
+
+
+# records streamed by CreditCollector.iter_objects; their table is the suffix of the table they are written to
+CollectedRecord = Union[DocumentRecord, CompanyRecord, RequestRecord, TimingRecord]
+
+
+def collect_document(name: str,
+                     docpath: str,
+                     do_parse: bool = True,
+                     b_company: bool = True,
+                     b_credit_request: bool = True,
+                     page_cache: Optional[pc.PageTextCache] = None,
+                     layout_priors: Optional[lp.LayoutPriors] = None,
+                     memory_budget: Optional[mb.MemoryBudget] = None,
+                     data: Optional[bytes] = None) -> CollectedDocument:
+    """
+    Extract and parse one credit document. Runs in the collector process or in a pool worker.
+    :param name: file name of the document, or its member name in the archive
+    :param docpath: directory or zip/tar archive containing the document
+    :param do_parse: if True, parse company and credit request text fields
+    :param b_company: if True, collect the company
+    :param b_credit_request: if True, collect the credit request
+    :param page_cache: optional on-disk cache of page texts
+    :param layout_priors: optional layout priors, the pages where sections usually are being scanned first
+    :param memory_budget: optional memory budget of the pages held by the documents of the process
+    :param data: raw bytes of the document if they were already read, e.g. by the reading stage of a pipeline
+    :return: CollectedDocument holding the table rows of the document
+    """
+    docu = cd.CreditDocument(path=docpath, name=name, page_cache=page_cache, memory_budget=memory_budget,
+                             data=data)
+    try:
+        timer = docu.timer
+        prior_hit = None
+        with timer.stage("locate_sections"):
+            if layout_priors is not None:
+                prior_hit = docu.locate_sections_with_priors(layout_priors)
+            else:
+                docu.locate_sections()
+        with timer.stage("insert"):
+            document_row = docu.to_row()
+        a_comp = None
+        company_row = None
+        company_parsed = False
+        if b_company:
+            a_comp = cp.Company()
+            a_comp.link_to_document(docu)
+            with timer.stage("detect_language"):
+                a_comp.detect_document_language()
+            with timer.stage("extract_fields"):
+                a_comp.fill_text_from_credit_document()
+            if do_parse:
+                with timer.stage("parse"):
+                    a_comp.parse()
+            with timer.stage("insert"):
+                company_row = a_comp.to_row()
+            company_parsed = a_comp.is_parsed
+        request_row = None
+        request_parsed = False
+        if b_credit_request:
+            # archive members may be in sub-directories of the archive
+            req_id = os.path.basename(name).split(".")[0]
+            a_req = cr.CreditRequest(req_id=req_id)
+            a_req.link_to_company(document=docu, cp=a_comp)
+            with timer.stage("extract_fields"):
+                a_req.fill_text_from_credit_document()
+            if do_parse:
+                with timer.stage("parse"):
+                    a_req.parse()
+            with timer.stage("insert"):
+                request_row = a_req.to_row()
+            request_parsed = a_req.is_parsed
+        collected = CollectedDocument(name=name,
+                                      document_row=document_row,
+                                      company_row=company_row,
+                                      company_parsed=company_parsed,
+                                      request_row=request_row,
+                                      request_parsed=request_parsed,
+                                      timing_row=timer.to_row(),
+                                      template=docu.template,
+                                      nb_pages=docu.nb_pages,
+                                      section_locations=docu.section_locations(),
+                                      prior_hit=prior_hit,
+                                      content_hash=docu.content_hash)
+    finally:
+        # rows are emitted, or collecting the document failed: the reader and texts of the document
+        # are not needed anymore, and their memory budget is released
+        docu.release()
+    return collected
+
+
+def failed_document(name: str, reason: str) -> CollectedDocument:
+    """
+    Rows of a document that could not be processed: a document row with the reason of the failure,
+    and no company or credit request row
+    :param name: file name of the document
+    :param reason: reason of the failure
+    :return: CollectedDocument
+    """
+    return CollectedDocument(name=name,
+                             document_row={"Language": "",
+                                           "NbPages": 0,
+                                           "NbSections": 0,
+                                           "NbMissingSections": 0},
+                             company_row=None,
+                             company_parsed=False,
+                             request_row=None,
+                             request_parsed=False,
+                             timing_row=tm.StageTimer().to_row(),
+                             failure_reason=reason)
+
+
+def get_executor(workers: int = 1, time_budget: Optional[wd.TimeBudget] = None) -> Executor:
+    """
+    Get the process pool documents are collected in
+    :param workers: number of worker processes
+    :param time_budget: if given, documents are collected by watchdog workers enforcing it
+    :return: ProcessPoolExecutor, or WatchdogExecutor with a time budget
+    """
+    # compiled before forking, so that workers inherit it instead of compiling it again
+    es.get_credit_report_spec()
+    if time_budget is not None:
+        return wd.WatchdogExecutor(max_workers=workers, budget=time_budget)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def iter_collected(collect: Callable[[str], CollectedDocument],
+                   names: List[str],
+                   workers: int = 1,
+                   lookahead: int = 0,
+                   time_budget: Optional[wd.TimeBudget] = None,
+                   dispatch_order: Optional[List[str]] = None,
+                   window: int = 0) -> Iterator[CollectedDocument]:
+    """
+    Collect documents one after the other, or in a process pool with a bounded number of documents in flight.
+    Documents come out in the order of names, as in a serial run.
+    :param collect: function collecting a document from its name
+    :param names: names of the documents
+    :param workers: number of worker processes, documents are collected in the current process if 1
+                    and there is no time budget
+    :param lookahead: maximum number of documents submitted to the pool and not collected yet, 2 per worker if 0
+    :param time_budget: if given, documents are collected in isolated workers enforcing the budget,
+                        and documents that fail or exceed it come out as failed documents
+    :param dispatch_order: names in the order documents are submitted to the pool, e.g. largest first,
+                           the order of names if None
+    :param window: with a dispatch order, a document is only submitted once it is less than window documents
+                   past the first one not out yet, which bounds the number of collected documents held back;
+                   0 for no limit
+    :return: iterator of the collected documents
+    """
+    if workers <= 1 and time_budget is None:
+        for name in names:
+            yield collect(name)
+        return
+    workers = max(1, workers)
+    lookahead = lookahead if lookahead > 0 else 2 * workers
+    order = sc.ReorderBuffer(names, dispatch_order=dispatch_order, window=window)
+    with get_executor(workers, time_budget) as executor:
+        # future: document name
+        pending: Dict[Future, str] = {}
+
+        def submit():
+            while len(pending) < lookahead:
+                name = order.next_dispatch()
+                if name is None:
+                    break
+                pending[executor.submit(collect, name)] = name
+
+        submit()
+        try:
+            while pending:
+                finished, _ = wait(pending.keys(), return_when=FIRST_COMPLETED)
+                for future in [future for future in pending.keys() if future in finished]:
+                    name = pending.pop(future)
+                    try:
+                        collected = future.result()
+                    except wd.DocumentFailure as error:
+                        collected = failed_document(name, error.reason)
+                    released = order.push(name, collected)
+                    # the documents released open the window to the next ones
+                    submit()
+                    yield from released
+        finally:
+            # the consumer stopped early: documents not started yet are dropped
+            for future in pending.keys():
+                future.cancel()
+
+
+def collect_read_document(collect: Callable[..., CollectedDocument], name: str, data: bytes) -> CollectedDocument:
+    """
+    Collect a document whose bytes were already read. Runs in a pool worker.
+    :param collect: function collecting a document from its name, as collect_document with its options set
+    :param name: name of the document
+    :param data: raw bytes of the document
+    :return: CollectedDocument
+    """
+    return collect(name, data=data)
+
 
 class CreditCollector(object):
     """
-    This class collects credit requests from a given directory
+    This class collects credit requests from a given directory, or from a zip or tar archive
+    whose members are read without being unpacked
     """
 
     def __init__(self,
-                 docpath: str):
+                 docpath: str,
+                 page_cache: Optional[pc.PageTextCache] = None,
+                 layout_priors: Optional[lp.LayoutPriors] = None,
+                 memory_budget: Optional[mb.MemoryBudget] = None,
+                 keep_section_locations: bool = False,
+                 time_budget: Optional[wd.TimeBudget] = None,
+                 largest_first: bool = False,
+                 page_counts: Optional[Dict[str, int]] = None,
+                 shard: Optional[Tuple[int, int]] = None,
+                 reorder_window: int = 64):
+        """
+        :param docpath: directory or zip/tar (possibly compressed) archive containing the credit documents;
+                        documents are indexed by their member name in an archive
+        :param page_cache: optional on-disk cache of page texts shared by all collected documents
+        :param layout_priors: optional layout priors, used to locate sections and updated
+                              with the sections of the collected documents
+        :param memory_budget: optional memory budget of the pages held in memory by the documents,
+                              beyond which pages are spilled to its page cache; each worker process gets
+                              its own, shared by the documents it collects
+        :param keep_section_locations: if True, keep where the sections of each collected document were found,
+                                       see section_table; documents themselves are never kept
+        :param time_budget: optional time budget of each document and page; documents are then processed
+                            in isolated workers, even without parallelism, which are killed when a document
+                            exceeds its budget. Documents that time out or fail are recorded in the document table
+                            with a FailureReason, and the collection goes on.
+        :param largest_first: if True, documents are dispatched to the workers by decreasing estimated cost,
+                              so that long documents do not start last and leave all workers but one idle.
+                              Rows still come out in listing order: the rows of a document collected ahead
+                              of an earlier listed one are held back until that one is collected.
+        :param page_counts: optional page counts of documents from earlier runs, used to estimate their cost
+                            along with their size and the page counts of the document table
+        :param shard: optional (k, n): only the documents of the k-th of n shards are collected, documents
+                      being assigned to shards from a stable hash of their name, so that several machines
+                      sharing the documents can each collect one shard; see merge_shards
+        :param reorder_window: with largest_first, documents are dispatched largest first among the reorder_window
+                               documents following, in listing order, the first one whose rows are not out yet:
+                               no more than reorder_window - 1 collected documents are then held back
+        """
         self._docpath = docpath
-        self._document_table = pd.DataFrame()
-        self._company_table = pd.DataFrame()
+        self._page_cache = page_cache
+        self._layout_priors = layout_priors
+        self._memory_budget = memory_budget
+        self._keep_section_locations = keep_section_locations
+        self._time_budget = time_budget
+        self._largest_first = largest_first
+        self._reorder_window = reorder_window
+        self._page_counts = page_counts if page_counts is not None else {}
+        self._shard = shard
+        self._section_locations: Dict[str, List[lp.SectionLocation]] = {}
+        self._document_table = tb.TableBuffer()
+        self._company_table = tb.TableBuffer()
         self._financials_table = pd.DataFrame()
         self._scoring_table = pd.DataFrame()
-        self._credit_request_table = pd.DataFrame()
+        self._credit_request_table = tb.TableBuffer()
+        self._timing_table = tb.TableBuffer()
         self._stats_table = pd.DataFrame()
 
+    @property
+    def document_table(self) -> pd.DataFrame:
+        return self._document_table.to_frame()
+
+    @property
+    def company_table(self) -> pd.DataFrame:
+        return self._company_table.to_frame()
+
+    @property
+    def credit_request_table(self) -> pd.DataFrame:
+        return self._credit_request_table.to_frame()
+
+    @property
+    def timing_table(self) -> pd.DataFrame:
+        return self._timing_table.to_frame()
+
+    @property
+    def stats_table(self) -> pd.DataFrame:
+        return self._stats_table
+
+    @property
+    def section_table(self) -> pd.DataFrame:
+        """
+        Located sections of the collected documents, kept if keep_section_locations is True
+        :return: table indexed by (document, section), with start page, start position and end page
+        """
+        rows = {(name, location.section): {"StartPage": location.start_page,
+                                           "StartPosition": location.start_position,
+                                           "EndPage": location.end_page}
+                for name, locations in self._section_locations.items() for location in locations}
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+    def iter_objects(self,
+                     do_parse: bool = True,
+                     verbose: bool = False,
+                     doclist: list = None,
+                     istart: int = 0,
+                     iend: int = 1000,
+                     types_to_collect: int = 255,
+                     workers: int = 1,
+                     manifest: Optional[mf.CollectionManifest] = None,
+                     lookahead: int = 0) -> Iterator[CollectedRecord]:
+        """
+        Collect documents as a stream of records: the document, company, credit request and timing records
+        of a document are yielded as soon as it and the documents listed before it are processed, in listing order.
+        Stats, layout priors and section locations are updated as documents are yielded; the stats are complete
+        once the stream is exhausted. Timing rows are kept, for the per-stage stats; other rows are not.
+        :param do_parse: if True, parse company and credit request text fields
+        :param verbose: if True, print each collected document
+        :param doclist: names of the documents to collect; all documents of the directory or archive if empty
+        :param istart: index of the first document to collect, when doclist is empty
+        :param iend: index of the last document to collect, when doclist is empty
+        :param types_to_collect: bits of the types of objects to collect
+        :param workers: number of worker processes; documents are extracted and parsed in a process pool
+                        if greater than 1, and records are yielded in the same order as with a serial run
+        :param manifest: if given, only documents that are new or changed since they were recorded
+                         in the manifest are processed, and they are recorded in the manifest (which the caller saves)
+        :param lookahead: maximum number of documents processed ahead of the consumer by the workers,
+                          2 per worker if 0
+        :return: iterator of DocumentRecord, CompanyRecord, RequestRecord and TimingRecord
+        """
+        selected, nfiles, collect = self._prepare_collect(do_parse=do_parse,
+                                                          doclist=doclist,
+                                                          istart=istart,
+                                                          iend=iend,
+                                                          types_to_collect=types_to_collect,
+                                                          manifest=manifest)
+        positions = {file: ifile for ifile, file in selected}
+        # documents dispatched largest first are collected in any order, and come out in listing order
+        for collected in iter_collected(collect, [file for _, file in selected], workers, lookahead,
+                                        time_budget=self._time_budget,
+                                        dispatch_order=self._dispatch_order(selected),
+                                        window=self._reorder_window):
+            file = collected.name
+            ifile = positions[file]
+            if verbose:
+                print(f"Collected document {ifile}/{nfiles}: {file}")
+            timer = tm.StageTimer()
+            for record in self._merge_collected(collected):
+                # time spent by the consumer on the rows of the document is added to its insert time
+                with timer.stage("insert"):
+                    yield record
+            timing_record = self._timing_record(collected, timer)
+            # failed documents are tried again by the next incremental run
+            if manifest is not None and not collected.failure_reason:
+                manifest.record(self._docpath, file, PARSER_VERSION, content_hash=collected.content_hash)
+            yield timing_record
+
+        self._finalize_stats(nfiles)
+
     def collect_objects(self,
                         do_parse: bool = True,
                         verbose: bool = False,
                         doclist: list = None,
                         istart: int = 0,
                         iend: int = 1000,
-                        types_to_collect: int = 255):
+                        types_to_collect: int = 255,
+                        workers: int = 1,
+                        manifest: Optional[mf.CollectionManifest] = None):
         """
-
+        Collect documents into the collector tables, consuming iter_objects
         :param types_to_collect:
         :type doclist: list
         :param doclist:
@@ -39,14 +456,167 @@ class CreditCollector(object):
         :param istart:
         :param iend:
         :param types_to_collect:
+        :param workers: number of worker processes; documents are extracted and parsed in a process pool
+                        if greater than 1, and the tables are the same as with a serial run
+        :param manifest: if given, only documents that are new or changed since they were recorded
+                         in the manifest are processed, their rows replacing the existing ones,
+                         and they are recorded in the manifest (which the caller saves)
         :return: Modifies self in place
         """
+        tables = {DocumentRecord.table: self._document_table,
+                  CompanyRecord.table: self._company_table,
+                  RequestRecord.table: self._credit_request_table}
+        for record in self.iter_objects(do_parse=do_parse,
+                                        verbose=verbose,
+                                        doclist=doclist,
+                                        istart=istart,
+                                        iend=iend,
+                                        types_to_collect=types_to_collect,
+                                        workers=workers,
+                                        manifest=manifest):
+            # timing rows are already kept by iter_objects
+            if record.table in tables:
+                tb.insert_row(tables[record.table], record.name, record.row)
+
+    def run_pipeline(self,
+                     path: str,
+                     name: str,
+                     writer: Optional[wr.TableWriter] = None,
+                     do_parse: bool = True,
+                     verbose: bool = False,
+                     doclist: list = None,
+                     istart: int = 0,
+                     iend: int = 1000,
+                     types_to_collect: int = 255,
+                     workers: int = 1,
+                     manifest: Optional[mf.CollectionManifest] = None,
+                     queue_size: int = 0,
+                     chunk_size: int = 1000) -> ap.PipelineStats:
+        """
+        Collect documents and write their rows through an asyncio pipeline: documents are read in a thread,
+        extracted and parsed in a process pool, merged in listing order by the collector and written
+        in a background thread. Stages are connected by bounded queues, so that a slow stage
+        holds back the previous ones instead of letting documents pile up in memory; with largest_first, documents
+        processed ahead of an earlier listed one are held until it is processed, within the reorder window.
+        Rows are written as write_objects writes records; the stats are complete once it returns.
+        :param path: output directory
+        :param name: output name
+        :param writer: table writer (csv, parquet, arrow), csv by default
+        :param do_parse: if True, parse company and credit request text fields
+        :param verbose: if True, print each collected document
+        :param doclist: names of the documents to collect; all documents of the directory or archive if empty
+        :param istart: index of the first document to collect, when doclist is empty
+        :param iend: index of the last document to collect, when doclist is empty
+        :param types_to_collect: bits of the types of objects to collect
+        :param workers: number of worker processes extracting and parsing documents, watchdog workers
+                        if the collector has a time budget
+        :param manifest: if given, only documents that are new or changed since they were recorded
+                         in the manifest are processed, and they are recorded in the manifest (which the caller saves)
+                         once their rows are written. The document, company and credit request rows of the other
+                         documents are carried over from the tables previously written under the same name.
+        :param queue_size: capacity of the queues between stages, which also bounds the number of documents
+                           processed ahead of the merge; 2 per worker if 0
+        :param chunk_size: number of rows of a table buffered before they are written, for writers that can append
+        :return: counts of the pipeline run, also added to the stats table
+        """
+        if writer is None:
+            writer = wr.CsvTableWriter()
+        workers = max(1, workers)
+        queue_size = queue_size if queue_size > 0 else 2 * workers
+        selected, nfiles, collect = self._prepare_collect(do_parse=do_parse,
+                                                          doclist=doclist,
+                                                          istart=istart,
+                                                          iend=iend,
+                                                          types_to_collect=types_to_collect,
+                                                          manifest=manifest)
+        positions = {file: ifile for ifile, file in selected}
+        previous = {}
+        if manifest is not None:
+            # the tables are written again: they are read before their streams overwrite them
+            for suffix in [DocumentRecord.table, CompanyRecord.table, RequestRecord.table]:
+                if writer.exists(path, name, suffix):
+                    previous[suffix] = writer.read(path, name, suffix)
+        streams = {suffix: writer.open_stream(path, name, suffix, chunk_size=chunk_size)
+                   for suffix in [DocumentRecord.table, CompanyRecord.table,
+                                  RequestRecord.table, TimingRecord.table]}
+        # content hashes of the documents to record in the manifest once their rows are written
+        to_record: Dict[str, str] = {}
+        def merge(file: str, collected: CollectedDocument) -> List[CollectedRecord]:
+            if verbose:
+                print(f"Collected document {positions[file]}/{nfiles}: {file}")
+            timer = tm.StageTimer()
+            with timer.stage("insert"):
+                records = self._merge_collected(collected)
+            records.append(self._timing_record(collected, timer))
+            if manifest is not None and not collected.failure_reason:
+                to_record[file] = collected.content_hash
+            return records
+
+        def write(records: List[CollectedRecord]):
+            for record in records:
+                streams[record.table].insert_row(record.name, record.row)
+            # the manifest is updated in the write thread, so that the stat of the file
+            # does not hold up the event loop; the document record comes first
+            content_hash = to_record.pop(records[0].name, None)
+            if content_hash is not None:
+                manifest.record(self._docpath, records[0].name, PARSER_VERSION, content_hash=content_hash)
+
+        def on_error(file: str, error: Exception) -> CollectedDocument:
+            if not isinstance(error, wd.DocumentFailure):
+                raise error
+            return failed_document(file, error.reason)
+
+        try:
+            for suffix, table in previous.items():
+                # rows of the documents processed again are replaced by their new rows
+                for idx, row in table[~table.index.isin(positions.keys())].to_dict("index").items():
+                    streams[suffix].insert_row(idx, row)
+            previous = {}
+            with ThreadPoolExecutor(max_workers=1) as read_executor, \
+                    get_executor(workers, self._time_budget) as process_executor, \
+                    ThreadPoolExecutor(max_workers=1) as write_executor:
+                stats = asyncio.run(ap.run_pipeline(names=[file for _, file in selected],
+                                                    read=src.open_source(self._docpath).read,
+                                                    process=partial(collect_read_document, collect),
+                                                    merge=merge,
+                                                    write=write,
+                                                    read_executor=read_executor,
+                                                    process_executor=process_executor,
+                                                    write_executor=write_executor,
+                                                    queue_size=queue_size,
+                                                    on_error=on_error,
+                                                    dispatch_order=self._dispatch_order(selected),
+                                                    window=self._reorder_window))
+        finally:
+            for stream in streams.values():
+                stream.close()
+        self._finalize_stats(nfiles)
+        for column, value in stats.to_row().items():
+            self._stats_table.loc["Pipeline", column] = value
+        return stats
+
+    def _prepare_collect(self,
+                         do_parse: bool,
+                         doclist: Optional[list],
+                         istart: int,
+                         iend: int,
+                         types_to_collect: int,
+                         manifest: Optional[mf.CollectionManifest]
+                         ) -> Tuple[List[Tuple[int, str]], int, Callable[..., CollectedDocument]]:
+        """
+        Select the documents to collect and initialize the stats
+        :return: (index, name) of the selected documents, number of documents the stats are relative to,
+                 and the function collecting a document from its name
+        """
         if doclist is None:
             doclist = []
         if not doclist:
-            files = os.listdir(self._docpath)
+            files = src.open_source(self._docpath).names()
         else:
             files = doclist
+        if self._shard is not None:
+            # istart and iend then index the documents of the shard, in name order
+            files = sh.select_shard(files, self._shard)
         # find the first bit of the types_to_collect that is set
         # this is the type of object to collect
         # 0: company
@@ -57,67 +627,238 @@ class CreditCollector(object):
         b_credit_request = int(bin(types_to_collect)[3]) == 1
         if b_credit_request:
             self._stats_table.loc["Requests", "Nb_parsed"] = 0
+        if self._time_budget is not None:
+            self._stats_table.loc["Documents", "Nb_failed"] = 0
         # 2: financials
         # 3: scoring
         # 4: all
         # please write a function that extract a given bit from a number
         # and returns it as a boolean
-        doc_collector = cd.CreditDocumentCollector(self._docpath)
         nfiles = max(1, min(len(files), iend - istart))
-        for ifile, file in enumerate(files):
-            if doclist or istart <= ifile <= iend:
-                if verbose:
-                    print(f"Collecting document {ifile}/{nfiles}: {file}")
-                docu = cd.CreditDocument(path=self._docpath, name=file)
-                docu.locate_sections()
-                docu.insert(self._document_table)
-                a_comp = None
-                if b_company:
-                    a_comp = cp.Company()
-                    a_comp.link_to_document(docu)
-                    a_comp.detect_document_language()
-                    a_comp.fill_text_from_credit_document()
-                    if do_parse:
-                        a_comp.parse()
-                    a_comp.insert(self._company_table)
-                    if a_comp.is_parsed:
-                        self._stats_table.loc["Companies", "Nb_parsed"] += 1
-                if b_credit_request:
-                    req_id = file.split(".")[0]
-                    a_req = cr.CreditRequest(req_id=req_id)
-                    a_req.link_to_company(document=docu, cp=a_comp)
-                    a_req.fill_text_from_credit_document()
-                    if do_parse:
-                        a_req.parse()
-                    a_req.insert(self._credit_request_table)
-                    if a_req.is_parsed:
-                        self._stats_table.loc["Requests", "Nb_parsed"] += 1
+        selected = [(ifile, file) for ifile, file in enumerate(files) if doclist or istart <= ifile <= iend]
+        if manifest is not None:
+            selected = [(ifile, file) for ifile, file in selected
+                        if manifest.needs_processing(self._docpath, file, PARSER_VERSION)]
+            nfiles = max(1, len(selected))
+        collect = partial(collect_document,
+                          docpath=self._docpath,
+                          do_parse=do_parse,
+                          b_company=b_company,
+                          b_credit_request=b_credit_request,
+                          page_cache=self._page_cache,
+                          layout_priors=self._layout_priors,
+                          memory_budget=self._memory_budget)
+        return selected, nfiles, collect
+
+    def _dispatch_order(self, selected: List[Tuple[int, str]]) -> Optional[List[str]]:
+        """
+        Get the order documents are dispatched to the workers in: with largest_first, by decreasing estimated cost,
+        from their size in the source metadata and their page count when known from earlier runs
+        :param selected: (index, name) of the selected documents
+        :return: names of the selected documents, largest first, or None to dispatch them in listing order
+        """
+        if not self._largest_first:
+            return None
+        sizes = src.open_source(self._docpath).sizes()
+        nb_pages = {**self._page_counts, **sc.page_counts(self.document_table)}
+        costs = sc.estimate_costs(sizes, nb_pages)
+        return sc.largest_first([file for _, file in selected], costs)
 
+    def _timing_record(self, collected: CollectedDocument, timer: tm.StageTimer) -> TimingRecord:
+        """
+        Keep the timing row of a collected document
+        :param collected: rows of one document
+        :param timer: timer of the insert stage of the document rows in the collector
+        :return: record of the timing row, the insert time of the collector being added to the one of the document
+        """
+        timing_row = dict(collected.timing_row)
+        for suffix, spent in [("wall", timer.wall("insert")), ("cpu", timer.cpu("insert"))]:
+            timing_row[f"insert_{suffix}"] = timing_row.get(f"insert_{suffix}", 0.0) + spent
+            timing_row[f"total_{suffix}"] = timing_row.get(f"total_{suffix}", 0.0) + spent
+        self._timing_table.insert_row(collected.name, timing_row)
+        return TimingRecord(collected.name, timing_row)
+
+    def _finalize_stats(self, nfiles: int):
+        """
+        Compute the stats of a collection once all documents are collected
+        :param nfiles: number of documents the stats are relative to
+        :return: Modifies self in place
+        """
         # self._stats_table.loc["Documents", "Nb_unknown_sections"] = docu.nb_sections_unlocated()
         self._stats_table.loc["Companies", "%_parsed"] = float(self._stats_table.loc["Companies", "Nb_parsed"]
                                                                / nfiles)
         self._stats_table.loc["Companies", "%_parsed"] = float(self._stats_table.loc["Requests", "Nb_parsed"]
                                                                / nfiles)
+        if self._layout_priors is not None:
+            self._stats_table.loc["LayoutPriors", "Nb_lookups"] = self._layout_priors.nb_lookups
+            self._stats_table.loc["LayoutPriors", "%_hits"] = self._layout_priors.hit_rate
+        # per-stage totals and percentiles over documents
+        for idx, row in tm.aggregate_timings(self.timing_table).to_dict("index").items():
+            for column, value in row.items():
+                self._stats_table.loc[idx, column] = value
+
+    def _merge_collected(self, collected: CollectedDocument) -> List[CollectedRecord]:
+        """
+        Update stats, layout priors and section locations with one collected document
+        :param collected: rows of one document
+        :return: records of the document rows, timing excepted
+        """
+        document_row = collected.document_row
+        if self._time_budget is not None:
+            document_row = {**document_row, "FailureReason": collected.failure_reason}
+            if collected.failure_reason:
+                self._stats_table.loc["Documents", "Nb_failed"] += 1
+        records: List[CollectedRecord] = [DocumentRecord(collected.name, document_row)]
+        if collected.company_row is not None:
+            records.append(CompanyRecord(collected.name, collected.company_row, collected.company_parsed))
+            if collected.company_parsed:
+                self._stats_table.loc["Companies", "Nb_parsed"] += 1
+        if collected.request_row is not None:
+            records.append(RequestRecord(collected.name, collected.request_row, collected.request_parsed))
+            if collected.request_parsed:
+                self._stats_table.loc["Requests", "Nb_parsed"] += 1
+        if self._keep_section_locations:
+            self._section_locations[collected.name] = collected.section_locations
+        if self._layout_priors is not None and not collected.failure_reason:
+            if collected.prior_hit is not None:
+                self._layout_priors.record_lookup(collected.prior_hit)
+            self._layout_priors.record(collected.template, collected.nb_pages, collected.section_locations)
+        return records
+
+    def load_objects(self, path: str, name: str, writer: Optional[wr.TableWriter] = None):
+        """
+        Load tables previously written by write_objects, so that new documents are merged into them
+        :param path: path
+        :param name: name
+        :param writer: writer the tables were written with, csv by default
+        :return: Modifies self in place
+        """
+        if writer is None:
+            writer = wr.CsvTableWriter()
+        for table, suffix in [(self._document_table, "documents"),
+                              (self._company_table, "companies"),
+                              (self._credit_request_table, "credit_requests")]:
+            if writer.exists(path, name, suffix):
+                table.insert_frame(writer.read(path, name, suffix))
 
-    def write_objects(self, path: str, name: str):
+    def write_objects(self,
+                      path: str,
+                      name: str,
+                      writer: Optional[wr.TableWriter] = None,
+                      records: Optional[Iterable[CollectedRecord]] = None,
+                      chunk_size: int = 1000):
         """
         Write companies table to file
         :param path: path
         :param name: name
+        :param writer: table writer (csv, parquet, arrow), csv by default
+        :param records: if given, a stream of records, as given by iter_objects, written as they come
+                        instead of the collector tables
+        :param chunk_size: number of rows of a table buffered before they are written, when records are given;
+                           writers that cannot append write each table at the end of the stream
         :return:
         """
-        self._document_table.to_csv(os.path.join(path, f"{name}_documents.csv"))
-        self._company_table.to_csv(os.path.join(path, f"{name}_companies.csv"))
-        self._credit_request_table.to_csv(os.path.join(path, f"{name}_credit_requests.csv"))
-        pass
+        if writer is None:
+            writer = wr.CsvTableWriter()
+        if records is not None:
+            streams = {suffix: writer.open_stream(path, name, suffix, chunk_size=chunk_size)
+                       for suffix in [DocumentRecord.table, CompanyRecord.table,
+                                      RequestRecord.table, TimingRecord.table]}
+            try:
+                for record in records:
+                    streams[record.table].insert_row(record.name, record.row)
+            finally:
+                for stream in streams.values():
+                    stream.close()
+            return
+        writer.write(self.document_table, path, name, "documents")
+        writer.write(self.company_table, path, name, "companies")
+        writer.write(self.credit_request_table, path, name, "credit_requests")
+        writer.write(self.timing_table, path, name, "timings")
 
-    def write_stats(self, out_path: str):
+    def write_stats(self, out_path: str, name: str = ""):
         """
 
         :param out_path:
+        :param name: output name, included in the file name if given, e.g. to tell apart the stats of shards
         :return:
         """
-        today = date.today().strftime("%d-%m-%Y")
-        self._stats_table.to_csv(os.path.join(out_path, f"Collect_stats_{today}.csv"))
+        self._stats_table.to_csv(stats_path(out_path, name))
+
+
+def stats_path(out_path: str, name: str = "", day: Optional[date] = None) -> str:
+    """
+    Get the full path of a stats file
+    :param out_path: output directory
+    :param name: output name, "" for the stats of an unnamed collection
+    :param day: day of the collection, today by default
+    :return: full path
+    """
+    day = day if day is not None else date.today()
+    today = day.strftime("%d-%m-%Y")
+    if name:
+        return os.path.join(out_path, f"Collect_stats_{name}_{today}.csv")
+    return os.path.join(out_path, f"Collect_stats_{today}.csv")
+
+
+def latest_stats_path(out_path: str, name: str) -> str:
+    """
+    Get the full path of the latest stats file written under a name
+    :param out_path: output directory
+    :param name: output name
+    :return: full path of the stats file of the latest day, "" if there is none
+    """
+    days = []
+    for file in os.listdir(out_path):
+        day = file.split("_")[-1][:-len(".csv")]
+        try:
+            day = datetime.datetime.strptime(day, "%d-%m-%Y").date()
+        except ValueError:
+            continue
+        # file names are built back, so that the stats of a name do not match another name starting alike
+        if file == os.path.basename(stats_path(out_path, name, day)):
+            days.append(day)
+    return stats_path(out_path, name, max(days)) if days else ""
+
+
+def merge_shards(path: str,
+                 name: str,
+                 nb_shards: int,
+                 writer: Optional[wr.TableWriter] = None) -> pd.DataFrame:
+    """
+    Merge the tables and stats written by the collectors of the shards of a collection into the tables and stats
+    of the whole collection, as if it had been collected at once
+    :param path: output directory of the shards
+    :param name: output name of the collection; shard tables are named after it, see sharding.shard_name
+    :param nb_shards: number of shards
+    :param writer: writer the shard tables were written with, used to write the merged tables; csv by default
+    :return: merged stats, also written to the stats file of the collection
+    """
+    if writer is None:
+        writer = wr.CsvTableWriter()
+    names = [sh.shard_name(name, (k, nb_shards)) for k in range(1, nb_shards + 1)]
+    missing = [shard for shard in names if not writer.exists(path, shard, "documents")]
+    if missing:
+        raise FileNotFoundError(f"Shards {missing} were not written in {path}")
+    merged = {}
+    nb_documents = []
+    for suffix in [DocumentRecord.table, CompanyRecord.table, RequestRecord.table, TimingRecord.table]:
+        tables = [writer.read(path, shard, suffix) if writer.exists(path, shard, suffix) else pd.DataFrame()
+                  for shard in names]
+        if suffix == DocumentRecord.table:
+            nb_documents = [len(table) for table in tables]
+        merged[suffix] = sh.merge_tables(tables)
+        writer.write(merged[suffix], path, name, suffix)
+    stats_tables = []
+    stats_documents = []
+    for shard, nb in zip(names, nb_documents):
+        # the latest stats of the shard, whatever the day it was collected
+        shard_stats = latest_stats_path(path, shard)
+        if shard_stats:
+            stats_tables.append(pd.read_csv(shard_stats, index_col=0))
+            stats_documents.append(nb)
+    stats = sh.merge_stats(stats_tables, stats_documents, merged[TimingRecord.table])
+    stats.to_csv(stats_path(path, name))
+    return stats
 
 
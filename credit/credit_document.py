@@ -1,109 +1,38 @@
 import os
+from typing import Optional, Dict, List
 from . import document as doc
+from . import extraction_spec as es
+from . import layout_priors as lp
+from . import memory_budget as mb
+from . import page_cache as pc
+from . import sources as src
+from . import tables as tb
+from . import textutils as tu
 import pandas as pd
 
 
+# language markers, by decreasing priority: the first marker of the list found in a document gives its language.
+# "sociedad" also matches "sociedade", so it only tells Spanish apart once Portuguese is excluded.
+LANGUAGE_MARKERS = [("FR", "societe"),
+                    ("PT", "sociedade"),
+                    ("EN", "company"),
+                    ("ES", "sociedad")]
+
+
 class CreditDocument(doc.DocumentWithSections):
 
     def __init__(self,
                  path: str,
-                 name: str):
-        super().__init__(path=path, name=name)
+                 name: str,
+                 page_cache: Optional[pc.PageTextCache] = None,
+                 memory_budget: Optional[mb.MemoryBudget] = None,
+                 data: Optional[bytes] = None):
+        super().__init__(path=path, name=name, page_cache=page_cache, memory_budget=memory_budget, data=data)
         self._language = ""
-        self._summary_section = doc.DocumentSection(self,
-                                                    starttaglist=["Etude client", "Etude garantie",
-                                                                  "Etude", "Business report"],
-                                                    endtaglist=["Identité"])
-        self.summary_section_declare_fields()
-
-        self.add_section(secname="Summary", sec=self._summary_section)
-
-        self._identity_section = doc.DocumentSection(document=self,
-                                                     starttaglist=["Identité"],
-                                                     endtaglist=["Activité - Modèle économique", "Activité"])
-        self.add_section(secname="Identity", sec=self._identity_section)
-        self.identity_section_declare_fields()
-
-        self._bank_section = doc.DocumentSection(self,
-                                                 starttaglist=["informations bancaires"],
-                                                 endtaglist=["informations financieres"])
-        self.add_section(secname="Bank", sec=self._bank_section)
-
-        self._key_financials_section = doc.DocumentSection(self,
-                                                           starttaglist=["informations financieres", "Chiffres clés"],
-                                                           endtaglist=["BFR"])
-        self.add_section(secname="KeyFinancials", sec=self._key_financials_section)
-
-        self._bfr_section = doc.DocumentSection(self,
-                                                starttaglist=["BFR"],
-                                                endtaglist=["Analyse structurelle"])
-        self.add_section(secname="BFR", sec=self._bfr_section)
-
-        self._structural_analysis_section = doc.DocumentSection(self,
-                                                                starttaglist=["Analyse structurelle"],
-                                                                endtaglist=["Ratios de rotation"])
-        self.add_section(secname="StructuralAnalysis", sec=self._structural_analysis_section)
-
-        self._turnover_ratios_section = doc.DocumentSection(self,
-                                                            starttaglist=["Ratios de rotation"],
-                                                            endtaglist=["Analyse des postes d'achat"])
-        self.add_section(secname="TurnoverRatios", sec=self._turnover_ratios_section)
-
-        self._tax_and_social_defaults_section = doc.DocumentSection(self,
-                                                                    starttaglist=["Defauts de paiements \
-                                                                    sociaux et fiscaux"],
-                                                                    endtaglist=["Analyse de factures fournisseurs"])
-        self.add_section(secname="TaxAndSocialDefaults", sec=self._tax_and_social_defaults_section)
-
-        self._billing_analysis_section = doc.DocumentSection(self,
-                                                             starttaglist=["Analyse de factures fournisseurs"],
-                                                             endtaglist=["Votre expérience de paiement"])
-
-        self.add_section(secname="BillingAnalysis", sec=self._billing_analysis_section)
-
-    def summary_section_declare_fields(self):
-        """
-        Declare fields in Summary section
-        :return:
-        """
-        self._summary_section.declare_field(name="RequestedAmount", tags=["garantie demandee - duree",
-                                                                          "garantie demandee",
-                                                                          "encours demande",
-                                                                          "pedida"])
-        self._summary_section.declare_field(name="GrantedAmount", tags=["garantie accordee - duree",
-                                                                        "garantie accordee",
-                                                                        "encours accorde",
-                                                                        "accordada"])
-        self._summary_section.declare_field(name="RequestDate", tags=["Date"])
-        self._summary_section.declare_field(name="StartDate", tags=["Date debut", "Debut de la garantie"])
-        self._summary_section.declare_field(name="EndDate", tags=["Date fin", "Fin de la garantie"])
-
-    def identity_section_declare_fields(self):
-        """
-        Declare fields in Identity section
-        :return:
-        """
-        self._identity_section.declare_field(name="Identifier", tags=["Siren", "Identifiant"])
-        self._identity_section.declare_field(name="VatNumber", tags=["N° TVA", "TVA"])
-        self._identity_section.declare_field(name="CreationDate", tags=["Date de création"])
-        self._identity_section.declare_field(name="ActivityDescription", tags=["Activité"])
-        self._identity_section.declare_field(name="FullName", tags=["Raison sociale", "Nom"])
-        self._identity_section.declare_field(name="IndustryCode", tags=["Code APE"])
-        self._identity_section.declare_field(name="ZipCode", tags=["Code postal"])
-        self._identity_section.declare_field(name="Address", tags=["Adresse"])
-        self._identity_section.declare_field(name="City", tags=["CP, Ville", "Ville"])
-        self._identity_section.declare_field(name="BankActivity", tags=["Activité bancaire"])
-        self._identity_section.declare_field(name="Capital", tags=["Capital social", "Capital"])
-        self._identity_section.declare_field(name="LegalForm", tags=["Forme juridique"])
-        self._identity_section.declare_field(name="NbEmployees", tags=["Effectif"])
-        self._identity_section.declare_field(name="Director", tags=["Dirigeant"])
-        self._identity_section.declare_field(name="BusinessAssets", tags=["Fonds de commerce"])
-        self._identity_section.declare_field(name="LegalProceedings", tags=["Procédures judiciaires",
-                                                                            "Poursuites judiciaires"])
-
-    def bank_section_declare_fields(self):
-        self._bank_section.declare_field(name="BankName", tags=["Banques"])
-        self._bank_section.declare_field(name="BankName", tags=["Concours bancaires"])
+        self._language_detected = False
+        # sections share the compiled layout of the credit reports
+        for section_spec in es.get_credit_report_spec().sections:
+            self.add_section(secname=section_spec.name, sec=doc.DocumentSection(self, spec=section_spec))
 
     @property
     def summary_section(self):
@@ -145,8 +74,59 @@ class CreditDocument(doc.DocumentWithSections):
     def language(self):
         return self._language
 
+    @property
+    def template(self) -> str:
+        """
+        Template of the report, given by the start tag of its summary section,
+        "" if the summary section is not located or has no start tag
+        """
+        summary = self.summary_section
+        return summary.start_tag if summary.is_located else ""
+
+    def locate_sections_with_priors(self,
+                                    priors: lp.LayoutPriors,
+                                    section_names: Optional[List[str]] = None) -> Optional[bool]:
+        """
+        Locate sections, scanning first the pages where they were found in documents of the same template
+        :param priors: layout priors learned from previous documents
+        :param section_names: names of the sections to locate, all sections if None
+        :return: True if the sections were located from the prior pages alone, False if the rest of the document
+                 had to be scanned, None if the priors have no pages for the template of the document
+        """
+        if section_names is None:
+            section_names = list(self._sections.keys())
+        # the template is read from the summary section, located first
+        self.locate_sections(["Summary"])
+        window = priors.window(self.template, section_names, self.nb_pages)
+        hit = self.locate_sections(section_names, first_pages=window)
+        return hit if window else None
+
     def set_language(self, language: str):
         self._language = language
+        self._language_detected = True
+
+    def detect_language(self, max_pages: int = 3) -> str:
+        """
+        Detect document language from the markers of LANGUAGE_MARKERS, scanning the first pages once for all of them.
+        Detection stops at the first page holding a marker; if it holds several, the first one in LANGUAGE_MARKERS
+        wins, e.g. "sociedade" over "sociedad".
+        The result is kept, further calls are free.
+        :param max_pages: maximal number of pages to scan
+        :return: language code, "" if no marker was found
+        """
+        if self._language_detected:
+            return self._language
+        markers = {tu.normalize(marker, compactform=True): language for language, marker in LANGUAGE_MARKERS}
+        priorities = {language: rank for rank, (language, _) in enumerate(LANGUAGE_MARKERS)}
+        matcher = tu.get_multi_tag_matcher(tuple(sorted(markers.keys())))
+        for page_number in range(min(self.nb_pages, max_pages)):
+            found = [markers[cmarker]
+                     for cmarker in matcher.first_occurrences(self.get_page_index(page_number).compact).keys()]
+            if found:
+                self._language = min(found, key=lambda language: priorities[language])
+                break
+        self._language_detected = True
+        return self._language
 
     def insert(self, table: pd.DataFrame):
         """
@@ -157,10 +137,17 @@ class CreditDocument(doc.DocumentWithSections):
         doc_idx = self._name
         if doc_idx == "":
             return table
-        table.loc[doc_idx, "Language"] = self.language
-        table.loc[doc_idx, "NbPages"] = self.nb_pages
-        table.loc[doc_idx, "NbSections"] = len(self.sections)
-        table.loc[doc_idx, "NbMissingSections"] = self.nb_sections_unlocated()
+        tb.insert_row(table, doc_idx, self.to_row())
+
+    def to_row(self) -> Dict[str, object]:
+        """
+        Get document features as a row of the document table
+        :return: dict of column name: value
+        """
+        return {"Language": self.language,
+                "NbPages": self.nb_pages,
+                "NbSections": len(self.sections),
+                "NbMissingSections": self.nb_sections_unlocated()}
 
 
 class CreditDocumentCollector(doc.DocumentCollector):
@@ -173,24 +160,24 @@ class CreditDocumentCollector(doc.DocumentCollector):
                           iend: int = 1000000,
                           verbose: bool = False):
         """
-            a function that scans a directory for pdf files and collects documents from them
+            a function that scans a directory or archive for pdf files and collects documents from them
             :param istart: int, index of first file to collect
             :param iend: int, index of last file to collect
             :param verbose: bool, if True, print information about the process
             :return:
             """
-        files = os.listdir(self._path)
+        files = src.open_source(self._path).names()
         for ifile, file in enumerate(files):
             if istart <= ifile <= iend:
                 if verbose:
                     print("Collecting document {}".format(file))
-                fullpath = os.path.join(self._path, file)
                 doct = CreditDocument(self._path, file)
                 doct.locate_sections()
-                self._documents.loc[file, "Nb pages"] = doct.nb_pages
-                self._documents.loc[file, "Nb sections"] = len(doct.sections)
-                self._documents.loc[ifile, "Nb located sections"] = doct.nb_sections_located()
-                self._documents.loc[ifile, "Nb missing sections"] = doct.nb_sections_unlocated()
+                self._documents.insert_row(file, {"Nb pages": doct.nb_pages,
+                                                  "Nb sections": len(doct.sections)})
+                self._documents.insert_row(ifile, {"Nb located sections": doct.nb_sections_located(),
+                                                   "Nb missing sections": doct.nb_sections_unlocated()})
+                doct.release()
         pass
 
     def write_doc_stats(self, name: str):
@@ -198,7 +185,7 @@ class CreditDocumentCollector(doc.DocumentCollector):
         Write document stats to csv file
         :return:
         """
-        self._documents.to_csv(os.path.join("./", name))
+        self.documents.to_csv(os.path.join("./", name))
 
 
 
@@ -4,10 +4,11 @@ import re
 
 import numpy as np
 import pandas as pd
-from typing import Union
+from typing import Union, Dict
 from . import credit_document as cd
 from . import textutils as tu
 from . import company as cp
+from . import tables as tb
 
 
 class CreditRequest(object):
@@ -52,11 +53,14 @@ class CreditRequest(object):
         :return: modifies credit request attributes in place
         """
         cdoc = self._document
-        self._request_date = cdoc.locate_field_in_section("Summary", "RequestDate")
-        self._requested_amount = cdoc.locate_field_in_section("Summary", "RequestedAmount")
-        self._granted_amount = cdoc.locate_field_in_section("Summary", "GrantedAmount")
-        self._start_date = cdoc.locate_field_in_section("Summary", "StartDate")
-        self._end_date = cdoc.locate_field_in_section("Summary", "EndDate")
+        # the language selects the tags fields are looked for with
+        cdoc.detect_language()
+        fields = cdoc.extract_fields_in_section("Summary")
+        self._request_date = fields.get("RequestDate", "")
+        self._requested_amount = fields.get("RequestedAmount", "")
+        self._granted_amount = fields.get("GrantedAmount", "")
+        self._start_date = fields.get("StartDate", "")
+        self._end_date = fields.get("EndDate", "")
 
     def parse(self):
         """
@@ -133,6 +137,21 @@ class CreditRequest(object):
         if type(self._start_date) == datetime.date and type(self._end_date) == datetime.date:
             self._duration = (self._end_date - self._start_date).days / 365.25
 
+    def to_row(self) -> Dict[str, object]:
+        """
+        Get credit request features as a row of the credit request table
+        :return: dict of column name: value
+        """
+        return {"RequestDate": self._request_date if self._request_date is not None else "",
+                "CompanyId": self._company.identifier if self._company is not None else "",
+                "CompanyName": self._company.full_name if self._company is not None else "",
+                "RequestedAmount": self._requested_amount if self._requested_amount is not None else "",
+                "GrantedAmount": self._granted_amount if self._granted_amount is not None else "",
+                "StartDate": self._start_date if self._start_date is not None else "",
+                "EndDate": self._end_date if self._end_date is not None else "",
+                "Duration": self._duration if self._duration is not None else "",
+                "BugReport": self._bug_report if self._bug_report is not None else ""}
+
     def insert(self, table: pd.DataFrame):
         """
         Insert credit request into credit request table
@@ -141,13 +160,4 @@ class CreditRequest(object):
         doc_idx = self._document.name if self._document is not None else self._id
         if doc_idx == "":
             return table
-        table.loc[doc_idx, "RequestDate"] = self._request_date if self._request_date is not None else ""
-        table.loc[doc_idx, "CompanyId"] = self._company.identifier if self._company is not None else ""
-        table.loc[doc_idx, "CompanyName"] = self._company.full_name if self._company is not None else ""
-        table.loc[doc_idx, "RequestedAmount"] = self._requested_amount if self._requested_amount is not None else ""
-        table.loc[doc_idx, "GrantedAmount"] = self._granted_amount if self._granted_amount is not None else ""
-        table.loc[doc_idx, "StartDate"] = self._start_date if self._start_date is not None else ""
-        table.loc[doc_idx, "EndDate"] = self._end_date if self._end_date is not None else ""
-        table.loc[doc_idx, "Duration"] = self._duration if self._duration is not None else ""
-        table.loc[doc_idx, "BugReport"] = self._bug_report if self._bug_report is not None else ""
-        pass
\ No newline at end of file
+        tb.insert_row(table, doc_idx, self.to_row())
@@ -1,28 +1,72 @@
+import io
+from bisect import bisect_left
+
 import PyPDF2.errors
 from PyPDF2 import PdfReader, PageObject
 import tabula as tbl
 from typing import List, Dict, Tuple, Optional
+import credit.extraction_spec as es
+import credit.layout_priors as lp
+import credit.memory_budget as mb
 import credit.textutils as tu
+import credit.page_cache as pc
+import credit.sources as src
+import credit.tables as tb
+import credit.timing as tm
+import credit.watchdog as wd
 import pandas as pd
 import os
+import sys
 
 
 class DocumentWithSections(object):
     def __init__(self,
                  path: str,
-                 name: str):
+                 name: str,
+                 page_cache: Optional[pc.PageTextCache] = None,
+                 memory_budget: Optional[mb.MemoryBudget] = None,
+                 data: Optional[bytes] = None):
+        """
+        :param path: directory or zip/tar archive containing the document
+        :param name: file name of the document, or its member name in the archive
+        :param page_cache: optional on-disk cache of page texts; when the document is known to the cache,
+                           the pdf is only decoded if a page is missing from it
+        :param memory_budget: optional memory budget of the pages held in memory, shared with other documents;
+                              pages are spilled to the page cache, the one of the budget if page_cache is None
+        :param data: raw bytes of the document if they were already read from its source
+        """
+        if page_cache is None and memory_budget is not None:
+            page_cache = memory_budget.page_cache
         self._path = path
         self._name = name
-        fullpath = os.path.join(path, name)
+        # opened once per process for archives
+        self._source = src.open_source(path)
+        self._page_cache = page_cache
+        self._memory_budget = memory_budget
+        self._content_hash = ""
+        self._pdf_data = data
+        self._pypdf_reader = None
+        self._nb_pages = -1
+        # wall and cpu time spent in each processing stage of the document
+        self._timer = tm.StageTimer()
+        fullpath = self._source.fullpath(name)
         # Checking if fullpath exists as a file and ia a pdf
-        if not os.path.isfile(fullpath):
+        if data is None and not self._source.is_file(name):
             raise FileNotFoundError("File {} not found".format(fullpath))
         if not name.endswith(".pdf"):
             raise TypeError("File {} is not a pdf".format(fullpath))
-        try:
-            self._pypdf_reader = PdfReader(fullpath)
-        except PyPDF2.errors.PdfReadError:
-            raise TypeError("File {} could not be read by PyPDF2".format(fullpath))
+        with self._timer.stage("open"):
+            if page_cache is None:
+                self._open_reader()
+            else:
+                if self._pdf_data is None:
+                    self._pdf_data = self._source.read(name)
+                self._content_hash = pc.content_hash(self._pdf_data)
+                self._nb_pages = page_cache.get_nb_pages(self._content_hash)
+                if self._nb_pages < 0:
+                    self._open_reader()
+                    self._nb_pages = len(self._pypdf_reader.pages)
+                    page_cache.put_nb_pages(self._content_hash, self._nb_pages)
         # self._tbl_tables = tbl.read_pdf(path,
         #                                 pages="all",
         #                                 multiple_tables=True
@@ -30,6 +74,20 @@ class DocumentWithSections(object):
         self._tbl_tables = []
         self._sections = {}
         self._pages_text = {}
+        self._pages_index = {}
+
+    def _open_reader(self):
+        """
+        Open the PyPDF2 reader on the raw bytes of the document, read from its source if they were not already
+        :return: None. Self attributes are updated
+        """
+        try:
+            with self._timer.stage("open"):
+                if self._pdf_data is None:
+                    self._pdf_data = self._source.read(self._name)
+                self._pypdf_reader = PdfReader(io.BytesIO(self._pdf_data))
+        except PyPDF2.errors.PdfReadError:
+            raise TypeError("File {} could not be read by PyPDF2".format(self._source.fullpath(self._name)))
 
     def add_section(self, secname: str, sec: "DocumentSection"):
         self._sections[secname] = sec
@@ -40,11 +98,35 @@ class DocumentWithSections(object):
 
     @property
     def pypdf_reader(self):
+        if self._pypdf_reader is None:
+            self._open_reader()
         return self._pypdf_reader
 
     @property
     def nb_pages(self):
-        return len(self._pypdf_reader.pages)
+        if self._nb_pages < 0:
+            self._nb_pages = len(self.pypdf_reader.pages)
+        return self._nb_pages
+
+    @property
+    def content_hash(self) -> str:
+        """
+        Content hash of the document, "" if its raw bytes were released before it was computed
+        """
+        if not self._content_hash and self._pdf_data is not None:
+            self._content_hash = pc.content_hash(self._pdf_data)
+        return self._content_hash
+
+    @property
+    def timer(self) -> tm.StageTimer:
+        return self._timer
+
+    @property
+    def language(self) -> str:
+        """
+        Language of the document, "" if unknown: fields are then looked for with the tags of all languages
+        """
+        return ""
 
     @property
     def tbl_tables(self):
@@ -68,14 +150,68 @@ class DocumentWithSections(object):
         :param page_number: int, page number to get text from
         :return text from page
         """
-        page = self._pypdf_reader.pages[page_number]
         if page_number in self._pages_text.keys():
-            page_text = self._pages_text[page_number]
-        else:
-            page_text = page.extract_text()
-            self._pages_text[page_number] = page_text
+            if self._memory_budget is not None:
+                self._memory_budget.touch(self, page_number)
+            return self._pages_text[page_number]
+        with self._timer.stage("extract"):
+            page_text = None
+            if self._page_cache is not None:
+                page_text = self._page_cache.get(self._content_hash, page_number)
+            if page_text is None:
+                page = self.pypdf_reader.pages[page_number]
+                # pathological pages are cut by the page budget of watchdog workers
+                with wd.page_time_limit(page_number):
+                    page_text = page.extract_text()
+                if self._page_cache is not None:
+                    self._page_cache.put(self._content_hash, page_number, page_text)
+        self._pages_text[page_number] = page_text
+        if self._memory_budget is not None:
+            self._memory_budget.add(self, page_number, sys.getsizeof(page_text))
         return page_text
 
+    def get_page_index(self, page_number) -> tu.TextIndex:
+        """
+        Get the normalized text index of a page, built once per document
+        :param page_number: int, page number to get the index of
+        :return: TextIndex of the page text
+        """
+        index = self._pages_index.get(page_number, None)
+        if index is None:
+            index = tu.TextIndex(self.get_page_text(page_number))
+            self._pages_index[page_number] = index
+            if self._memory_budget is not None:
+                self._memory_budget.add(self, page_number, index.nbytes)
+        elif self._memory_budget is not None:
+            self._memory_budget.touch(self, page_number)
+        return index
+
+    def spill_page(self, page_number: int):
+        """
+        Drop the text and index of a page from memory; they are read again, from the page cache if any,
+        when needed
+        :param page_number: int, page number
+        :return: None. Self attributes are updated
+        """
+        self._pages_text.pop(page_number, None)
+        self._pages_index.pop(page_number, None)
+
+    def release(self):
+        """
+        Release the pdf reader, the raw pdf bytes, the page texts and indexes and the section texts,
+        once the rows of the document are emitted. The document keeps its located sections metadata:
+        their pages and positions. Texts are read again from the page cache or the file if needed.
+        :return: None. Self attributes are updated
+        """
+        if self._memory_budget is not None:
+            self._memory_budget.forget(self)
+        self._pypdf_reader = None
+        self._pdf_data = None
+        self._pages_text = {}
+        self._pages_index = {}
+        for section in self.sections:
+            section.release_text()
+
     def locate_field_in_section(self,
                                 section_name: str,
                                 field_name: str
@@ -91,8 +227,8 @@ class DocumentWithSections(object):
         if section is not None:
             if section.is_located:
                 if field_name in section.fields.keys():
-                    candidate_tags = section.fields.get(field_name, None)
-                    if candidate_tags is not None:
+                    candidate_tags = section.field_candidate_tags(field_name, self.language)
+                    if candidate_tags:
                         iline, line, match, field = section.get_tag_candidates_lines(tags=candidate_tags,
                                                                                      ending_tags=section.field_tags)
                         if iline >= 0:
@@ -101,43 +237,38 @@ class DocumentWithSections(object):
                 tag_str = ""
         return tag_str
 
+    def extract_fields_in_section(self, section_name: str) -> Dict[str, str]:
+        """
+        Get all declared fields of a section, as locate_field_in_section would for each of them
+        :param section_name: name of the section
+        :return: dict of field name: field text, empty strings if the section is not located
+        """
+        section: DocumentSection = self._sections.get(section_name, None)
+        if section is None:
+            return {}
+        if not section.is_located:
+            return {field_name: "" for field_name in section.fields.keys()}
+        return section.extract_fields()
+
     def find_tag_in_page(self,
                          tag: str,
-                         page_number: int,
-                         space_sensitive=False,
-                         max_spaces_number=1) -> Tuple[str, int, int, int, int]:
+                         page_number: int) -> Tuple[str, int, int, int, int]:
         """
-        Find tag in page
+        Find tag in page, up to spaces and line breaks, as find_tags_in_pages finds it
 
-        :param max_spaces_number:
         :param tag: str, string to find
         :param page_number: int, page number to search in
-        :param space_sensitive: bool; if false, will look for a match up to random spaces
-        :return tuple of [matching tag, page number, position in page, line, position in line] if found,
-                None otherwise
-        """
-        # extract full text from page
-        text = self.get_page_text(page_number)
-        # normalize text
-        ntext = tu.normalize(text)
-        # get tag position in normalized text
-        # TODO remplacer par un regex, la recherche est encore sensible aux espaces intempestifs
-        # cela ne fonctionne pas s'il y a trop d'espaces dans le texte réel
-        tag_position = ntext.find(tu.normalize(tag))
-        tag_position = tu.compactify(ntext).find(tu.compactify(tu.normalize(tag)))
+        :return tuple of [matching tag, page number, position in page, line, position in line],
+                positions being offsets in the original page text, -1 if not found
+        """
+        # the page is normalized once, the search runs on its compact form to be insensitive to spaces
+        index = self.get_page_index(page_number)
+        tag_position = index.find_compact(tu.normalize(tag, compactform=True))
         iline = -1
         tag_position_in_line = -1
         if tag_position >= 0:
-            # get lines from text
-            # warning: this is not robust to line breaks
-            nlines = ntext.split("\n")
-            # look for the first line containing the tag
-            for iline, nline in enumerate(nlines):
-                if tu.normalize(tag) in nline:
-                    tag_position_in_line, _ = tu.search_for_tag(tag, nline, space_sensitive=space_sensitive)
-                    return tag, page_number, tag_position, iline, tag_position_in_line
-        else:
-            pass
+            # positions are mapped back to the original page text
+            iline, tag_position_in_line = index.line_position(tag_position)
         return tag, page_number, tag_position, iline, tag_position_in_line
 
     def find_tag_in_document(self,
@@ -157,25 +288,148 @@ class DocumentWithSections(object):
         :return tuple of (tag,
                           index of first page where tag is found,
                           tag position in page,
-                          line, position in line) if found, None otherwise
+                          line, position in line) if found, -1 values otherwise
 
         """
-        res = (tag, -1, -1, -1, -1)
-        for page_number, page in enumerate(self._pypdf_reader.pages):
-            if min_page <= page_number <= max_page:
-                res = self.find_tag_in_page(tag, page_number)
-                # look for the position of the first tag occurence in the page
-                if res[2] >= 0:
-                    return res
-        return res
+        # pages are extracted on demand, up to the first one containing the tag
+        for page_number in range(max(min_page, 0), min(max_page, self.nb_pages - 1) + 1):
+            res = self.find_tag_in_page(tag, page_number)
+            # look for the position of the first tag occurence in the page
+            if res[2] >= 0:
+                return res
+        return tag, -1, -1, -1, -1
 
-    def locate_sections(self):
+    def find_tags_in_pages(self, tags: List[str]) -> Dict[str, Dict[int, int]]:
         """
-        Locate all sections in a document
-        :return: modifies each section in the sections list
+        Find the first occurrence of several tags in each page, scanning every page only once
+        :param tags: list of str, tags to find
+        :return: dict of compact normalized tag: {page number: position of first occurrence in page}
         """
-        for section in self.sections:
-            section.locate_section_in_document(self)
+        matcher = tu.get_multi_tag_matcher(tuple(sorted(set(tu.compact_tag(tag) for tag in tags))))
+        occurrences = {ctag: {} for ctag in matcher.tags}
+        for page_number in range(self.nb_pages):
+            self._scan_page(matcher, page_number, occurrences)
+        return occurrences
+
+    def _scan_page(self,
+                   matcher: tu.MultiTagMatcher,
+                   page_number: int,
+                   occurrences: Dict[str, Dict[int, int]]):
+        """
+        Add the first occurrences of the tags of a matcher in a page to occurrences
+        """
+        index = self.get_page_index(page_number)
+        for ctag, position in matcher.first_occurrences(index.compact).items():
+            occurrences[ctag][page_number] = index.original_position_from_compact(position)
+
+    def find_tag_in_occurrences(self,
+                                tag: str,
+                                occurrences: Dict[str, Dict[int, int]],
+                                min_page=0,
+                                max_page=1000000) -> Tuple[str, int, int, int, int]:
+        """
+        Same as find_tag_in_document, from occurrences previously found by find_tags_in_pages
+        :param tag: str, string to find
+        :param occurrences: result of find_tags_in_pages, for a list of tags including tag
+        :param min_page: the first page to look for the tag in
+        :param max_page: the last page to look for the tag in
+        :return tuple of (tag,
+                          index of first page where tag is found,
+                          tag position in page,
+                          line, position in line), -1 if not found
+        """
+        pages = occurrences.get(tu.compact_tag(tag), None)
+        if pages is None:
+            # tag was not part of the scan
+            return self.find_tag_in_document(tag, min_page=min_page, max_page=max_page)
+        candidates = [page_number for page_number in pages.keys() if min_page <= page_number <= max_page]
+        if not candidates:
+            return tag, -1, -1, -1, -1
+        page_number = min(candidates)
+        position = pages[page_number]
+        iline, position_in_line = self.get_page_index(page_number).line_position(position)
+        return tag, page_number, position, iline, position_in_line
+
+    def locate_sections(self,
+                        section_names: Optional[List[str]] = None,
+                        first_pages: Optional[List[int]] = None) -> bool:
+        """
+        Locate sections in a document.
+        Pages are extracted on demand and scanned once, in order, for the start and end tags of the sections.
+        Sections are expected in the order they were added to the document, so that the start of a section
+        bounds the search for the tags of the previous one: the scan stops as soon as the pages left
+        cannot change where the asked sections start and end.
+        :param section_names: names of the sections to locate, all sections if None
+        :param first_pages: pages to scan first, such as the pages where the sections usually are.
+                            The other pages are not scanned if these pages alone bound the sections: the
+                            tags found in them are then assumed not to occur earlier in the other pages.
+                            A section is only deemed missing, or bounded by the start of the next section,
+                            once every page up to the start of the next section is scanned.
+                            Otherwise, the remaining pages are all scanned, in order.
+        :return: True if the sections were located from first_pages alone; modifies each asked section
+        """
+        names = list(self._sections.keys())
+        if section_names is None:
+            section_names = names
+        # asked sections, each with the section following it in the document
+        bounded_sections = [(self._sections[name],
+                             self._sections[names[iname + 1]] if iname + 1 < len(names) else None)
+                            for iname, name in enumerate(names) if name in section_names]
+        tags = []
+        for section, next_section in bounded_sections:
+            tags += section.start_tags + section.end_tags
+            if next_section is not None:
+                tags += next_section.start_tags
+        matcher = tu.get_multi_tag_matcher(tuple(sorted(set(tu.compact_tag(tag) for tag in tags))))
+        occurrences = {ctag: {} for ctag in matcher.tags}
+
+        scanned = set()
+        # pages 0 to nb_scanned_in_order - 1 are all scanned
+        nb_scanned_in_order = 0
+
+        def is_bounded():
+            return all(section.is_bounded_in_occurrences(occurrences, next_section, nb_scanned_in_order)
+                       for section, next_section in bounded_sections)
+
+        def scan(page_number: int):
+            nonlocal nb_scanned_in_order
+            self._scan_page(matcher, page_number, occurrences)
+            scanned.add(page_number)
+            while nb_scanned_in_order in scanned:
+                nb_scanned_in_order += 1
+
+        located_from_first_pages = False
+        if first_pages:
+            for page_number in sorted(set(first_pages)):
+                if 0 <= page_number < self.nb_pages:
+                    scan(page_number)
+                    if is_bounded():
+                        located_from_first_pages = True
+                        break
+            if not located_from_first_pages:
+                # a miss: the first pages gave no reliable bounds, the rest of the document is scanned
+                for page_number in range(self.nb_pages):
+                    if page_number not in scanned:
+                        scan(page_number)
+        else:
+            for page_number in range(self.nb_pages):
+                scan(page_number)
+                if is_bounded():
+                    break
+        for section, _ in bounded_sections:
+            section.locate_section_in_document(self, occurrences=occurrences)
+        return located_from_first_pages
+
+    def section_locations(self) -> List[lp.SectionLocation]:
+        """
+        Get where the located sections of the document start and end
+        :return: list of SectionLocation, in sections order
+        """
+        return [lp.SectionLocation(section=name,
+                                   start_page=section.start_page,
+                                   start_position=section.start_position,
+                                   end_page=section.end_page)
+                for name, section in self._sections.items() if section.is_located]
 
     def nb_sections_located(self):
         """
@@ -205,17 +459,7 @@ class DocumentWithSections(object):
         :param end_position: int, position in end page where to end
         :return: str, full text from pages interval
         """
-        text = ""
-        for ipage, page in enumerate(self._pypdf_reader.pages):
-            if start_page <= ipage <= end_page:
-                page_text = self.get_page_text(ipage)
-                if ipage == start_page:
-                    text += page_text[start_position:]
-                elif ipage == end_page:
-                    text += page_text[:end_position]
-                else:
-                    text += page_text
-        return text
+        return SectionView(self, start_page, start_position, end_page, end_position).text
 
     def insert(self, table: pd.DataFrame):
         """
@@ -226,41 +470,42 @@ class DocumentWithSections(object):
         doc_idx = self._name
         if doc_idx == "":
             return table
-        table.loc[doc_idx, "NbPages"] = self.nb_pages
-        table.loc[doc_idx, "NbSections"] = self.nb_sections_located()
+        tb.insert_row(table, doc_idx, {"NbPages": self.nb_pages,
+                                       "NbSections": self.nb_sections_located()})
 
 
 class DocumentCollector(object):
 
     def __init__(self, path: str):
         self._path = path
-        self._documents = pd.DataFrame()
+        self._documents = tb.TableBuffer()
+
+    @property
+    def documents(self) -> pd.DataFrame:
+        return self._documents.to_frame()
 
     def collect_documents(self,
                           istart: int = 0,
                           iend: int = 1000000,
                           verbose: bool = False):
         """
-            a function that scans a directory for pdf files and collects documents from them
+            a function that scans a directory or archive for pdf files and collects documents from them
             :param istart: int, index of first file to collect
             :param iend: int, index of last file to collect
             :param verbose: bool, if True, print information about the process
             :return:
             """
-        files = os.listdir(self._path)
+        source = src.open_source(self._path)
+        files = source.names()
         for ifile, file in enumerate(files):
             if istart <= ifile <= iend:
                 if verbose:
                     print("Collecting document {}".format(file))
-                fullpath = os.path.join(self._path, file)
                 doc = DocumentWithSections(self._path, file)
                 doc.locate_sections()
-                # get the file size
-                self._documents.loc[file, "Size"] = os.path.getsize(fullpath)
-                # get the number of pages
-                self._documents.loc[file, "Nb pages"] = len(doc.pypdf_reader.pages)
-                # get the number of located sections
-                self._documents.loc[file, "Nb sections"] = doc.nb_sections_located()
+                self._documents.insert_row(file, {"Size": source.stat(file)[0],
+                                                  "Nb pages": doc.nb_pages,
+                                                  "Nb sections": doc.nb_sections_located()})
         pass
 
     def write_doc_stats(self, name: str):
@@ -268,7 +513,65 @@ class DocumentCollector(object):
         Write document stats to csv file
         :return:
         """
-        self._documents.to_csv(os.path.join("./", name))
+        self.documents.to_csv(os.path.join("./", name))
+
+
+class SectionView(object):
+    """
+    A span of the text of a document, from a position in a start page to a position in an end page.
+    The view only holds page numbers and positions: its text and normalized text are read
+    from the document pages when asked for.
+    """
+
+    def __init__(self,
+                 document: DocumentWithSections,
+                 start_page: int,
+                 start_position: int,
+                 end_page: int,
+                 end_position: int):
+        """
+        :param document: document the view is taken from
+        :param start_page: page number where the view starts
+        :param start_position: position in start page where the view starts
+        :param end_page: page number where the view ends
+        :param end_position: position in end page where the view ends
+        """
+        self._document = document
+        self._start_page = start_page
+        self._start_position = start_position
+        self._end_page = end_page
+        self._end_position = end_position
+
+    def pieces(self) -> List[Tuple[int, Optional[int], Optional[int]]]:
+        """
+        Get the page slices making the view.
+        When the view starts and ends on the same page, the text goes to the end of the page.
+        :return: list of (page number, start position, end position), None positions standing for page bounds
+        """
+        pieces = []
+        for ipage in range(max(self._start_page, 0), min(self._end_page, self._document.nb_pages - 1) + 1):
+            if ipage == self._start_page:
+                pieces.append((ipage, self._start_position, None))
+            elif ipage == self._end_page:
+                pieces.append((ipage, None, self._end_position))
+            else:
+                pieces.append((ipage, None, None))
+        return pieces
+
+    @property
+    def text(self) -> str:
+        return "".join(self._document.get_page_text(ipage)[start:end] for ipage, start, end in self.pieces())
+
+    @property
+    def normalized(self) -> str:
+        """
+        Normalized text of the view, cut from the normalized texts of its pages
+        """
+        return "".join(self._document.get_page_index(ipage).normalized_slice(start, end)
+                       for ipage, start, end in self.pieces())
+
+    def __len__(self):
+        return sum(len(self._document.get_page_text(ipage)[start:end]) for ipage, start, end in self.pieces())
 
 
 class DocumentSection(object):
@@ -276,11 +579,17 @@ class DocumentSection(object):
     def __init__(self,
                  document: DocumentWithSections,
                  starttaglist: List[str] = None,
-                 endtaglist: List[str] = None):
+                 endtaglist: List[str] = None,
+                 spec: Optional[es.SectionSpec] = None):
+        """
+        :param document: document the section belongs to
+        :param starttaglist: tags that can start the section, by decreasing priority
+        :param endtaglist: tags that can end the section, by decreasing priority
+        :param spec: compiled spec of the section, shared with other documents, replaces the tag lists
+        """
         self._document = document
-        self._full_text = ""
-        self._starttaglist = starttaglist
-        self._endtaglist = endtaglist
+        self._view: Optional[SectionView] = None
+        self._spec = spec if spec is not None else es.SectionSpec(start_tags=starttaglist, end_tags=endtaglist)
         self._start_page = -1
         self._end_page = -1
         self._start_tag = None
@@ -289,17 +598,22 @@ class DocumentSection(object):
         self._end_tag_position = -1
         self._start_tag_line_number = -1
         self._start_tag_position_in_line = -1
-        self._fields = {}
-        self._field_tags = []
         self._is_located = False
+        self._text_index = None
+        self._normalized_text = None
+        self._normalized_lines = None
 
     @property
     def is_located(self):
         return self._is_located
 
     @property
-    def full_text(self):
-        return self._full_text
+    def full_text(self) -> str:
+        return self._view.text if self._view is not None else ""
+
+    @property
+    def view(self) -> Optional[SectionView]:
+        return self._view
 
     @property
     def start_page(self):
@@ -317,6 +631,18 @@ class DocumentSection(object):
     def end_position(self):
         return self._end_tag_position
 
+    @property
+    def start_tags(self) -> List[str]:
+        return list(self._spec.start_tags)
+
+    @property
+    def end_tags(self) -> List[str]:
+        return list(self._spec.end_tags)
+
+    @property
+    def spec(self) -> es.SectionSpec:
+        return self._spec
+
     @property
     def start_tag(self):
         return self._start_tag
@@ -340,38 +666,63 @@ class DocumentSection(object):
 
     @property
     def fields(self):
-        return self._fields
+        return self._spec.fields
 
     @property
     def field_tags(self):
-        return self._field_tags
+        return self._spec.field_tags
 
-    def declare_field(self, name: str, tags: List[str]):
+    def declare_field(self, name: str, tags: List[str], language: str = ""):
         """
         Declare a tag that can be used to delimitate a fieldœ
         :param name:    name of the field
         :param tags:    list of tags that can be used to delimitate the field
+        :param language: language of the tags, "" for language-neutral tags. Tags declared for several
+                         languages are merged, in declaration order, into the tags of the field used
+                         when the language is unknown.
         :return: None. Self attributes are updated
         """
-        self._fields[name] = tags
-        self._field_tags += tags
+        if self._spec.is_compiled:
+            # the compiled spec is shared with other documents
+            self._spec = self._spec.copy()
+        self._spec.declare_field(name=name, tags=tags, language=language)
+
+    def field_candidate_tags(self, name: str, language: str = "") -> List[str]:
+        """
+        Get the tags to look for a field with, in the order they are tried
+        :param name: name of the field
+        :param language: document language, "" if unknown
+        :return: tags declared for the language, then the language-neutral tags; the tags of all languages
+                 if the language is unknown or has no tags for the field
+        """
+        return self._spec.field_candidate_tags(name, language)
 
     def locate_section_in_document(self,
                                    d: DocumentWithSections,
                                    min_page=0,
-                                   max_page=1000000):
+                                   max_page=1000000,
+                                   occurrences: Dict[str, Dict[int, int]] = None):
         """
         Locate section in document from start and end tags
         :param min_page: first page to look for tags in
         :param max_page:   last page to look for tags in
         :param d: CreditDocument, document to locate section in
+        :param occurrences: optional tag occurrences already found by d.find_tags_in_pages,
+                            if None the document pages are scanned for each tag
         :return: None. Self attributes are updated
         """
+        self.release_text()
+        if occurrences is None:
+            def find_tag(tag, min_page, max_page):
+                return d.find_tag_in_document(tag, min_page=min_page, max_page=max_page)
+        else:
+            def find_tag(tag, min_page, max_page):
+                return d.find_tag_in_occurrences(tag, occurrences, min_page=min_page, max_page=max_page)
         # look for the first tag in the starting list matching the document
-        for start_tag in self._starttaglist:
-            start_tag_tuple = d.find_tag_in_document(start_tag,
-                                                     min_page=min_page,
-                                                     max_page=max_page)
+        for start_tag in self._spec.start_tags:
+            start_tag_tuple = find_tag(start_tag,
+                                       min_page=min_page,
+                                       max_page=max_page)
             if start_tag_tuple[1] >= 0:
                 (self._start_tag,
                  self._start_page,
@@ -381,10 +732,10 @@ class DocumentSection(object):
                 break
         # look for the first tag in the starting list matching the document
         # The purpose is to delimitate the section starting with the first tag
-        for end_tag in self._endtaglist:
-            end_tag_tuple = d.find_tag_in_document(end_tag,
-                                                   min_page=self._start_page,
-                                                   max_page=max_page)
+        for end_tag in self._spec.end_tags:
+            end_tag_tuple = find_tag(end_tag,
+                                     min_page=self._start_page,
+                                     max_page=max_page)
             if end_tag_tuple[1] >= 0:
                 (self._end_tag,
                  self._end_page,
@@ -393,15 +744,92 @@ class DocumentSection(object):
         if self._start_page < 0:
             self._is_located = False
 
+    def is_bounded_in_occurrences(self,
+                                  occurrences: Dict[str, Dict[int, int]],
+                                  next_section: Optional["DocumentSection"] = None,
+                                  nb_scanned_in_order: int = 1000000) -> bool:
+        """
+        Tell whether the pages not scanned yet can change where the section starts and ends.
+        They cannot once the first start tag and first end tag of the section are found.
+        Since sections come in order, they cannot either once the next section has started:
+        its start bounds the search for the tags of the section.
+        The next section is only deemed started if all pages before its start are scanned: otherwise a page
+        not scanned yet may hold the start of the section, or a start or end tag of higher priority.
+        :param occurrences: tag occurrences in the pages scanned so far, as given by find_tags_in_pages
+        :param next_section: section following this one in the document, None if it is the last one
+        :param nb_scanned_in_order: number of pages scanned from the first page without a gap,
+                                    all pages scanned so far if they were scanned in order
+        :return: True if the section is bounded
+        """
+        def first_found(tags: List[str], min_page: int) -> Tuple[int, int]:
+            # priority and page of the first tag of the list found at or after min_page
+            for itag, tag in enumerate(tags):
+                pages = [page for page in occurrences.get(tu.compact_tag(tag), {}).keys() if page >= min_page]
+                if pages:
+                    return itag, min(pages)
+            return -1, -1
+
+        next_started = next_section is not None and any(page < nb_scanned_in_order
+                                                        for tag in next_section.start_tags
+                                                        for page in occurrences.get(tu.compact_tag(tag), {}))
+        istart, start_page = first_found(self._spec.start_tags, 0)
+        if istart != 0 and not next_started:
+            return False
+        if istart < 0:
+            # missing section
+            return True
+        iend, _ = first_found(self._spec.end_tags, start_page)
+        return iend == 0 or (iend > 0 and next_started)
+
     def get_full_section_text(self):
         """
-        Get full section text
-        :return: str, full section text
+        Get full section text, as a view over the document pages
+        :return: None. Self attributes are updated
+        """
+        self._view = SectionView(self._document,
+                                 self._start_page,
+                                 self._start_tag_position,
+                                 self._end_page,
+                                 self._end_tag_position)
+        self._text_index = None
+        self._normalized_text = None
+        self._normalized_lines = None
+
+    def release_text(self):
+        """
+        Forget section text and its normalized forms, they will be rebuilt on demand
+        :return: None. Self attributes are updated
         """
-        self._full_text = self._document.get_full_text(self._start_page,
-                                                       self._start_tag_position,
-                                                       self._end_page,
-                                                       self._end_tag_position)
+        self._view = None
+        self._text_index = None
+        self._normalized_text = None
+        self._normalized_lines = None
+
+    def get_section_index(self) -> tu.TextIndex:
+        """
+        Get the normalized text index of the section, built once
+        :return: TextIndex of the full section text
+        """
+        if self._text_index is None:
+            self._text_index = tu.TextIndex(self._load_view().text)
+        return self._text_index
+
+    def _load_view(self) -> SectionView:
+        if self._view is None:
+            self.get_full_section_text()
+        return self._view
+
+    @property
+    def normalized_text(self) -> str:
+        if self._normalized_text is None:
+            self._normalized_text = self._load_view().normalized
+        return self._normalized_text
+
+    @property
+    def normalized_lines(self) -> List[str]:
+        if self._normalized_lines is None:
+            self._normalized_lines = self.normalized_text.split("\n")
+        return self._normalized_lines
 
     def locate_tag(self,
                    tag: str,
@@ -424,48 +852,87 @@ class DocumentSection(object):
         """
         if not self.is_located:
             self.locate_section_in_document(self._document)
-        if self._full_text == "":
-            self.get_full_section_text()
-        ntag = tu.normalize(tag)
-        ntext = tu.normalize(self._full_text)
+        ntag = tu.normalize_tag(tag)
+        ntext = self.normalized_text
+        nending_tags = [tu.normalize_tag(t) for t in ending_tags] if ending_tags is not None else None
+        matcher = tu.get_tag_matcher(ntag, space_sensitive, max_space_number)
         # looks first for the tag in the original text, not split into lines
-        position = -1
-        position, _ = tu.search_for_tag(ntag,
-                                        text=ntext,
-                                        space_sensitive=space_sensitive,
-                                        max_spaces_number=max_space_number)
+        position, _ = matcher.search(ntext)
         if position < 0:
             return -1, -1, "", "", ""
         # cut the text into lines along carriage returns
-        lines = ntext.split("\n") if split_lines_by_cr else [ntext]
+        lines = self.normalized_lines if split_lines_by_cr else [ntext]
         for iline, line in enumerate(lines):
             inextline = iline + 1
             # find start position and effective match of ntag
-            position, match = tu.search_for_tag(ntag,
-                                                line,
-                                                space_sensitive=space_sensitive,
-                                                max_spaces_number=max_space_number)
+            position, match = matcher.search(line)
             # if tag is found up to spaces
             if position >= 0:
-                return iline, iline, line[position:-1], match, tu.field_between_tags(line, match, ending_tags)
+                return iline, iline, line[position:-1], match, tu.field_between_tags(line, match, nending_tags,
+                                                                                     do_normalize=False)
             # if tag is not found in a line that could contain it:
             elif inextline < len(lines):
                 line += lines[inextline]
-                position, match = tu.search_for_tag(ntag,
-                                                    line,
-                                                    space_sensitive=space_sensitive,
-                                                    max_spaces_number=max_space_number)
+                position, match = matcher.search(line)
                 if position >= 0:
-                    field = tu.field_between_tags(line, match)
+                    field = tu.field_between_tags(line, match, do_normalize=False)
                     # if the string bit following the match in current line is empty,
                     # and if end has not been reached, then look for next string
                     if len(tu.compactify(field)) == 0 and inextline < len(lines) - 1:
                         inextline += 1
                         line += lines[inextline]
-                    return iline, inextline, line[position:-1], match, tu.field_between_tags(line, match)
+                    return iline, inextline, line[position:-1], match, tu.field_between_tags(line, match,
+                                                                                             do_normalize=False)
 
         return -1, -1, "", "", ""
 
+    def extract_fields(self,
+                       ending_tags: List[str] = None,
+                       space_sensitive=False,
+                       max_space_number=1) -> Dict[str, str]:
+        """
+        Get all declared fields of the section in one scan of its normalized text.
+        Gives the same result as get_tag_candidates_lines for each field: the first candidate tag found
+        starts the field, which ends at the closest ending tag.
+        :param ending_tags: list of str, tags that can end a field, defaults to all field tags of the section
+        :param space_sensitive: bool, if False, looks for tags with possible spaces in between
+        :param max_space_number: maximum number of spaces between characters of tags
+        :return: dict of field name: field text, empty string if no candidate tag is found
+        """
+        if not self.is_located:
+            self.locate_section_in_document(self._document)
+        ntext = self.normalized_text
+        # ending tags are looked for once, in their declaration order
+        if ending_tags is None:
+            nending_tags = self._spec.normalized_ending_tags
+            ending_matcher = self._spec.ending_matcher
+        else:
+            nending_tags = list(dict.fromkeys(tu.normalize_tag(t) for t in ending_tags))
+            ending_matcher = tu.get_multi_tag_matcher(tuple(sorted(set(nending_tags))))
+        ending_positions = ending_matcher.all_occurrences(ntext)
+        res = {}
+        language = self._document.language
+        for field_name in self._spec.fields.keys():
+            res[field_name] = ""
+            for matcher in self._spec.candidate_matchers(field_name, language, space_sensitive, max_space_number):
+                position, match = matcher.search(ntext)
+                if position < 0:
+                    continue
+                start = tu.position_after_last(ntext, match)
+                length = len(ntext) - start
+                for nending_tag in nending_tags:
+                    # first occurrence of the ending tag fitting in the field, as shortened so far
+                    if nending_tag == "":
+                        length = 0
+                        continue
+                    positions = ending_positions.get(nending_tag, [])
+                    ipos = bisect_left(positions, start)
+                    if ipos < len(positions) and positions[ipos] + len(nending_tag) <= start + length:
+                        length = positions[ipos] - start
+                res[field_name] = ntext[start:start + length].lstrip().rstrip()
+                break
+        return res
+
     def get_tag_candidates_lines(self,
                                  tags: List[str],
                                  ending_tags: List[str] = None) -> Tuple[int, str, str, str]:
@@ -481,7 +948,7 @@ class DocumentSection(object):
         iline = -1
         for tag in tags:
             if ending_tags is None:
-                ending_tags = self._field_tags
+                ending_tags = self._spec.field_tags
             iline, _, line, match, field = self.locate_tag(tag, ending_tags=ending_tags)
             if iline >= 0:
                 return iline, line, match, field
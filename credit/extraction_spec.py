@@ -0,0 +1,261 @@
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from . import textutils as tu
+
+# layout of the credit reports, in document order: start and end tags of each section, by decreasing priority,
+# and the fields of the section as (field name, language, candidate tags by decreasing priority)
+CREDIT_REPORT_LAYOUT: List[Dict[str, object]] = [
+    {"section": "Summary",
+     "start_tags": ["Etude client", "Etude garantie", "Etude", "Business report"],
+     "end_tags": ["Identité"],
+     "fields": [("RequestedAmount", "FR", ["garantie demandee - duree", "garantie demandee", "encours demande"]),
+                ("RequestedAmount", "PT", ["pedida"]),
+                ("RequestedAmount", "ES", ["solicitada"]),
+                ("GrantedAmount", "FR", ["garantie accordee - duree", "garantie accordee", "encours accorde"]),
+                ("GrantedAmount", "PT", ["accordada"]),
+                ("GrantedAmount", "ES", ["concedida", "aprobada"]),
+                ("RequestDate", "FR", ["Date"]),
+                ("StartDate", "FR", ["Date debut", "Debut de la garantie"]),
+                ("EndDate", "FR", ["Date fin", "Fin de la garantie"])]},
+    {"section": "Identity",
+     "start_tags": ["Identité"],
+     "end_tags": ["Activité - Modèle économique", "Activité"],
+     "fields": [("Identifier", "FR", ["Siren", "Identifiant"]),
+                ("VatNumber", "FR", ["N° TVA", "TVA"]),
+                ("CreationDate", "FR", ["Date de création"]),
+                ("ActivityDescription", "FR", ["Activité"]),
+                ("FullName", "FR", ["Raison sociale", "Nom"]),
+                ("IndustryCode", "FR", ["Code APE"]),
+                ("ZipCode", "FR", ["Code postal"]),
+                ("Address", "FR", ["Adresse"]),
+                ("City", "FR", ["CP, Ville", "Ville"]),
+                ("BankActivity", "FR", ["Activité bancaire"]),
+                ("Capital", "FR", ["Capital social", "Capital"]),
+                ("LegalForm", "FR", ["Forme juridique"]),
+                ("NbEmployees", "FR", ["Effectif"]),
+                ("Director", "FR", ["Dirigeant"]),
+                ("BusinessAssets", "FR", ["Fonds de commerce"]),
+                ("LegalProceedings", "FR", ["Procédures judiciaires", "Poursuites judiciaires"])]},
+    {"section": "Bank",
+     "start_tags": ["informations bancaires"],
+     "end_tags": ["informations financieres"]},
+    {"section": "KeyFinancials",
+     "start_tags": ["informations financieres", "Chiffres clés"],
+     "end_tags": ["BFR"]},
+    {"section": "BFR",
+     "start_tags": ["BFR"],
+     "end_tags": ["Analyse structurelle"]},
+    {"section": "StructuralAnalysis",
+     "start_tags": ["Analyse structurelle"],
+     "end_tags": ["Ratios de rotation"]},
+    {"section": "TurnoverRatios",
+     "start_tags": ["Ratios de rotation"],
+     "end_tags": ["Analyse des postes d'achat"]},
+    {"section": "TaxAndSocialDefaults",
+     "start_tags": ["Defauts de paiements sociaux et fiscaux"],
+     "end_tags": ["Analyse de factures fournisseurs"]},
+    {"section": "BillingAnalysis",
+     "start_tags": ["Analyse de factures fournisseurs"],
+     "end_tags": ["Votre expérience de paiement"]},
+]
+
+
+class SectionSpec(object):
+    """
+    Start and end tags of a section and candidate tags of its fields.
+    A compiled spec also holds the normalized tags and compiled patterns used to extract the fields;
+    it is read-only and shared by the sections of all documents.
+    """
+
+    def __init__(self,
+                 name: str = "",
+                 start_tags: List[str] = None,
+                 end_tags: List[str] = None):
+        """
+        :param name: section name
+        :param start_tags: tags that can start the section, by decreasing priority
+        :param end_tags: tags that can end the section, by decreasing priority
+        """
+        self._name = name
+        self._start_tags = tuple(start_tags) if start_tags is not None else ()
+        self._end_tags = tuple(end_tags) if end_tags is not None else ()
+        self._fields: Dict[str, List[str]] = {}
+        self._language_fields: Dict[str, Dict[str, List[str]]] = {}
+        # tags declared without a language, tried whatever the document language
+        self._neutral_fields: Dict[str, List[str]] = {}
+        self._field_tags: List[str] = []
+        self._is_compiled = False
+        self._reset_compiled()
+
+    def _reset_compiled(self):
+        self._nending_tags = None
+        self._ending_matcher = None
+        self._candidate_matchers: Dict[Tuple[str, str, bool, int], List[tu.TagMatcher]] = {}
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def start_tags(self) -> Tuple[str, ...]:
+        return self._start_tags
+
+    @property
+    def end_tags(self) -> Tuple[str, ...]:
+        return self._end_tags
+
+    @property
+    def fields(self) -> Dict[str, List[str]]:
+        return self._fields
+
+    @property
+    def field_tags(self) -> List[str]:
+        return self._field_tags
+
+    @property
+    def is_compiled(self) -> bool:
+        return self._is_compiled
+
+    def declare_field(self, name: str, tags: List[str], language: str = ""):
+        """
+        Declare the candidate tags of a field
+        :param name: name of the field
+        :param tags: list of tags that can be used to delimitate the field
+        :param language: language of the tags, "" for language-neutral tags. Tags declared for several
+                         languages are merged, in declaration order, into the tags of the field used
+                         when the language is unknown.
+        :return: None. Self attributes are updated
+        """
+        if self._is_compiled:
+            raise ValueError(f"Cannot declare field {name}: the spec of section {self._name} is compiled")
+        if language:
+            self._language_fields.setdefault(language, {})[name] = list(tags)
+            known_tags = self._fields.get(name, [])
+            self._fields[name] = known_tags + [t for t in tags if t not in known_tags]
+        else:
+            self._fields[name] = tags
+            self._neutral_fields[name] = list(tags)
+        self._field_tags += tags
+        self._reset_compiled()
+
+    def field_candidate_tags(self, name: str, language: str = "") -> List[str]:
+        """
+        Get the tags to look for a field with, in the order they are tried
+        :param name: name of the field
+        :param language: document language, "" if unknown
+        :return: tags declared for the language, then the language-neutral tags; the tags of all languages
+                 if the language is unknown or has no tags for the field
+        """
+        tags = self._fields.get(name, [])
+        language_tags = self._language_fields.get(language, {}).get(name, None)
+        if language_tags is None:
+            return tags
+        return language_tags + [t for t in self._neutral_fields.get(name, []) if t not in language_tags]
+
+    @property
+    def normalized_ending_tags(self) -> List[str]:
+        """
+        Normalized field tags, without duplicates, in declaration order
+        """
+        if self._nending_tags is None:
+            self._nending_tags = list(dict.fromkeys(tu.normalize_tag(t) for t in self._field_tags))
+        return self._nending_tags
+
+    @property
+    def ending_matcher(self) -> tu.MultiTagMatcher:
+        """
+        Matcher of all normalized field tags, to find where fields end in a single pass
+        """
+        if self._ending_matcher is None:
+            self._ending_matcher = tu.MultiTagMatcher(tuple(sorted(set(self.normalized_ending_tags))))
+        return self._ending_matcher
+
+    def candidate_matchers(self,
+                           name: str,
+                           language: str = "",
+                           space_sensitive: bool = False,
+                           max_space_number: int = 1) -> List[tu.TagMatcher]:
+        """
+        Get the compiled matchers of the candidate tags of a field, in the order they are tried
+        :param name: name of the field
+        :param language: document language, "" if unknown
+        :param space_sensitive: if False, tags are matched with possible spaces in between their characters
+        :param max_space_number: maximum number of spaces between characters of tags
+        :return: list of TagMatcher
+        """
+        key = (name, language, space_sensitive, max_space_number)
+        matchers = self._candidate_matchers.get(key, None)
+        if matchers is None:
+            matchers = [tu.get_tag_matcher(tu.normalize_tag(tag), space_sensitive, max_space_number)
+                        for tag in self.field_candidate_tags(name, language)]
+            self._candidate_matchers[key] = matchers
+        return matchers
+
+    def compile(self) -> "SectionSpec":
+        """
+        Normalize the tags and compile the patterns of the spec, which becomes read-only
+        :return: self
+        """
+        for language in [""] + list(self._language_fields.keys()):
+            for name in self._fields.keys():
+                self.candidate_matchers(name, language)
+        _ = self.ending_matcher
+        self._is_compiled = True
+        return self
+
+    def copy(self) -> "SectionSpec":
+        """
+        Get a modifiable copy of the spec
+        :return: SectionSpec, not compiled
+        """
+        spec = SectionSpec(self._name, list(self._start_tags), list(self._end_tags))
+        spec._fields = {name: list(tags) for name, tags in self._fields.items()}
+        spec._language_fields = {language: {name: list(tags) for name, tags in fields.items()}
+                                 for language, fields in self._language_fields.items()}
+        spec._neutral_fields = {name: list(tags) for name, tags in self._neutral_fields.items()}
+        spec._field_tags = list(self._field_tags)
+        return spec
+
+
+class ExtractionSpec(object):
+    """
+    Compiled layout of a kind of documents: its sections, in document order
+    """
+
+    def __init__(self, sections: List[SectionSpec]):
+        self._sections = sections
+        self._sections_by_name = {section.name: section for section in sections}
+
+    @property
+    def sections(self) -> List[SectionSpec]:
+        return self._sections
+
+    def section(self, name: str) -> SectionSpec:
+        return self._sections_by_name[name]
+
+
+def compile_spec(layout: List[Dict[str, object]]) -> ExtractionSpec:
+    """
+    Compile a document layout
+    :param layout: list of sections, each a dict with keys "section", "start_tags", "end_tags"
+                   and optionally "fields", as in CREDIT_REPORT_LAYOUT
+    :return: ExtractionSpec
+    """
+    sections = []
+    for section_layout in layout:
+        section = SectionSpec(section_layout["section"], section_layout["start_tags"], section_layout["end_tags"])
+        for name, language, tags in section_layout.get("fields", []):
+            section.declare_field(name=name, tags=tags, language=language)
+        sections.append(section.compile())
+    return ExtractionSpec(sections)
+
+
+@lru_cache(maxsize=1)
+def get_credit_report_spec() -> ExtractionSpec:
+    """
+    Get the compiled layout of the credit reports, built once per process
+    and inherited by worker processes forked after it is built
+    :return: ExtractionSpec
+    """
+    return compile_spec(CREDIT_REPORT_LAYOUT)
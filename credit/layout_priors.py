@@ -0,0 +1,168 @@
+import json
+import os
+from typing import Dict, List, NamedTuple
+
+import pandas as pd
+
+
+class SectionLocation(NamedTuple):
+    """
+    Where a section was found in a document
+    """
+    section: str
+    start_page: int
+    start_position: int
+    end_page: int
+
+
+# pages are recorded by their relative position in the document, in NB_BINS bins
+NB_BINS = 20
+
+
+def page_bin(page: int, nb_pages: int) -> int:
+    """
+    Get the bin of the relative position of a page in a document
+    :param page: page number
+    :param nb_pages: number of pages of the document
+    :return: bin number, between 0 and NB_BINS - 1
+    """
+    return min(NB_BINS - 1, page * NB_BINS // max(1, nb_pages))
+
+
+class LayoutPriors(object):
+    """
+    Pages where the sections of each report template were found, learned from collected documents
+    and stored as a json file. Pages are recorded by their relative position in the document, since sections
+    of longer reports start further in the document.
+    For a new document of a known template, the pages where its sections were most often found are scanned first.
+    """
+
+    def __init__(self,
+                 path: str = "",
+                 min_share: float = 0.05):
+        """
+        :param path: full path of the json file of the priors; it is loaded if it exists
+        :param min_share: a page is part of the window of a section if the section started or ended
+                          at its relative position in at least this share of the documents of the template
+        """
+        self._path = path
+        self._min_share = min_share
+        # template: number of documents
+        self._nb_documents: Dict[str, int] = {}
+        # template: section: page bin: number of documents where the section starts / ends in the bin
+        self._start_pages: Dict[str, Dict[str, Dict[int, int]]] = {}
+        self._end_pages: Dict[str, Dict[str, Dict[int, int]]] = {}
+        self._nb_hits = 0
+        self._nb_lookups = 0
+        if path and os.path.isfile(path):
+            self.load()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def templates(self) -> List[str]:
+        return list(self._nb_documents.keys())
+
+    @property
+    def nb_lookups(self) -> int:
+        return self._nb_lookups
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Share of the lookups where the sections were located from the prior window alone, nan without lookups
+        """
+        return self._nb_hits / self._nb_lookups if self._nb_lookups > 0 else float("nan")
+
+    def record(self, template: str, nb_pages: int, locations: List[SectionLocation]):
+        """
+        Record where the sections of a document were found
+        :param template: template of the document
+        :param nb_pages: number of pages of the document
+        :param locations: locations of the sections found in the document
+        :return: None. Self attributes are updated
+        """
+        self._nb_documents[template] = self._nb_documents.get(template, 0) + 1
+        for location in locations:
+            if location.start_page < 0:
+                continue
+            starts = self._start_pages.setdefault(template, {}).setdefault(location.section, {})
+            start_bin = page_bin(location.start_page, nb_pages)
+            starts[start_bin] = starts.get(start_bin, 0) + 1
+            if location.end_page >= 0:
+                ends = self._end_pages.setdefault(template, {}).setdefault(location.section, {})
+                end_bin = page_bin(location.end_page, nb_pages)
+                ends[end_bin] = ends.get(end_bin, 0) + 1
+
+    def record_lookup(self, hit: bool):
+        """
+        Count a lookup of the priors
+        :param hit: True if the sections were located from the prior window alone
+        :return: None. Self attributes are updated
+        """
+        self._nb_lookups += 1
+        if hit:
+            self._nb_hits += 1
+
+    def window(self, template: str, section_names: List[str], nb_pages: int) -> List[int]:
+        """
+        Get the pages to scan first to locate sections in a document of a template
+        :param template: template of the document
+        :param section_names: names of the sections to locate
+        :param nb_pages: number of pages of the document
+        :return: sorted page numbers, empty if the template is unknown
+        """
+        nb_documents = self._nb_documents.get(template, 0)
+        if nb_documents == 0:
+            return []
+        bins = set()
+        for counts in [self._start_pages.get(template, {}), self._end_pages.get(template, {})]:
+            for section_name in section_names:
+                bins.update(b for b, count in counts.get(section_name, {}).items()
+                            if count >= self._min_share * nb_documents)
+        return [page for page in range(nb_pages) if page_bin(page, nb_pages) in bins]
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Get the priors as a table
+        :return: table indexed by (template, section), with the number of documents of the template,
+                 the most frequent relative position of the start page and its share
+        """
+        rows = {}
+        for template, sections in self._start_pages.items():
+            for section_name, counts in sections.items():
+                start_bin = max(counts.keys(), key=lambda b: counts[b])
+                rows[(template, section_name)] = {"NbDocuments": self._nb_documents[template],
+                                                  "RelativeStartPage": start_bin / NB_BINS,
+                                                  "StartPageShare": counts[start_bin] / self._nb_documents[template]}
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+    def load(self):
+        """
+        Load priors from their json file
+        :return: None. Self attributes are updated
+        """
+        with open(self._path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        def int_pages(counts):
+            # json object keys are strings
+            return {template: {section: {int(b): count for b, count in bins.items()}
+                               for section, bins in sections.items()}
+                    for template, sections in counts.items()}
+
+        self._nb_documents = data["nb_documents"]
+        self._start_pages = int_pages(data["start_pages"])
+        self._end_pages = int_pages(data["end_pages"])
+
+    def save(self):
+        """
+        Write priors to their json file
+        :return: None
+        """
+        with open(self._path, "w", encoding="utf-8") as f:
+            json.dump({"nb_documents": self._nb_documents,
+                       "start_pages": self._start_pages,
+                       "end_pages": self._end_pages}, f, ensure_ascii=False, indent=1)
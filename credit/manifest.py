@@ -0,0 +1,139 @@
+import hashlib
+import os
+from typing import BinaryIO, Dict, NamedTuple, Optional
+import pandas as pd
+from . import sources as src
+
+
+class ManifestEntry(NamedTuple):
+    """
+    State of a processed file
+    """
+    size: int
+    mtime: float
+    content_hash: str
+    parser_version: str
+
+
+def file_hash(fullpath: str) -> str:
+    """
+    Hash of a file content, same digest as page_cache.content_hash
+    :param fullpath: full path of the file
+    :return: hexadecimal sha1 digest
+    """
+    with open(fullpath, "rb") as f:
+        return stream_hash(f)
+
+
+def stream_hash(stream: BinaryIO) -> str:
+    """
+    Hash of the content of a binary stream, read by chunks
+    :param stream: binary file object, e.g. an archive member
+    :return: hexadecimal sha1 digest
+    """
+    sha = hashlib.sha1()
+    for chunk in iter(lambda: stream.read(1 << 20), b""):
+        sha.update(chunk)
+    return sha.hexdigest()
+
+
+class CollectionManifest(object):
+    """
+    Manifest of the files already processed by a collector, stored as a csv file.
+    A file needs processing again only if it is new, if its content changed,
+    or if it was processed by another parser version.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: full path of the manifest csv file; it is loaded if it exists
+        """
+        self._path = path
+        self._entries: Dict[str, ManifestEntry] = {}
+        # hashes computed by needs_processing, reused when the file is recorded
+        self._hashes: Dict[str, str] = {}
+        if os.path.isfile(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name: str):
+        return name in self._entries
+
+    @property
+    def path(self):
+        return self._path
+
+    def get(self, name: str) -> Optional[ManifestEntry]:
+        return self._entries.get(name, None)
+
+    def load(self):
+        """
+        Load manifest from its csv file
+        :return: None. Self attributes are updated
+        """
+        # modification times are compared exactly: they are read back as they were written
+        table = pd.read_csv(self._path, index_col=0, dtype={"ContentHash": str, "ParserVersion": str},
+                            float_precision="round_trip")
+        self._entries = {name: ManifestEntry(size=int(row["Size"]),
+                                             mtime=float(row["MTime"]),
+                                             content_hash=row["ContentHash"],
+                                             parser_version=row["ParserVersion"])
+                         for name, row in table.to_dict("index").items()}
+
+    def save(self):
+        """
+        Write manifest to its csv file
+        :return: None
+        """
+        table = pd.DataFrame.from_dict({name: entry._asdict() for name, entry in self._entries.items()},
+                                       orient="index",
+                                       columns=list(ManifestEntry._fields))
+        table.columns = ["Size", "MTime", "ContentHash", "ParserVersion"]
+        table.to_csv(self._path)
+
+    def needs_processing(self, docpath: str, name: str, parser_version: str) -> bool:
+        """
+        Tells whether a file is new or changed since it was processed
+        :param docpath: directory or archive containing the file
+        :param name: file name, or member name in the archive
+        :param parser_version: version of the parser that would process the file
+        :return: True if the file has to be processed
+        """
+        entry = self._entries.get(name, None)
+        if entry is None or entry.parser_version != parser_version:
+            return True
+        source = src.open_source(docpath)
+        size, mtime = source.stat(name)
+        if size == entry.size and mtime == entry.mtime:
+            return False
+        # the file was touched or copied: it changed only if its content did
+        with source.open(name) as f:
+            content_hash = stream_hash(f)
+        if content_hash != entry.content_hash:
+            self._hashes[name] = content_hash
+            return True
+        self._entries[name] = entry._replace(size=size, mtime=mtime)
+        return False
+
+    def record(self, docpath: str, name: str, parser_version: str, content_hash: str = ""):
+        """
+        Record a file as processed
+        :param docpath: directory or archive containing the file
+        :param name: file name, or member name in the archive
+        :param parser_version: version of the parser that processed the file
+        :param content_hash: hash of the content that was processed, if known; otherwise the hash computed
+                             by needs_processing is used, and the file is only read again if there is none
+        :return: None. Self attributes are updated
+        """
+        source = src.open_source(docpath)
+        size, mtime = source.stat(name)
+        content_hash = content_hash or self._hashes.pop(name, "")
+        if not content_hash:
+            with source.open(name) as f:
+                content_hash = stream_hash(f)
+        self._entries[name] = ManifestEntry(size=size,
+                                            mtime=mtime,
+                                            content_hash=content_hash,
+                                            parser_version=parser_version)
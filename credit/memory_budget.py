@@ -0,0 +1,146 @@
+import os
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from . import page_cache as pc
+
+
+class MemoryBudget(object):
+    """
+    Bounds the memory taken by the page texts and page indexes that documents keep in memory.
+    Pages are accounted in use order: once the budget is exceeded, the least recently used ones are spilled,
+    i.e. dropped from their document, which reads them back from the on-disk page cache when needed again.
+    A budget is shared by the documents of a process. Worker processes get their own: a budget sent to a worker,
+    e.g. with each task of a process pool, is unpickled as the same budget for all the tasks of the worker.
+    """
+
+    def __init__(self,
+                 max_bytes: int,
+                 page_cache: pc.PageTextCache):
+        """
+        :param max_bytes: memory budget of the pages held by documents, in bytes
+        :param page_cache: on-disk page cache the pages are spilled to, used by documents created without one
+        """
+        self._max_bytes = max_bytes
+        self._page_cache = page_cache
+        # weak references to the documents holding accounted pages, by document id
+        self._documents: Dict[int, weakref.ref] = {}
+        # (document id, page number): bytes, least recently used first
+        self._pages: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+        self._nb_bytes = 0
+        self._nb_spilled = 0
+        # identifies the budget across processes
+        self._token = uuid.uuid4().hex
+
+    def __reduce__(self):
+        # documents are not shared between processes: each worker gets one empty budget of the same size
+        return _process_budget, (self._token, self._max_bytes, self._page_cache)
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def page_cache(self) -> pc.PageTextCache:
+        return self._page_cache
+
+    @property
+    def nb_bytes(self) -> int:
+        return self._nb_bytes
+
+    @property
+    def nb_spilled(self) -> int:
+        return self._nb_spilled
+
+    def add(self, document, page_number: int, nb_bytes: int):
+        """
+        Account memory newly taken by a page of a document, and spill pages if the budget is exceeded
+        :param document: DocumentWithSections holding the page
+        :param page_number: page number
+        :param nb_bytes: memory taken, in bytes
+        :return: None
+        """
+        document_id = id(document)
+        if document_id not in self._documents:
+            self._documents[document_id] = weakref.ref(document, self._forget_callback(document_id))
+        key = (document_id, page_number)
+        self._pages[key] = self._pages.pop(key, 0) + nb_bytes
+        self._nb_bytes += nb_bytes
+        if self._nb_bytes > self._max_bytes:
+            self.spill(keep=key)
+
+    def touch(self, document, page_number: int):
+        """
+        Mark a page as recently used
+        :param document: DocumentWithSections holding the page
+        :param page_number: page number
+        :return: None
+        """
+        key = (id(document), page_number)
+        if key in self._pages:
+            self._pages.move_to_end(key)
+
+    def forget(self, document):
+        """
+        Stop accounting the pages of a document, after it released them
+        :param document: DocumentWithSections
+        :return: None
+        """
+        self._forget(id(document))
+
+    def _forget(self, document_id: int):
+        if self._documents.pop(document_id, None) is None:
+            return
+        for key in [key for key in self._pages.keys() if key[0] == document_id]:
+            self._nb_bytes -= self._pages.pop(key)
+
+    def _forget_callback(self, document_id: int):
+        budget = weakref.ref(self)
+
+        def callback(_):
+            # the document was garbage collected with its pages
+            if budget() is not None:
+                budget()._forget(document_id)
+        return callback
+
+    def spill(self, keep: Optional[Tuple[int, int]] = None):
+        """
+        Spill least recently used pages until the pages held fit in the budget
+        :param keep: key of a page not to spill, the one being used
+        :return: None
+        """
+        for key in list(self._pages.keys()):
+            if self._nb_bytes <= self._max_bytes:
+                break
+            if key == keep:
+                continue
+            self._nb_bytes -= self._pages.pop(key)
+            document_ref = self._documents.get(key[0], None)
+            document = document_ref() if document_ref is not None else None
+            if document is not None:
+                document.spill_page(key[1])
+                self._nb_spilled += 1
+
+
+# budgets unpickled in the current process, by process id and budget token
+_process_budgets: Dict[Tuple[int, str], MemoryBudget] = {}
+
+
+def _process_budget(token: str, max_bytes: int, page_cache: pc.PageTextCache) -> MemoryBudget:
+    """
+    Get the budget of the current process standing for a budget of another process, created on first use
+    :param token: token of the budget of the other process
+    :param max_bytes: memory budget, in bytes
+    :param page_cache: page cache of the budget
+    :return: MemoryBudget
+    """
+    # forked workers inherit the budgets of their parent, which hold the pages of the parent's documents
+    key = (os.getpid(), token)
+    budget = _process_budgets.get(key, None)
+    if budget is None:
+        budget = MemoryBudget(max_bytes, page_cache)
+        budget._token = token
+        _process_budgets[key] = budget
+    return budget
@@ -0,0 +1,219 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, Optional, Tuple
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Hash of a document content, used as cache key
+    :param data: raw bytes of the document
+    :return: hexadecimal sha1 digest
+    """
+    return hashlib.sha1(data).hexdigest()
+
+
+class PageTextCache(object):
+    """
+    On-disk cache of extracted page texts, keyed by document content hash and page number.
+    Entries are stored in a sqlite database and evicted least recently used first
+    once the total text size exceeds max_bytes. Cache hits do not write to the database: their access times
+    are kept in memory and written at the next write, which happens once per document when its page count
+    is looked up, or when the cache is closed.
+    """
+
+    def __init__(self,
+                 path: str,
+                 max_bytes: int = 2 ** 30):
+        """
+        :param path: directory where the cache database is stored
+        :param max_bytes: size cap of cached texts, in bytes
+        """
+        self._path = path
+        self._max_bytes = max_bytes
+        self._connection: Optional[sqlite3.Connection] = None
+        self._nb_bytes = -1
+        # (doc_hash, page): last access time of the cache hits not written yet
+        self._accesses: Dict[Tuple[str, int], float] = {}
+
+    def __getstate__(self):
+        # connections cannot be shared between processes: workers reopen the database
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_nb_bytes"] = -1
+        state["_accesses"] = {}
+        return state
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(self._path, exist_ok=True)
+            self._connection = sqlite3.connect(os.path.join(self._path, "page_texts.sqlite"),
+                                               timeout=60.0)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS pages ("
+                                     "doc_hash TEXT NOT NULL, "
+                                     "page INTEGER NOT NULL, "
+                                     "text TEXT NOT NULL, "
+                                     "size INTEGER NOT NULL, "
+                                     "last_access REAL NOT NULL, "
+                                     "PRIMARY KEY (doc_hash, page))")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS documents ("
+                                     "doc_hash TEXT PRIMARY KEY, "
+                                     "nb_pages INTEGER NOT NULL)")
+            # total size of the cached texts, kept up to date by triggers so that connecting,
+            # which workers do for every document, does not scan the whole cache
+            self._connection.execute("CREATE TABLE IF NOT EXISTS cache_size ("
+                                     "id INTEGER PRIMARY KEY CHECK (id = 0), "
+                                     "nb_bytes INTEGER NOT NULL)")
+            self._connection.execute("CREATE TRIGGER IF NOT EXISTS pages_insert AFTER INSERT ON pages BEGIN "
+                                     "UPDATE cache_size SET nb_bytes = nb_bytes + new.size; END")
+            self._connection.execute("CREATE TRIGGER IF NOT EXISTS pages_delete AFTER DELETE ON pages BEGIN "
+                                     "UPDATE cache_size SET nb_bytes = nb_bytes - old.size; END")
+            if self._connection.execute("SELECT 1 FROM cache_size").fetchone() is None:
+                # cache created before the size was recorded: it is counted once
+                self._connection.execute("INSERT OR IGNORE INTO cache_size (id, nb_bytes) "
+                                         "SELECT 0, COALESCE(SUM(size), 0) FROM pages")
+            self._connection.commit()
+            self._nb_bytes = self._read_nb_bytes()
+        return self._connection
+
+    def _read_nb_bytes(self) -> int:
+        return self._connection.execute("SELECT nb_bytes FROM cache_size").fetchone()[0]
+
+    @property
+    def nb_bytes(self) -> int:
+        """
+        Total size of the cached texts, in bytes
+        """
+        self._connect()
+        return self._read_nb_bytes()
+
+    def get_nb_pages(self, doc_hash: str) -> int:
+        """
+        Get the number of pages of a cached document, writing the access times of the previous cache hits
+        :param doc_hash: content hash of the document
+        :return: number of pages, -1 if the document is unknown
+        """
+        self.flush()
+        row = self._connect().execute("SELECT nb_pages FROM documents WHERE doc_hash = ?",
+                                      (doc_hash,)).fetchone()
+        return -1 if row is None else row[0]
+
+    def put_nb_pages(self, doc_hash: str, nb_pages: int):
+        """
+        Record the number of pages of a document
+        :param doc_hash: content hash of the document
+        :param nb_pages: number of pages
+        :return: None
+        """
+        connection = self._connect()
+        self._write_accesses()
+        connection.execute("INSERT OR REPLACE INTO documents (doc_hash, nb_pages) VALUES (?, ?)",
+                           (doc_hash, nb_pages))
+        connection.commit()
+
+    def get(self, doc_hash: str, page_number: int) -> Optional[str]:
+        """
+        Get a cached page text, and mark it as recently used
+        :param doc_hash: content hash of the document
+        :param page_number: page number
+        :return: page text if cached, None otherwise
+        """
+        row = self._connect().execute("SELECT text FROM pages WHERE doc_hash = ? AND page = ?",
+                                      (doc_hash, page_number)).fetchone()
+        if row is None:
+            return None
+        self._accesses[(doc_hash, page_number)] = time.time()
+        return row[0]
+
+    def put(self, doc_hash: str, page_number: int, text: str):
+        """
+        Store a page text, evicting least recently used pages if the size cap is exceeded
+        :param doc_hash: content hash of the document
+        :param page_number: page number
+        :param text: extracted page text
+        :return: None
+        """
+        connection = self._connect()
+        self._write_accesses()
+        size = len(text.encode("utf-8"))
+        # a replaced page is deleted first, so that the triggers account for its size
+        connection.execute("DELETE FROM pages WHERE doc_hash = ? AND page = ?", (doc_hash, page_number))
+        connection.execute("INSERT INTO pages (doc_hash, page, text, size, last_access) "
+                           "VALUES (?, ?, ?, ?, ?)",
+                           (doc_hash, page_number, text, size, time.time()))
+        connection.commit()
+        self._nb_bytes = self._read_nb_bytes()
+        if self._nb_bytes > self._max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove least recently used pages until the cache fits in its size cap
+        :return: None
+        """
+        connection = self._connect()
+        # pages read since the last write are not evicted first
+        self.flush()
+        # other processes may share the database: read the shared size before evicting
+        self._nb_bytes = self._read_nb_bytes()
+        if self._nb_bytes <= self._max_bytes:
+            return
+        excess = self._nb_bytes - self._max_bytes
+        freed = 0
+        victims = []
+        for doc_hash, page, size in connection.execute("SELECT doc_hash, page, size FROM pages "
+                                                       "ORDER BY last_access"):
+            victims.append((doc_hash, page))
+            freed += size
+            if freed >= excess:
+                break
+        connection.executemany("DELETE FROM pages WHERE doc_hash = ? AND page = ?", victims)
+        connection.commit()
+        self._nb_bytes = self._read_nb_bytes()
+
+    def _write_accesses(self):
+        # the access times of the cache hits are written in the transaction of the next write
+        if self._accesses:
+            self._connection.executemany("UPDATE pages SET last_access = ? WHERE doc_hash = ? AND page = ?",
+                                         [(access, doc_hash, page)
+                                          for (doc_hash, page), access in self._accesses.items()])
+            self._accesses = {}
+
+    def flush(self):
+        """
+        Write the access times of the cache hits not written yet
+        :return: None
+        """
+        if self._accesses:
+            self._write_accesses()
+            self._connection.commit()
+
+    def clear(self):
+        """
+        Remove all cached pages and documents
+        :return: None
+        """
+        connection = self._connect()
+        connection.execute("DELETE FROM pages")
+        connection.execute("DELETE FROM documents")
+        connection.commit()
+        self._accesses = {}
+        self._nb_bytes = 0
+
+    def close(self):
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,125 @@
+import heapq
+from typing import Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+import numpy as np
+import pandas as pd
+
+T = TypeVar("T")
+
+
+def page_counts(document_table: pd.DataFrame) -> Dict[str, int]:
+    """
+    Get the page counts of the documents of a document table, e.g. the one of a previous run
+    :param document_table: table indexed by document name, with a NbPages column
+    :return: dict of document name: number of pages, for the documents whose pages were counted
+    """
+    if document_table.empty or "NbPages" not in document_table.columns:
+        return {}
+    nb_pages = pd.to_numeric(document_table["NbPages"], errors="coerce")
+    return {name: int(n) for name, n in nb_pages.items() if n > 0}
+
+
+def estimate_costs(sizes: Dict[str, int], nb_pages: Dict[str, int]) -> Dict[str, float]:
+    """
+    Estimate the processing cost of documents, in pages: the page count of a document when it is known,
+    otherwise its size divided by the median size of a page of the documents whose pages are known.
+    Without any known page count, the cost is the size.
+    :param sizes: dict of document name: size in bytes
+    :param nb_pages: dict of document name: number of pages, for the documents whose pages are known
+    :return: dict of document name: estimated cost
+    """
+    ratios = [sizes[name] / n for name, n in nb_pages.items() if name in sizes and n > 0]
+    bytes_per_page = float(np.median(ratios)) if ratios else 0.0
+    costs = {}
+    for name, size in sizes.items():
+        n = nb_pages.get(name, 0)
+        if n > 0:
+            costs[name] = float(n)
+        elif bytes_per_page > 0:
+            costs[name] = size / bytes_per_page
+        else:
+            costs[name] = float(size)
+    return costs
+
+
+def largest_first(names: List[str], costs: Dict[str, float]) -> List[str]:
+    """
+    Order documents by decreasing cost, so that the longest ones do not start last and leave workers idle
+    :param names: document names
+    :param costs: dict of document name: estimated cost; documents without a cost come last
+    :return: names by decreasing cost, in their former order for equal costs
+    """
+    return sorted(names, key=lambda name: -costs.get(name, 0.0))
+
+
+class ReorderBuffer(Generic[T]):
+    """
+    Dispatches items in a dispatch order, e.g. documents largest first, and releases them in the order
+    of their keys in a listing as they complete: an item completed ahead of an earlier one is held back until
+    all earlier items are completed. With a window, an item is only dispatched once it is less than window positions
+    past the first item not released yet, so that no more than window - 1 completed items are held back.
+    """
+
+    def __init__(self,
+                 keys: List[Hashable],
+                 dispatch_order: Optional[List[Hashable]] = None,
+                 window: int = 0):
+        """
+        :param keys: keys of the items, in release order
+        :param dispatch_order: keys in dispatch order, the release order if None
+        :param window: number of positions past the first item not released yet within which items are dispatched,
+                       0 for no limit
+        """
+        self._keys = list(keys)
+        self._positions = {key: position for position, key in enumerate(self._keys)}
+        self._ranks = {key: rank for rank, key in enumerate(dispatch_order if dispatch_order is not None
+                                                             else self._keys)}
+        self._window = window
+        self._held: Dict[int, T] = {}
+        self._next = 0
+        # (dispatch rank, position) of the items within the window not dispatched yet
+        self._dispatchable: List[Tuple[int, int]] = []
+        # items before this position are dispatched or dispatchable
+        self._nb_entered = 0
+        self._nb_dispatched = 0
+
+    @property
+    def nb_held(self) -> int:
+        return len(self._held)
+
+    @property
+    def window(self) -> int:
+        return self._window
+
+    @property
+    def nb_to_dispatch(self) -> int:
+        return len(self._keys) - self._nb_dispatched
+
+    def next_dispatch(self) -> Optional[Hashable]:
+        """
+        Get the next item to dispatch: the first one in dispatch order among those within the window
+        :return: key of the item, None if every item within the window is dispatched
+        """
+        end = len(self._keys) if self._window <= 0 else min(len(self._keys), self._next + self._window)
+        while self._nb_entered < end:
+            heapq.heappush(self._dispatchable, (self._ranks[self._keys[self._nb_entered]], self._nb_entered))
+            self._nb_entered += 1
+        if not self._dispatchable:
+            return None
+        _, position = heapq.heappop(self._dispatchable)
+        self._nb_dispatched += 1
+        return self._keys[position]
+
+    def push(self, key: Hashable, item: T) -> List[T]:
+        """
+        Add a completed item
+        :param key: key of the item
+        :param item: item
+        :return: items released by this one, in listing order, empty if an earlier item is not completed yet
+        """
+        self._held[self._positions[key]] = item
+        released = []
+        while self._next in self._held:
+            released.append(self._held.pop(self._next))
+            self._next += 1
+        return released
@@ -0,0 +1,109 @@
+import hashlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import timing as tm
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """
+    Parse a shard given as "k/n", the k-th of n shards, k from 1 to n
+    :param shard: shard string
+    :return: (k, n)
+    """
+    try:
+        k, n = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard {shard} is not of the form k/n")
+    if n < 1 or not 1 <= k <= n:
+        raise ValueError(f"Shard {shard} is not one of n shards numbered from 1 to n")
+    return k, n
+
+
+def shard_of(name: str, nb_shards: int) -> int:
+    """
+    Get the shard of a document from a stable hash of its name, the same on every machine and run
+    :param name: document name
+    :param nb_shards: number of shards
+    :return: shard number, from 1 to nb_shards
+    """
+    digest = hashlib.md5(name.encode("utf-8")).hexdigest()
+    return int(digest[:16], 16) % nb_shards + 1
+
+
+def select_shard(names: List[str], shard: Tuple[int, int]) -> List[str]:
+    """
+    Select the documents of a shard
+    :param names: document names
+    :param shard: (k, n), the k-th of n shards
+    :return: names of the documents of the shard, sorted so that their order does not depend on the listing
+    """
+    k, n = shard
+    return sorted(name for name in names if shard_of(name, n) == k)
+
+
+def shard_name(name: str, shard: Tuple[int, int]) -> str:
+    """
+    Get the output name of a shard
+    :param name: output name of the whole collection
+    :param shard: (k, n)
+    :return: output name of the shard
+    """
+    k, n = shard
+    return f"{name}_shard{k}of{n}"
+
+
+def merge_tables(tables: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Merge the tables of several shards
+    :param tables: tables indexed by document name
+    :return: table of all documents, sorted by name
+    """
+    tables = [table for table in tables if not table.empty]
+    if not tables:
+        return pd.DataFrame()
+    merged = pd.concat(tables)
+    duplicates = merged.index[merged.index.duplicated()]
+    if len(duplicates) > 0:
+        raise ValueError(f"Documents {list(duplicates[:5])} are in several shards")
+    return merged.sort_index()
+
+
+def merge_stats(stats_tables: List[pd.DataFrame],
+                nb_documents: List[int],
+                timings: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate the stats of several shards: counts and blocked times are summed, hit rates are averaged
+    weighted by the number of lookups, other shares weighted by the number of documents of each shard,
+    and per-stage stats are computed again from the merged timing table
+    :param stats_tables: stats tables of the shards
+    :param nb_documents: number of documents of each shard
+    :param timings: merged timing table
+    :return: stats table
+    """
+    stats = pd.DataFrame()
+    for idx in dict.fromkeys(idx for table in stats_tables for idx in table.index):
+        if str(idx).startswith("Stage_"):
+            continue
+        rows = [(table.loc[idx], n) for table, n in zip(stats_tables, nb_documents) if idx in table.index]
+        columns = dict.fromkeys(column for row, _ in rows for column in row.index)
+        for column in columns:
+            values = np.array([pd.to_numeric(row.get(column, np.nan), errors="coerce") for row, _ in rows],
+                              dtype=float)
+            if column.startswith("Nb_") or column.startswith("Blocked_"):
+                stats.loc[idx, column] = np.nansum(values)
+                continue
+            if column == "%_hits":
+                weights = np.array([pd.to_numeric(row.get("Nb_lookups", 0), errors="coerce") for row, _ in rows],
+                                   dtype=float)
+            else:
+                weights = np.array([n for _, n in rows], dtype=float)
+            known = ~np.isnan(values) & (weights > 0)
+            stats.loc[idx, column] = (float(np.average(values[known], weights=weights[known])) if known.any()
+                                      else np.nan)
+    for idx, row in tm.aggregate_timings(timings).to_dict("index").items():
+        for column, value in row.items():
+            stats.loc[idx, column] = value
+    return stats
@@ -0,0 +1,249 @@
+import io
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import BinaryIO, Dict, List, Tuple
+
+
+class DocumentSource(ABC):
+    """
+    Where documents are read from: a directory, or a zip or tar archive whose member names are the document names.
+    Archives are opened on first use, once per process: worker processes do not share the file handle
+    of their parent and open the archive again.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: full path of the directory or archive
+        """
+        self._path = path
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def fullpath(self, name: str) -> str:
+        """
+        Get a readable location of a document, used in messages
+        :param name: document name
+        :return: path of the document, below the path of the archive for archive members
+        """
+        return os.path.join(self._path, name)
+
+    @abstractmethod
+    def names(self) -> List[str]:
+        """
+        Get the names of the documents of the source
+        :return: list of document names, in directory or archive order
+        """
+
+    @abstractmethod
+    def is_file(self, name: str) -> bool:
+        """
+        Tell whether a document of the source is a file
+        :param name: document name
+        :return: True if it is a file, False if it is a directory or missing
+        """
+
+    @abstractmethod
+    def sizes(self) -> Dict[str, int]:
+        """
+        Get the sizes of all documents of the source from its metadata, without reading them
+        :return: dict of document name: size in bytes, in directory or archive order
+        """
+
+    @abstractmethod
+    def stat(self, name: str) -> Tuple[int, float]:
+        """
+        Get the size and modification time of a document
+        :param name: document name
+        :return: size in bytes, modification time in seconds since the epoch
+        """
+
+    @abstractmethod
+    def open(self, name: str) -> BinaryIO:
+        """
+        Open a document for reading
+        :param name: document name
+        :return: binary file object
+        """
+
+    def read(self, name: str) -> bytes:
+        """
+        Read the raw bytes of a document
+        :param name: document name
+        :return: bytes
+        """
+        with self.open(name) as f:
+            return f.read()
+
+
+class DirectorySource(DocumentSource):
+
+    def names(self) -> List[str]:
+        return os.listdir(self._path)
+
+    def is_file(self, name: str) -> bool:
+        return os.path.isfile(self.fullpath(name))
+
+    def sizes(self) -> Dict[str, int]:
+        # a single pass over the directory entries
+        with os.scandir(self._path) as entries:
+            return {entry.name: entry.stat().st_size for entry in entries if entry.is_file()}
+
+    def stat(self, name: str) -> Tuple[int, float]:
+        stat = os.stat(self.fullpath(name))
+        return stat.st_size, stat.st_mtime
+
+    def open(self, name: str) -> BinaryIO:
+        return open(self.fullpath(name), "rb")
+
+
+class ArchiveSource(DocumentSource):
+    """
+    Archive opened on first use in each process
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._archive = None
+        self._lock = threading.Lock()
+        self._pid = -1
+
+    def __getstate__(self):
+        # the archive is opened again in the worker processes
+        state = self.__dict__.copy()
+        state["_archive"] = None
+        state["_lock"] = None
+        state["_pid"] = -1
+        return state
+
+    def _check_process(self):
+        # forked workers inherit the archive of their parent but must not share its file position,
+        # nor a lock that another thread of the parent may have held when forking
+        if self._pid != os.getpid():
+            self._archive = None
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    @property
+    def lock(self) -> threading.Lock:
+        """
+        Lock of the reads of archives whose members cannot be read by several threads at once
+        """
+        self._check_process()
+        return self._lock
+
+    @property
+    def archive(self):
+        self._check_process()
+        if self._archive is None:
+            self._archive = self._open_archive()
+        return self._archive
+
+    @abstractmethod
+    def _open_archive(self):
+        """
+        Open the archive, in the current process
+        :return: archive object
+        """
+
+
+class ZipSource(ArchiveSource):
+
+    def _open_archive(self) -> zipfile.ZipFile:
+        return zipfile.ZipFile(self._path, "r")
+
+    def names(self) -> List[str]:
+        return [info.filename for info in self.archive.infolist() if not info.is_dir()]
+
+    def is_file(self, name: str) -> bool:
+        try:
+            return not self.archive.getinfo(name).is_dir()
+        except KeyError:
+            return False
+
+    def sizes(self) -> Dict[str, int]:
+        return {info.filename: info.file_size for info in self.archive.infolist() if not info.is_dir()}
+
+    def stat(self, name: str) -> Tuple[int, float]:
+        info = self.archive.getinfo(name)
+        return info.file_size, time.mktime(info.date_time + (0, 0, -1))
+
+    def open(self, name: str) -> BinaryIO:
+        return self.archive.open(name, "r")
+
+    def read(self, name: str) -> bytes:
+        return self.archive.read(name)
+
+
+class TarSource(ArchiveSource):
+    """
+    Tar archive, possibly compressed. Members of a compressed archive are best read in archive order:
+    reading a member before the previous one decompresses the archive again from its start.
+    Members are read whole under a lock, since the archive has a single file position shared by all threads.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._members: Dict[str, tarfile.TarInfo] = {}
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_members"] = {}
+        return state
+
+    def _open_archive(self) -> tarfile.TarFile:
+        archive = tarfile.open(self._path, "r:*")
+        self._members = {member.name: member for member in archive.getmembers() if member.isfile()}
+        return archive
+
+    @property
+    def members(self) -> Dict[str, tarfile.TarInfo]:
+        """
+        Regular file members of the archive, by name
+        """
+        # the members are indexed when the archive is opened
+        _ = self.archive
+        return self._members
+
+    def names(self) -> List[str]:
+        return list(self.members.keys())
+
+    def is_file(self, name: str) -> bool:
+        return name in self.members
+
+    def sizes(self) -> Dict[str, int]:
+        return {name: member.size for name, member in self.members.items()}
+
+    def stat(self, name: str) -> Tuple[int, float]:
+        member = self.members[name]
+        return member.size, float(member.mtime)
+
+    def open(self, name: str) -> BinaryIO:
+        return io.BytesIO(self.read(name))
+
+    def read(self, name: str) -> bytes:
+        member = self.members[name]
+        with self.lock:
+            return self.archive.extractfile(member).read()
+
+
+@lru_cache(maxsize=None)
+def open_source(path: str) -> DocumentSource:
+    """
+    Get the source of the documents of a directory or archive, built once per process
+    :param path: full path of a directory, or of a zip or tar (possibly compressed) archive
+    :return: DocumentSource
+    """
+    if os.path.isfile(path):
+        if zipfile.is_zipfile(path):
+            return ZipSource(path)
+        if tarfile.is_tarfile(path):
+            return TarSource(path)
+        raise TypeError(f"File {path} is neither a zip nor a tar archive")
+    return DirectorySource(path)
@@ -0,0 +1,91 @@
+from typing import Dict, List, Union, Hashable
+import numpy as np
+import pandas as pd
+
+
+class TableBuffer(object):
+    """
+    Accumulates table rows column by column.
+    The DataFrame is built once, when it is asked for, instead of being enlarged cell by cell.
+    """
+
+    def __init__(self):
+        self._index: List[Hashable] = []
+        self._positions: Dict[Hashable, int] = {}
+        self._columns: Dict[str, list] = {}
+        self._frame: Union[pd.DataFrame, None] = None
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def index(self) -> List[Hashable]:
+        return self._index
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns.keys())
+
+    def insert_row(self, idx: Hashable, row: Dict[str, object]):
+        """
+        Insert a row, or update it if idx is already in the table, as table.loc[idx, column] = value would
+        :param idx: index of the row
+        :param row: dict of column name: value
+        :return: modifies self in place
+        """
+        self._frame = None
+        position = self._positions.get(idx, None)
+        if position is None:
+            position = len(self._index)
+            self._positions[idx] = position
+            self._index.append(idx)
+            for values in self._columns.values():
+                values.append(np.nan)
+        for column, value in row.items():
+            values = self._columns.get(column, None)
+            if values is None:
+                values = [np.nan] * len(self._index)
+                self._columns[column] = values
+            values[position] = value
+
+    def insert_frame(self, frame: pd.DataFrame):
+        """
+        Insert all rows of a DataFrame, updating rows whose index is already in the table
+        :param frame: DataFrame to insert
+        :return: modifies self in place
+        """
+        if not self._index and frame.index.is_unique:
+            self._frame = None
+            self._index = list(frame.index)
+            self._positions = {idx: position for position, idx in enumerate(self._index)}
+            self._columns = {column: list(values) for column, values in frame.to_dict("list").items()}
+        else:
+            for idx, row in frame.to_dict("index").items():
+                self.insert_row(idx, row)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Build the DataFrame holding the buffered rows
+        :return: DataFrame indexed by row indices, with columns in insertion order
+        """
+        if self._frame is None:
+            if not self._index:
+                self._frame = pd.DataFrame()
+            else:
+                self._frame = pd.DataFrame(self._columns, index=self._index)
+        return self._frame
+
+
+def insert_row(table: Union[pd.DataFrame, TableBuffer], idx: Hashable, row: Dict[str, object]):
+    """
+    Insert a row into a table
+    :param table: table to insert the row into, a TableBuffer or a DataFrame filled column by column
+    :param idx: index of the row
+    :param row: dict of column name: value
+    :return: modifies table in place
+    """
+    if isinstance(table, TableBuffer):
+        table.insert_row(idx, row)
+    else:
+        for column, value in row.items():
+            table.loc[idx, column] = value
@@ -1,8 +1,11 @@
-from typing import Optional, Tuple
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Optional, Tuple, List, Dict
 
 import numpy as np
 from unidecode import unidecode
 import re
+import sys
 
 
 def remove_accents(text: Optional[str]) -> Optional[str]:
@@ -44,12 +47,237 @@ def normalize(text: Optional[str],
     if text is None:
         return None
     else:
-        res = remove_accents(text).lower()
+        res = text.translate(_NORMALIZATION_TABLE)
         if compactform:
             res = compactify(res)
         return res
 
 
+class _NormalizationTable(dict):
+    """
+    Translation table of character codes to their normalized form, as given by normalize.
+    Precomputed for the Latin scripts of the reports, completed with unidecode for any other character met.
+    """
+
+    def __missing__(self, code: int) -> str:
+        normalized = unidecode(chr(code)).lower()
+        self[code] = normalized
+        return normalized
+
+
+# Basic Latin, Latin-1, Latin Extended A and B, Latin Extended Additional, punctuation and currency symbols
+_NORMALIZATION_RANGES = [(0x0000, 0x0250), (0x1E00, 0x1F00), (0x2000, 0x2070), (0x20A0, 0x20C0)]
+_NORMALIZATION_TABLE = _NormalizationTable((code, unidecode(chr(code)).lower())
+                                           for start, end in _NORMALIZATION_RANGES for code in range(start, end))
+# characters which normalized form is not a single character, or which are not in the precomputed table
+_NON_UNIT_CHARS = re.compile("[" + "".join(re.escape(chr(code)) for code, normalized in _NORMALIZATION_TABLE.items()
+                                           if len(normalized) != 1) + "]|[^" +
+                             "".join(f"{re.escape(chr(start))}-{re.escape(chr(end - 1))}"
+                                     for start, end in _NORMALIZATION_RANGES) + "]")
+
+
+def normalize_with_map(text: str) -> Tuple[str, np.ndarray]:
+    """
+    Normalize text in one translation and keep track of where each normalized character comes from
+    :param text: str to normalize
+    :return: normalized text (same as normalize(text)),
+             array giving for each normalized character the offset of the original character it comes from
+    """
+    normalized = text.translate(_NORMALIZATION_TABLE)
+    positions = np.arange(len(text))
+    lengths = None
+    for match in _NON_UNIT_CHARS.finditer(text):
+        nlength = len(_NORMALIZATION_TABLE[ord(match.group())])
+        if nlength != 1:
+            if lengths is None:
+                lengths = np.ones(len(text), dtype=np.int64)
+            lengths[match.start()] = nlength
+    if lengths is None:
+        return normalized, positions
+    return normalized, np.repeat(positions, lengths)
+
+
+class TextIndex(object):
+    """
+    Normalized and compact forms of a text, with offset maps back to the original text,
+    so that searches run on the precomputed forms return positions in the original text.
+    """
+
+    def __init__(self, text: str):
+        self._text = text
+        self._normalized, self._normalized_offsets = normalize_with_map(text)
+        # normalized text is ascii: one byte per character
+        codes = np.frombuffer(self._normalized.encode("ascii", errors="replace"), dtype=np.uint8)
+        self._compact = compactify(self._normalized)
+        self._compact_offsets = self._normalized_offsets[(codes != ord(" ")) & (codes != ord("\n"))]
+        self._line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+
+    @property
+    def text(self):
+        return self._text
+
+    @property
+    def normalized(self):
+        return self._normalized
+
+    @property
+    def compact(self):
+        return self._compact
+
+    @property
+    def nb_lines(self):
+        return len(self._line_starts)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory taken by the index, the original text excluded
+        """
+        return (sys.getsizeof(self._normalized) + sys.getsizeof(self._compact)
+                + self._normalized_offsets.nbytes + self._compact_offsets.nbytes
+                + sys.getsizeof(self._line_starts))
+
+    def normalized_slice(self, start: Optional[int] = None, end: Optional[int] = None) -> str:
+        """
+        Get the normalized form of a slice of the original text, without normalizing it again
+        :param start: start of the slice in original text, as in text[start:end]
+        :param end: end of the slice in original text
+        :return: normalized text of text[start:end]
+        """
+        start, end, _ = slice(start, end).indices(len(self._text))
+        if end <= start:
+            return ""
+        nstart = int(np.searchsorted(self._normalized_offsets, start, side="left"))
+        nend = int(np.searchsorted(self._normalized_offsets, end, side="left"))
+        return self._normalized[nstart:nend]
+
+    def original_position_from_normalized(self, position: int) -> int:
+        """
+        Get the offset in original text of a position in normalized text
+        :param position: position in normalized text
+        :return: position in original text
+        """
+        if position >= len(self._normalized_offsets):
+            return len(self._text)
+        return int(self._normalized_offsets[position])
+
+    def original_position_from_compact(self, position: int) -> int:
+        """
+        Get the offset in original text of a position in compact text
+        :param position: position in compact text
+        :return: position in original text
+        """
+        if position >= len(self._compact_offsets):
+            return len(self._text)
+        return int(self._compact_offsets[position])
+
+    def find_compact(self, ctag: str, start: int = 0) -> int:
+        """
+        Find a compact normalized tag in the text, up to spaces and line breaks
+        :param ctag: tag, already normalized and compactified
+        :param start: position in compact text where to start the search
+        :return: position of the first match in original text, -1 if not found
+        """
+        position = self._compact.find(ctag, start)
+        if position < 0:
+            return -1
+        return self.original_position_from_compact(position)
+
+    def line_position(self, position: int) -> Tuple[int, int]:
+        """
+        Get the line containing a position of the original text
+        :param position: position in original text
+        :return: line index, position in line
+        """
+        iline = bisect_right(self._line_starts, position) - 1
+        return iline, position - self._line_starts[iline]
+
+
+def _trie_regex(node: dict) -> str:
+    """
+    Build a regex matching the longest word of a character trie
+    :param node: trie node, mapping characters to child nodes, "" marking the end of a word
+    :return: regex string
+    """
+    alternatives = [re.escape(c) + _trie_regex(child) for c, child in sorted(node.items()) if c != ""]
+    if not alternatives:
+        return ""
+    regex = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+    if "" in node:
+        # greedy option: the longest word is preferred
+        regex = "(?:" + regex + ")?"
+    return regex
+
+
+class MultiTagMatcher(object):
+    """
+    Finds the occurrences of many compact tags in a single pass over a text.
+    The tags are compiled into one trie-shaped regex giving, at each position, the longest matching tag;
+    all tags matching at the same position are prefixes of that one, so every occurrence of every tag
+    is reported, as an Aho-Corasick automaton would.
+    """
+
+    def __init__(self, ctags: Tuple[str, ...]):
+        """
+        :param ctags: tags, already normalized and compactified
+        """
+        self._tags = tuple(sorted(set(t for t in ctags if t != "")))
+        trie = {}
+        for ctag in self._tags:
+            node = trie
+            for c in ctag:
+                node = node.setdefault(c, {})
+            node[""] = {}
+        self._pattern = re.compile("(?=(" + _trie_regex(trie) + "))") if self._tags else None
+        # all tags matching at a position where a longer tag matches
+        self._prefix_tags = {ctag: [t for t in self._tags if ctag.startswith(t)] for ctag in self._tags}
+
+    @property
+    def tags(self):
+        return self._tags
+
+    def first_occurrences(self, ctext: str) -> Dict[str, int]:
+        """
+        Get the first occurrence of each tag in a compact text
+        :param ctext: text, already normalized and compactified
+        :return: dict of tag: position of its first occurrence, for tags found in text
+        """
+        res = {}
+        if self._pattern is None:
+            return res
+        for match in self._pattern.finditer(ctext):
+            for ctag in self._prefix_tags[match.group(1)]:
+                if ctag not in res:
+                    res[ctag] = match.start()
+            if len(res) == len(self._tags):
+                break
+        return res
+
+    def all_occurrences(self, text: str) -> Dict[str, List[int]]:
+        """
+        Get all occurrences of each tag in a text, overlapping ones included
+        :param text: text to search in, in the same form as the tags
+        :return: dict of tag: sorted list of the positions of its occurrences, for tags found in text
+        """
+        res = {}
+        if self._pattern is None:
+            return res
+        for match in self._pattern.finditer(text):
+            for ctag in self._prefix_tags[match.group(1)]:
+                res.setdefault(ctag, []).append(match.start())
+        return res
+
+
+@lru_cache(maxsize=64)
+def get_multi_tag_matcher(ctags: Tuple[str, ...]) -> MultiTagMatcher:
+    """
+    Get a compiled multi-tag matcher, shared by all callers looking for the same tags
+    :param ctags: tags, already normalized and compactified
+    :return: MultiTagMatcher
+    """
+    return MultiTagMatcher(ctags)
+
+
 def currency_to_float(text: str, curr: str) -> float:
     """
     Convert a currency string to a float
@@ -87,6 +315,86 @@ def zip_list_of_chars(list_of_chars: list) -> str:
     return "".join(list_of_chars)
 
 
+class TagMatcher(object):
+    """
+    Precompiled search of a normalized tag, in space sensitive or insensitive mode
+    """
+
+    def __init__(self,
+                 ntag: str,
+                 space_sensitive: bool = True,
+                 max_spaces_number: int = 1):
+        """
+        :param ntag: tag, already normalized
+        :param space_sensitive: if false: looks for tag with possible spaces in between
+        :param max_spaces_number: maximum number of spaces between characters of tag
+        """
+        self._tag = ntag
+        self._space_sensitive = space_sensitive
+        self._pattern = None
+        if not space_sensitive:
+            if max_spaces_number == 1:
+                spaces = "\\s?"
+            else:
+                spaces = f"\\s{{0,{max_spaces_number}}}"
+            self._pattern = re.compile("".join([re.escape(c) + spaces for c in ntag]) + "\\s*:?")
+
+    @property
+    def tag(self):
+        return self._tag
+
+    def search(self, ntext: str) -> Tuple[int, str]:
+        """
+        Search for the tag in a normalized text
+        :param ntext: text to search in, already normalized
+        :return: the start index of the first match of tag if any (-1 else),
+                 the matching string if any ('' else)
+        """
+        if len(ntext) < len(self._tag):
+            return -1, ""
+        if self._space_sensitive:
+            return ntext.find(self._tag), self._tag
+        res = self._pattern.search(ntext)
+        if res is None:
+            return -1, ""
+        istart, iend = res.span()
+        return istart, ntext[istart:iend]
+
+
+@lru_cache(maxsize=1024)
+def get_tag_matcher(ntag: str,
+                    space_sensitive: bool = True,
+                    max_spaces_number: int = 1) -> TagMatcher:
+    """
+    Get the compiled matcher of a normalized tag, shared by all callers
+    :param ntag: tag, already normalized
+    :param space_sensitive: if false: looks for tag with possible spaces in between
+    :param max_spaces_number: maximum number of spaces between characters of tag
+    :return: TagMatcher
+    """
+    return TagMatcher(ntag, space_sensitive=space_sensitive, max_spaces_number=max_spaces_number)
+
+
+@lru_cache(maxsize=4096)
+def normalize_tag(tag: str) -> str:
+    """
+    Normalize a tag; tags are short and few, so their normalized form is cached
+    :param tag: tag to normalize
+    :return: normalized tag
+    """
+    return normalize(tag)
+
+
+@lru_cache(maxsize=4096)
+def compact_tag(tag: str) -> str:
+    """
+    Normalize and compactify a tag, cached as normalize_tag
+    :param tag: tag to normalize
+    :return: normalized and compact tag
+    """
+    return normalize(tag, compactform=True)
+
+
 def search_for_tag(tag: str,
                    text: str,
                    do_normalize: bool = True,
@@ -103,26 +411,9 @@ def search_for_tag(tag: str,
              the matching string if any ('' else)
     """
     if do_normalize:
-        tag = normalize(tag)
+        tag = normalize_tag(tag)
         text = normalize(text)
-    if len(text) < len(tag):
-        return -1, ""
-    if not space_sensitive:
-        if max_spaces_number == 1:
-            tag = "".join([f"{c}\\s?" for c in tag])
-        else:
-            lbrace = "{"
-            rbrace = "}"
-            tag = "".join([f"{c}\\s{lbrace}0,{max_spaces_number}{rbrace}" for c in tag])
-        tag += "\\s*:?"
-        res = re.search(tag, text)
-        if res is None:
-            return -1, ""
-        else:
-            istart, iend = res.span()
-            return istart, res.string[istart:iend]
-    else:
-        return text.find(tag), tag
+    return get_tag_matcher(tag, space_sensitive, max_spaces_number).search(text)
 
 
 def field_between_tags(line: str,
@@ -142,7 +433,7 @@ def field_between_tags(line: str,
     """
     if do_normalize:
         line = normalize(line)
-        tag = normalize(tag)
+        tag = normalize_tag(tag)
     field = line.split(tag)[-1]
     if ending_tags is []:
         ending_tags.append(":")
@@ -150,7 +441,10 @@ def field_between_tags(line: str,
     endposition = 1000000
     bestendposition = endposition
     for ending_tag in ending_tags:
-        endposition, _ = search_for_tag(ending_tag, field, do_normalize=do_normalize)
+        # field comes from the line, already normalized
+        endposition, _ = search_for_tag(normalize_tag(ending_tag) if do_normalize else ending_tag,
+                                        field,
+                                        do_normalize=False)
         if endposition >= 0:
             if endposition < bestendposition:
                 bestendposition = endposition
@@ -161,6 +455,27 @@ def field_between_tags(line: str,
     return field
 
 
+@lru_cache(maxsize=4096)
+def _has_border(tag: str) -> bool:
+    """
+    Tells whether a proper prefix of tag is also a suffix of it, i.e. whether occurrences of tag can overlap
+    """
+    return any(tag[:k] == tag[-k:] for k in range(1, len(tag)))
+
+
+def position_after_last(text: str, tag: str) -> int:
+    """
+    Get the position following the last occurrence of tag in text, as text.split(tag)[-1] would start
+    :param text: text to search in
+    :param tag: non empty tag to search for
+    :return: position in text, 0 if tag is not in text
+    """
+    if _has_border(tag):
+        return len(text) - len(text.split(tag)[-1])
+    position = text.rfind(tag)
+    return 0 if position < 0 else position + len(tag)
+
+
 def search_date(text: str) -> str:
     field = re.search('\\d{2}[-/]\\d{2}[-/]\\d{4}', text)
     if field is None:
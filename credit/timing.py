@@ -0,0 +1,86 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# stages of the processing of a document, in pipeline order
+STAGES = ["open", "extract", "locate_sections", "detect_language", "extract_fields", "parse", "insert"]
+
+
+class StageTimer(object):
+    """
+    Records wall and cpu time spent in named stages.
+    Stages can be nested: the time of an inner stage is not counted in the outer one.
+    """
+
+    def __init__(self):
+        self._wall: Dict[str, float] = {}
+        self._cpu: Dict[str, float] = {}
+        # open stages: [wall start, cpu start, wall time of inner stages, cpu time of inner stages]
+        self._stack: List[List[float]] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Context manager timing a stage
+        :param name: stage name
+        """
+        frame = [time.perf_counter(), time.process_time(), 0.0, 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            wall = time.perf_counter() - frame[0]
+            cpu = time.process_time() - frame[1]
+            self._wall[name] = self._wall.get(name, 0.0) + wall - frame[2]
+            self._cpu[name] = self._cpu.get(name, 0.0) + cpu - frame[3]
+            if self._stack:
+                self._stack[-1][2] += wall
+                self._stack[-1][3] += cpu
+
+    def wall(self, name: str) -> float:
+        return self._wall.get(name, 0.0)
+
+    def cpu(self, name: str) -> float:
+        return self._cpu.get(name, 0.0)
+
+    def to_row(self) -> Dict[str, object]:
+        """
+        Get recorded times as a row of the timing table
+        :return: dict of column name: value, with wall and cpu seconds of each stage,
+                 their totals and the name of the slowest stage
+        """
+        row = {}
+        for name in STAGES + [s for s in self._wall.keys() if s not in STAGES]:
+            row[f"{name}_wall"] = self.wall(name)
+            row[f"{name}_cpu"] = self.cpu(name)
+        row["total_wall"] = sum(self._wall.values())
+        row["total_cpu"] = sum(self._cpu.values())
+        row["SlowestStage"] = max(self._wall.keys(), key=lambda s: self._wall[s]) if self._wall else ""
+        return row
+
+
+def aggregate_timings(timings: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate a per-document timing table into per-stage totals and percentiles
+    :param timings: timing table, one row per document as given by StageTimer.to_row
+    :return: table indexed by Stage_<name>, with total wall and cpu seconds and wall time percentiles
+    """
+    stats = pd.DataFrame()
+    if timings.empty:
+        return stats
+    stages = [c[:-len("_wall")] for c in timings.columns if c.endswith("_wall")]
+    for stage in stages:
+        wall = pd.to_numeric(timings[f"{stage}_wall"], errors="coerce").fillna(0.0).to_numpy()
+        cpu = pd.to_numeric(timings[f"{stage}_cpu"], errors="coerce").fillna(0.0).to_numpy()
+        idx = f"Stage_{stage}"
+        stats.loc[idx, "Wall_total"] = float(wall.sum())
+        stats.loc[idx, "Cpu_total"] = float(cpu.sum())
+        stats.loc[idx, "Wall_p50"] = float(np.percentile(wall, 50))
+        stats.loc[idx, "Wall_p90"] = float(np.percentile(wall, 90))
+        stats.loc[idx, "Wall_p99"] = float(np.percentile(wall, 99))
+        stats.loc[idx, "Wall_max"] = float(wall.max())
+    return stats
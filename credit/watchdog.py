@@ -0,0 +1,255 @@
+import multiprocessing
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from multiprocessing.connection import wait
+from typing import Callable, Deque, List, NamedTuple, Optional, Tuple
+
+
+class TimeBudget(NamedTuple):
+    """
+    Time allowed to process a document
+    """
+    # wall seconds allowed for a whole document, from the moment a worker starts it
+    document_seconds: float = 120.0
+    # wall seconds allowed to extract the text of one page, 0 for no page budget
+    page_seconds: float = 0.0
+
+
+class DocumentFailure(Exception):
+    """
+    A document could not be processed by a watchdog worker
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class DocumentTimeout(DocumentFailure):
+    """
+    A document exceeded its time budget and its worker was killed
+    """
+
+
+class PageTimeout(BaseException):
+    """
+    The text extraction of a page exceeded the page budget.
+    It is not an Exception, so that it is not swallowed by the pdf reader on its way up.
+    """
+
+
+# page budget of the current process, set in watchdog workers
+_page_seconds = 0.0
+
+
+def set_page_budget(seconds: float):
+    """
+    Set the page budget of the current process
+    :param seconds: wall seconds allowed to extract the text of one page, 0 for no page budget
+    :return: None
+    """
+    global _page_seconds
+    _page_seconds = seconds
+
+
+@contextmanager
+def page_time_limit(page_number: int):
+    """
+    Context manager raising PageTimeout if its block runs longer than the page budget of the process.
+    It has no effect without a page budget or outside the main thread, where alarms cannot be received.
+    :param page_number: page number, for the failure reason
+    """
+    if _page_seconds <= 0 or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise PageTimeout(f"page {page_number} exceeded the page budget of {_page_seconds:g}s")
+
+    previous_handler = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, _page_seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def _worker_main(connection, page_seconds: float):
+    """
+    Loop of a watchdog worker: run the tasks received from the executor and send back their results
+    :param connection: worker end of the pipe to the executor
+    :param page_seconds: page budget of the worker
+    """
+    set_page_budget(page_seconds)
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        fn, args, kwargs = task
+        try:
+            result = (True, fn(*args, **kwargs))
+        except BaseException as error:
+            result = (False, DocumentFailure(error.args[0] if isinstance(error, PageTimeout) and error.args
+                                             else f"{type(error).__name__}: {error}"))
+        connection.send(result)
+
+
+class _Worker(object):
+    """
+    Worker process of a WatchdogExecutor, with the task it runs and its deadline
+    """
+
+    def __init__(self, context, page_seconds: float):
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(worker_connection, page_seconds), daemon=True)
+        self.process.start()
+        worker_connection.close()
+        self.future: Optional[Future] = None
+        self.deadline = 0.0
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class WatchdogExecutor(Executor):
+    """
+    Process pool whose tasks have a time budget: a worker still running a task at its deadline is killed
+    and replaced, and the task fails with DocumentTimeout. Tasks raising an error, or whose worker dies,
+    fail with DocumentFailure. Workers also enforce the page budget of page_time_limit.
+    Tasks are run in submission order, one per worker at a time.
+    """
+
+    def __init__(self,
+                 max_workers: int = 1,
+                 budget: TimeBudget = TimeBudget()):
+        """
+        :param max_workers: number of worker processes
+        :param budget: time budget of each task, and page budget of the workers
+        """
+        self._max_workers = max(1, max_workers)
+        self._budget = budget
+        self._context = multiprocessing.get_context()
+        self._workers: List[_Worker] = []
+        self._pending: Deque[Tuple[Future, Callable, tuple, dict]] = deque()
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._nb_killed = 0
+        self._monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._monitor.start()
+
+    @property
+    def budget(self) -> TimeBudget:
+        return self._budget
+
+    @property
+    def nb_killed(self) -> int:
+        return self._nb_killed
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot submit tasks after shutdown")
+            self._pending.append((future, fn, args, kwargs))
+            self._condition.notify()
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._condition:
+            self._shutdown = True
+            if cancel_futures:
+                while self._pending:
+                    self._pending.popleft()[0].cancel()
+            self._condition.notify()
+        if wait:
+            self._monitor.join()
+
+    def _dispatch(self):
+        """
+        Start pending tasks on idle workers, starting workers as needed
+        """
+        with self._condition:
+            while self._pending:
+                worker = next((w for w in self._workers if w.future is None), None)
+                if worker is None:
+                    if len(self._workers) >= self._max_workers:
+                        return
+                    worker = _Worker(self._context, self._budget.page_seconds)
+                    self._workers.append(worker)
+                future, fn, args, kwargs = self._pending.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    worker.connection.send((fn, args, kwargs))
+                except Exception as error:
+                    future.set_exception(DocumentFailure(f"{type(error).__name__}: {error}"))
+                    continue
+                worker.future = future
+                worker.deadline = time.monotonic() + self._budget.document_seconds
+
+    def _replace(self, worker: _Worker):
+        worker.kill()
+        self._workers.remove(worker)
+
+    def _monitor_loop(self):
+        try:
+            while True:
+                self._dispatch()
+                busy = [w for w in self._workers if w.future is not None]
+                if not busy:
+                    with self._condition:
+                        if self._shutdown and not self._pending:
+                            return
+                        if not self._pending:
+                            self._condition.wait(timeout=0.1)
+                    continue
+                now = time.monotonic()
+                timeout = max(0.0, min(0.05, min(w.deadline for w in busy) - now))
+                ready = wait([w.connection for w in busy], timeout=timeout)
+                for worker in busy:
+                    if worker.connection in ready:
+                        try:
+                            success, result = worker.connection.recv()
+                        except (EOFError, OSError):
+                            # the worker is joined, so that its exit code is known
+                            worker.process.join(timeout=1.0)
+                            worker.future.set_exception(
+                                DocumentFailure(f"worker died with exit code {worker.process.exitcode}"))
+                            self._replace(worker)
+                            continue
+                        future, worker.future = worker.future, None
+                        if success:
+                            future.set_result(result)
+                        else:
+                            future.set_exception(result)
+                    elif time.monotonic() > worker.deadline:
+                        worker.future.set_exception(
+                            DocumentTimeout(f"document exceeded the budget of {self._budget.document_seconds:g}s"))
+                        self._nb_killed += 1
+                        self._replace(worker)
+        finally:
+            for worker in self._workers:
+                if worker.future is not None:
+                    worker.kill()
+                else:
+                    worker.stop()
+            self._workers = []
+
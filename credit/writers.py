@@ -0,0 +1,518 @@
+import datetime
+import os
+import shutil
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Dict, Hashable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import tables as tb
+from . import timing as tm
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    feather = None
+    pq = None
+
+# column types of the collector tables:
+# "category" columns are dictionary encoded strings, "date" columns hold datetime.date values
+TABLE_SCHEMAS: Dict[str, Dict[str, str]] = {
+    "documents": {"Language": "category",
+                  "NbPages": "int32",
+                  "NbSections": "int32",
+                  "NbMissingSections": "int32",
+                  "FailureReason": "string"},
+    "companies": {"Language": "category",
+                  "NbPages": "int32",
+                  "Identifier": "string",
+                  "VATNumber": "string",
+                  "CreationDate": "date",
+                  "FullName": "string",
+                  "APECode": "category",
+                  "ZipCode": "category",
+                  "City": "category",
+                  "Address": "string",
+                  "ActivityDescription": "string",
+                  "BankActivity": "category",
+                  "Capital": "float64",
+                  "Effectif": "float64",
+                  "IsParsed": "bool",
+                  "BugReport": "string"},
+    "credit_requests": {"RequestDate": "date",
+                        "CompanyId": "string",
+                        "CompanyName": "string",
+                        "RequestedAmount": "float64",
+                        "GrantedAmount": "float64",
+                        "StartDate": "date",
+                        "EndDate": "date",
+                        "Duration": "float64",
+                        "BugReport": "string"},
+    "timings": {**{f"{stage}_{clock}": "float64" for stage in tm.STAGES + ["total"] for clock in ["wall", "cpu"]},
+                "SlowestStage": "category"},
+}
+
+INDEX_COLUMN = "Document"
+RUN_DATE_COLUMN = "RunDate"
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _is_empty(value) -> bool:
+    # values a typed column stores as null
+    return _is_missing(value) or value is pd.NA or (isinstance(value, str) and value == "")
+
+
+def _int_to_float(value):
+    if isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_)):
+        return float(value)
+    return value
+
+
+def _to_date(value) -> Optional[datetime.date]:
+    """
+    Convert a table value to a date, None if it is not a date
+    """
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def _convert(values: pd.Series, kind: str) -> list:
+    """
+    Convert the values of a typed column
+    :param values: column values
+    :param kind: "date", "int32", "float64" or "bool"
+    :return: list of the converted values, None for values that are empty or do not convert
+    """
+    if kind == "date":
+        return [_to_date(v) for v in values]
+    numbers = pd.to_numeric(pd.Series([None if _is_empty(v) else v for v in values], dtype=object),
+                            errors="coerce")
+    if kind == "int32":
+        return [int(n) if not np.isnan(n) and float(n).is_integer() else None for n in numbers]
+    if kind == "bool":
+        return [bool(n) if n in (0, 1) else None for n in numbers]
+    return [None if np.isnan(n) else float(n) for n in numbers]
+
+
+def _typed_text(value, kind: str) -> str:
+    """
+    Text of a typed value in a column stored as strings, the same whether the value is
+    a table value or a value read back from a typed arrow column
+    """
+    if kind == "date":
+        return value.isoformat()
+    if kind == "int32":
+        return str(int(value))
+    if kind == "bool":
+        return str(bool(value))
+    return str(float(value))
+
+
+def _to_arrow_array(values: pd.Series, kind: str) -> "pa.Array":
+    """
+    Convert a table column to an arrow array of the given kind. A typed column holding values that do not
+    convert to its type, e.g. dates the parser could not read, is stored as strings rather than losing them.
+    :param values: column values
+    :param kind: column type, as in TABLE_SCHEMAS
+    :return: arrow array
+    """
+    arrow_types = {"date": pa.date32(), "int32": pa.int32(), "float64": pa.float64(), "bool": pa.bool_()}
+    if kind in arrow_types:
+        converted = _convert(values, kind)
+        empty = [_is_empty(v) for v in values]
+        if all(c is not None or e for c, e in zip(converted, empty)):
+            return pa.array(converted, type=arrow_types[kind])
+        texts = [None if e else str(v) if c is None else _typed_text(c, kind)
+                 for v, c, e in zip(values, converted, empty)]
+        return pa.array(texts, type=pa.string())
+    array = pa.array([None if _is_missing(v) else str(v) for v in values], type=pa.string())
+    if kind == "category":
+        array = array.dictionary_encode()
+    return array
+
+
+def _text_columns(text_schema: "pa.Schema", typed_schema: "pa.Schema") -> List[str]:
+    """
+    Get the columns stored as strings in a schema and typed in another one
+    """
+    return [field.name for field in text_schema if pa.types.is_string(field.type)
+            and not pa.types.is_string(typed_schema.field(field.name).type)
+            and not pa.types.is_dictionary(typed_schema.field(field.name).type)]
+
+
+def _widen_to_text(table: "pa.Table", columns: List[str], schema: Dict[str, str]) -> "pa.Table":
+    """
+    Store typed columns of an arrow table as strings, as _to_arrow_array stores them
+    :param table: arrow table written by to_arrow_table
+    :param columns: names of the typed columns to store as strings
+    :param schema: dict of column name: column type
+    :return: arrow table
+    """
+    for column in columns:
+        index = table.column_names.index(column)
+        texts = [None if v is None else _typed_text(v, schema[column]) for v in table.column(column).to_pylist()]
+        table = table.set_column(index, column, pa.array(texts, type=pa.string()))
+    return table
+
+
+def to_arrow_table(table: pd.DataFrame, schema: Dict[str, str]) -> "pa.Table":
+    """
+    Convert a collector table to an arrow table with an explicit schema
+    :param table: table indexed by document name
+    :param schema: dict of column name: column type; columns missing from it are stored as strings
+    :return: arrow table, the index being stored in the INDEX_COLUMN column
+    """
+    names = [INDEX_COLUMN]
+    arrays = [_to_arrow_array(pd.Series(table.index, dtype=object), "string")]
+    for column in table.columns:
+        names.append(column)
+        arrays.append(_to_arrow_array(table[column], schema.get(column, "string")))
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def from_arrow_table(table: "pa.Table", schema: Dict[str, str]) -> pd.DataFrame:
+    """
+    Convert an arrow table written by to_arrow_table back to a collector table
+    :param table: arrow table
+    :param schema: dict of column name: column type, used to restore the column order
+    :return: table indexed by document name
+    """
+    frame = table.to_pandas(date_as_object=True)
+    frame = frame.set_index(INDEX_COLUMN)
+    frame.index.name = None
+    # partition columns are read back last
+    columns = [c for c in schema.keys() if c in frame.columns]
+    columns += [c for c in frame.columns if c not in columns]
+    return frame[columns]
+
+
+class TableStream(object):
+    """
+    Rows of a table written by chunks as they come, so that the table is never held in memory as a whole.
+    This base stream cannot append: it buffers all rows and writes the table with its writer when closed.
+    The columns of the table are the columns of its first chunk: a later chunk with other columns raises
+    a ValueError, rather than losing them.
+    """
+
+    def __init__(self,
+                 writer: "TableWriter",
+                 path: str,
+                 name: str,
+                 suffix: str,
+                 chunk_size: int = 0):
+        """
+        :param writer: writer of the table
+        :param path: output directory
+        :param name: output name
+        :param suffix: table suffix
+        :param chunk_size: number of rows written at once, 0 to write all rows when the stream is closed
+        """
+        self._writer = writer
+        self._path = path
+        self._name = name
+        self._suffix = suffix
+        self._chunk_size = chunk_size
+        self._buffer = tb.TableBuffer()
+        self._columns: Optional[List[str]] = None
+        self._nb_rows = 0
+
+    @property
+    def fullpath(self) -> str:
+        return self._writer.fullpath(self._path, self._name, self._suffix)
+
+    @property
+    def nb_rows(self) -> int:
+        return self._nb_rows
+
+    def insert_row(self, idx: Hashable, row: Dict[str, object]):
+        """
+        Add a row to the table, writing the buffered rows once they make a chunk
+        :param idx: index of the row
+        :param row: dict of column name: value
+        :return: None
+        """
+        self._buffer.insert_row(idx, row)
+        if 0 < self._chunk_size <= len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered rows
+        :return: None
+        """
+        if len(self._buffer) == 0:
+            return
+        frame = self._buffer.to_frame()
+        if self._columns is None:
+            self._columns = list(frame.columns)
+        unexpected = [column for column in frame.columns if column not in self._columns]
+        if unexpected:
+            raise ValueError(f"Columns {unexpected} of table {self._suffix} are not in its first chunk, "
+                             f"which has columns {self._columns}")
+        self._write_chunk(frame.reindex(columns=self._columns), first=self._nb_rows == 0)
+        self._nb_rows += len(frame)
+        self._buffer = tb.TableBuffer()
+
+    def close(self):
+        """
+        Write the remaining rows and close the table; an empty table is written if no row was inserted
+        :return: None
+        """
+        if self._nb_rows == 0 and len(self._buffer) == 0:
+            self._writer.write(pd.DataFrame(), self._path, self._name, self._suffix)
+        else:
+            self.flush()
+        self._close()
+
+    def _write_chunk(self, frame: pd.DataFrame, first: bool):
+        self._writer.write(frame, self._path, self._name, self._suffix)
+
+    def _close(self):
+        pass
+
+
+class CsvTableStream(TableStream):
+
+    def _write_chunk(self, frame: pd.DataFrame, first: bool):
+        # integers of float columns are written as floats whether or not the chunk has missing values,
+        # as they are when the whole table is written
+        schema = TABLE_SCHEMAS.get(self._suffix, {})
+        frame = frame.copy()
+        for column in frame.columns:
+            if schema.get(column, "") == "float64":
+                frame[column] = frame[column].map(_int_to_float)
+        frame.to_csv(self.fullpath, mode="w" if first else "a", header=first)
+
+
+class ParquetTableStream(TableStream):
+    """
+    Unpartitioned parquet table written one row group per chunk
+    """
+
+    def __init__(self,
+                 writer: "ParquetTableWriter",
+                 path: str,
+                 name: str,
+                 suffix: str,
+                 chunk_size: int = 0):
+        super().__init__(writer, path, name, suffix, chunk_size)
+        self._parquet_writer = None
+
+    def _write_chunk(self, frame: pd.DataFrame, first: bool):
+        schema = TABLE_SCHEMAS.get(self._suffix, {})
+        arrow_table = to_arrow_table(frame, schema)
+        if self._parquet_writer is None:
+            fullpath = self.fullpath
+            if os.path.isfile(fullpath):
+                os.remove(fullpath)
+            elif os.path.isdir(fullpath):
+                shutil.rmtree(fullpath)
+            self._open(arrow_table.schema)
+        written = self._parquet_writer.schema
+        # a typed column is stored as strings once a chunk has values that do not convert to its type
+        to_text = _text_columns(arrow_table.schema, written)
+        if to_text:
+            # the rows already written are written again with the wider schema
+            self._parquet_writer.close()
+            written_table = _widen_to_text(pq.read_table(self.fullpath), to_text, schema)
+            self._open(written_table.schema)
+            self._parquet_writer.write_table(written_table)
+            written = written_table.schema
+        arrow_table = _widen_to_text(arrow_table, _text_columns(written, arrow_table.schema), schema)
+        self._parquet_writer.write_table(arrow_table.cast(written))
+
+    def _open(self, arrow_schema: "pa.Schema"):
+        self._parquet_writer = pq.ParquetWriter(self.fullpath, arrow_schema, compression=self._writer.compression)
+
+    def _close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+
+class TableWriter(ABC):
+    """
+    Writes and reads back the collector tables, one file (or directory) per table
+    """
+    extension = ""
+
+    def fullpath(self, path: str, name: str, suffix: str) -> str:
+        return os.path.join(path, f"{name}_{suffix}{self.extension}")
+
+    def exists(self, path: str, name: str, suffix: str) -> bool:
+        return os.path.exists(self.fullpath(path, name, suffix))
+
+    @abstractmethod
+    def write(self, table: pd.DataFrame, path: str, name: str, suffix: str):
+        """
+        Write a table
+        :param table: table to write
+        :param path: output directory
+        :param name: output name
+        :param suffix: table suffix, one of the TABLE_SCHEMAS keys for collector tables
+        :return: None
+        """
+
+    @abstractmethod
+    def read(self, path: str, name: str, suffix: str) -> pd.DataFrame:
+        """
+        Read a table written by write
+        :param path: output directory
+        :param name: output name
+        :param suffix: table suffix
+        :return: table
+        """
+
+    def open_stream(self, path: str, name: str, suffix: str, chunk_size: int = 1000) -> TableStream:
+        """
+        Open a table to write its rows as they come
+        :param path: output directory
+        :param name: output name
+        :param suffix: table suffix
+        :param chunk_size: number of rows written at once, for writers that can append
+        :return: TableStream, to be closed once all rows are inserted
+        """
+        return TableStream(self, path, name, suffix)
+
+
+class CsvTableWriter(TableWriter):
+    extension = ".csv"
+
+    def open_stream(self, path: str, name: str, suffix: str, chunk_size: int = 1000) -> TableStream:
+        return CsvTableStream(self, path, name, suffix, chunk_size)
+
+    def write(self, table: pd.DataFrame, path: str, name: str, suffix: str):
+        table.to_csv(self.fullpath(path, name, suffix))
+
+    def read(self, path: str, name: str, suffix: str) -> pd.DataFrame:
+        # text columns are read as text: identifiers or zip codes made of digits are not turned into numbers
+        dtype = {column: str for column, kind in TABLE_SCHEMAS.get(suffix, {}).items()
+                 if kind in ("string", "category")}
+        return pd.read_csv(self.fullpath(path, name, suffix), index_col=0, dtype=dtype)
+
+
+class ParquetTableWriter(TableWriter):
+    """
+    Writes tables as parquet files with an explicit schema and dictionary encoded string columns,
+    optionally partitioned by Language or by run date
+    """
+    extension = ".parquet"
+
+    def __init__(self,
+                 partition_by: Optional[str] = None,
+                 compression: str = "zstd"):
+        """
+        :param partition_by: None, "Language" or RUN_DATE_COLUMN; tables without the Language column
+                             are not partitioned by language. When partitioned by run date,
+                             the partition of the current day is replaced and read back.
+        :param compression: parquet compression codec
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required to write parquet tables")
+        if partition_by not in (None, "Language", RUN_DATE_COLUMN):
+            raise ValueError(f"Cannot partition tables by {partition_by}")
+        self._partition_by = partition_by
+        self._compression = compression
+
+    @property
+    def compression(self) -> str:
+        return self._compression
+
+    def open_stream(self, path: str, name: str, suffix: str, chunk_size: int = 1000) -> TableStream:
+        if self._partition_by is not None:
+            # partitions are written from the whole table
+            return TableStream(self, path, name, suffix)
+        return ParquetTableStream(self, path, name, suffix, chunk_size)
+
+    def write(self, table: pd.DataFrame, path: str, name: str, suffix: str):
+        schema = TABLE_SCHEMAS.get(suffix, {})
+        fullpath = self.fullpath(path, name, suffix)
+        arrow_table = to_arrow_table(table, schema)
+        if self._partition_by == RUN_DATE_COLUMN:
+            run_date = date.today().isoformat()
+            arrow_table = arrow_table.append_column(RUN_DATE_COLUMN,
+                                                    pa.array([run_date] * arrow_table.num_rows,
+                                                             type=pa.string()))
+        partition_cols = [self._partition_by] if self._partition_by in arrow_table.column_names else []
+        if os.path.isfile(fullpath):
+            os.remove(fullpath)
+        elif os.path.isdir(fullpath) and self._partition_by != RUN_DATE_COLUMN:
+            # the whole table is written again: former partitions are stale
+            shutil.rmtree(fullpath)
+        if partition_cols:
+            pq.write_to_dataset(arrow_table,
+                                root_path=fullpath,
+                                partition_cols=partition_cols,
+                                compression=self._compression,
+                                existing_data_behavior="delete_matching")
+        else:
+            pq.write_table(arrow_table, fullpath, compression=self._compression)
+
+    def read(self, path: str, name: str, suffix: str) -> pd.DataFrame:
+        schema = TABLE_SCHEMAS.get(suffix, {})
+        fullpath = self.fullpath(path, name, suffix)
+        if self._partition_by == RUN_DATE_COLUMN and os.path.isdir(fullpath):
+            runs = sorted(d for d in os.listdir(fullpath) if d.startswith(f"{RUN_DATE_COLUMN}="))
+            if runs:
+                fullpath = os.path.join(fullpath, runs[-1])
+        if os.path.isdir(fullpath):
+            arrow_table = pq.ParquetDataset(fullpath).read()
+        else:
+            arrow_table = pq.read_table(fullpath)
+        frame = from_arrow_table(arrow_table, schema)
+        if RUN_DATE_COLUMN in frame.columns:
+            frame = frame.drop(columns=[RUN_DATE_COLUMN])
+        return frame
+
+
+class ArrowTableWriter(TableWriter):
+    """
+    Writes tables as Arrow IPC (feather v2) files with an explicit schema
+    and dictionary encoded string columns
+    """
+    extension = ".arrow"
+
+    def __init__(self, compression: str = "zstd"):
+        if pa is None:
+            raise ImportError("pyarrow is required to write arrow tables")
+        self._compression = compression
+
+    def write(self, table: pd.DataFrame, path: str, name: str, suffix: str):
+        feather.write_feather(to_arrow_table(table, TABLE_SCHEMAS.get(suffix, {})),
+                              self.fullpath(path, name, suffix),
+                              compression=self._compression)
+
+    def read(self, path: str, name: str, suffix: str) -> pd.DataFrame:
+        return from_arrow_table(feather.read_table(self.fullpath(path, name, suffix)),
+                                TABLE_SCHEMAS.get(suffix, {}))
+
+
+def get_writer(output_format: str = "csv", **kwargs) -> TableWriter:
+    """
+    Get a table writer from its format name
+    :param output_format: "csv", "parquet" or "arrow"
+    :param kwargs: options of the writer
+    :return: TableWriter
+    """
+    writers = {"csv": CsvTableWriter,
+               "parquet": ParquetTableWriter,
+               "arrow": ArrowTableWriter}
+    if output_format not in writers:
+        raise ValueError(f"Unknown output format {output_format}")
+    return writers[output_format](**kwargs)
@@ -1,30 +1,85 @@
+import argparse
 import os
+import sys
 import credit.credit_document as cd
 import credit.credit_collector as cc
 import credit.company as cp
+import credit.page_cache as pc
+import credit.layout_priors as lp
+import credit.memory_budget as mb
+import credit.manifest as mf
+import credit.scheduling as sc
+import credit.sharding as sh
+import credit.watchdog as wd
+import credit.writers as wr
 import pandas as pd
 
 # Path: main.py
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    # each node of a multi-node run collects the documents of its shard, e.g. --shard 2/4
+    parser.add_argument("--shard", type=sh.parse_shard, default=None, help="shard k/n to collect")
+    # once all shards are collected, their outputs are merged with --merge n
+    parser.add_argument("--merge", type=int, default=0, help="number of shards to merge")
+    args = parser.parse_args()
+    # directory of the credit files, or the zip / tar.gz drop they come in, read without unpacking it
     data_path = "/home/cgeissler/local_data/CCRCredit/FichesCredit"
     out_path = "/home/cgeissler/local_data/CCRCredit/Tables"
     debug_mode = False
+    incremental = False
     file_to_debug = "Enquete_289247.pdf"
     outfilename = "collect_test_2"
+    # "csv", "parquet" or "arrow"; parquet and arrow keep column types on reload
+    writer = wr.get_writer("csv")
+    if args.merge > 0:
+        cc.merge_shards(out_path, outfilename, args.merge, writer=writer)
+        sys.exit(0)
+    # outputs, manifest and priors of a shard are its own, so that nodes do not write the same files
+    name, priors_name = outfilename, "layout_priors"
+    if args.shard is not None:
+        name, priors_name = sh.shard_name(name, args.shard), sh.shard_name(priors_name, args.shard)
+    page_cache = pc.PageTextCache(os.path.join(out_path, "PageCache"))
     if not debug_mode:
-        collector = cc.CreditCollector(data_path)
-        collector.collect_objects(verbose=True, istart=0, iend=50, types_to_collect=3)
-        collector.write_objects(out_path, outfilename)
-        collector.write_stats(out_path)
+        # pages where sections were found in previous runs are scanned first
+        layout_priors = lp.LayoutPriors(os.path.join(out_path, f"{priors_name}.json"))
+        # page texts held in memory beyond 1 GB are spilled to the page cache
+        memory_budget = mb.MemoryBudget(2 ** 30, page_cache)
+        # documents taking more than 2 minutes, or 20 s on a page, are killed and recorded as failed
+        time_budget = wd.TimeBudget(document_seconds=120.0, page_seconds=20.0)
+        # the longest documents are dispatched first, their cost being estimated from their size
+        # and from their page count in the previous run
+        page_counts = {}
+        if writer.exists(out_path, name, "documents"):
+            page_counts = sc.page_counts(writer.read(out_path, name, "documents"))
+        collector = cc.CreditCollector(data_path, page_cache=page_cache, layout_priors=layout_priors,
+                                       memory_budget=memory_budget, time_budget=time_budget,
+                                       largest_first=True, page_counts=page_counts, shard=args.shard)
+        manifest = None
+        if incremental:
+            # only new or changed documents are processed, and merged into the previous tables
+            manifest = mf.CollectionManifest(os.path.join(out_path, f"{name}_manifest.csv"))
+            collector.load_objects(out_path, name, writer=writer)
+            collector.collect_objects(verbose=True, istart=0, iend=50, types_to_collect=3, manifest=manifest)
+            collector.write_objects(out_path, name, writer=writer)
+        else:
+            # documents are read, extracted and parsed, and their rows written, in overlapping pipeline stages,
+            # without building the tables in memory
+            collector.run_pipeline(out_path, name, writer=writer, verbose=True, istart=0, iend=50,
+                                   types_to_collect=3)
+        # stats of an unsharded run keep their former file name
+        collector.write_stats(out_path, name if args.shard is not None else "")
+        layout_priors.save()
+        if manifest is not None:
+            manifest.save()
     else:
-        companies = pd.read_csv(os.path.join(out_path, f"{outfilename}_companies.csv"), index_col=0)
+        companies = writer.read(out_path, name, "companies")
         for idx in companies.index:
             if (file_to_debug == "" and companies.loc[idx, "IsParsed"] == 0) or \
                     (file_to_debug != "" and idx == file_to_debug):
                 print(f"Re-parsing company {idx}")
-                cred_doc = cd.CreditDocument(path=data_path, name=idx)
+                cred_doc = cd.CreditDocument(path=data_path, name=idx, page_cache=page_cache)
                 cred_doc.locate_sections()
                 company = cp.Company()
                 company.link_to_document(cred_doc)
@@ -0,0 +1,42 @@
+import os
+import sys
+from typing import List
+
+import pytest
+
+# the credit and benchmarks packages are imported from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import synthetic_reports as sr  # noqa: E402
+
+# (seed, number of pages, noise, starts of the lines removed, lines of an added last page) of the reports
+# of the test corpus: clean and noisy reports, short ones and ones whose sections are spread over many pages,
+# reports with missing sections or tags, and reports with a section title repeated after its section.
+# Sections all come in layout order: the first title of a section comes before the next section starts
+REPORTS = [(1, 2, 0.0, (), ()), (2, 4, 0.0, (), ()), (3, 7, 0.0, (), ()), (4, 12, 0.0, (), ()),
+           (5, 3, 0.3, (), ()), (6, 6, 0.3, (), ()), (7, 9, 0.5, (), ()), (8, 5, 0.5, (), ()),
+           (9, 8, 0.0, ("Informations bancaires", "BFR"), ()),
+           (10, 6, 0.0, ("Informations financières", "Votre expérience"), ()),
+           (11, 10, 0.0, ("Identité", "Analyse structurelle"), ("Analyse structurelle", "BFR")),
+           (12, 7, 0.3, ("Ratios de rotation",), ("Identité", "BFR"))]
+
+
+@pytest.fixture(scope="session")
+def corpus(tmp_path_factory) -> str:
+    """
+    Directory of synthetic credit reports, named like the real ones
+    """
+    path = str(tmp_path_factory.mktemp("corpus"))
+    for seed, nb_pages, noise, removed, added in REPORTS:
+        pages = sr.SyntheticReport(seed=seed, nb_pages=nb_pages, noise=noise).pages
+        pages = [[line for line in page if not line.startswith(removed)] for page in pages]
+        if added:
+            pages.append(list(added))
+        with open(os.path.join(path, f"Enquete_{200000 + seed}.pdf"), "wb") as f:
+            f.write(sr.write_pdf(pages))
+    return path
+
+
+@pytest.fixture(scope="session")
+def corpus_names(corpus) -> List[str]:
+    return sorted(os.listdir(corpus))
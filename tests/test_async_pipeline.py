@@ -0,0 +1,78 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import credit.async_pipeline as ap
+import credit.credit_collector as cc
+import credit.writers as wr
+
+NAMES = [f"Enquete_{idx}.pdf" for idx in range(20)]
+
+
+def read(name: str) -> bytes:
+    return name.encode()
+
+
+def process(name: str, data: bytes) -> str:
+    # later documents are processed faster, so that they complete out of order
+    time.sleep(0.001 * (len(NAMES) - int(name[8:-4])))
+    return data.decode().upper()
+
+
+def run(names, process, written, **kwargs) -> ap.PipelineStats:
+    with ThreadPoolExecutor(2) as read_executor, ThreadPoolExecutor(4) as process_executor, \
+            ThreadPoolExecutor(1) as write_executor:
+        return asyncio.run(ap.run_pipeline(names, read, process,
+                                           lambda name, processed: [(name, processed)], written.extend,
+                                           read_executor, process_executor, write_executor, **kwargs))
+
+
+def test_pipeline_order():
+    written = []
+    stats = run(NAMES, process, written, queue_size=3)
+    # documents are written in listing order
+    assert written == [(name, name.upper()) for name in NAMES]
+    row = stats.to_row()
+    for count in ["Nb_read", "Nb_processed", "Nb_merged", "Nb_written"]:
+        assert row[count] == len(NAMES), count
+    assert all(row[f"Blocked_{stage}"] >= 0 for stage in ["read", "process", "merge"])
+    assert run([], process, []).nb_written == 0
+
+
+def failing_process(name: str, data: bytes) -> str:
+    if name == NAMES[5]:
+        raise ValueError(f"cannot process {name}")
+    return process(name, data)
+
+
+def test_pipeline_error():
+    written = []
+    with pytest.raises(ValueError, match=NAMES[5]):
+        run(NAMES, failing_process, written, queue_size=2)
+    # the documents before the failing one may be written, none after it
+    assert written == [(name, name.upper()) for name in NAMES[:len(written)]]
+    assert len(written) <= 5
+
+
+def test_pipeline_on_error():
+    written = []
+    stats = run(NAMES, failing_process, written, queue_size=2, on_error=lambda name, error: str(error))
+    assert written[5] == (NAMES[5], f"cannot process {NAMES[5]}")
+    assert written[:5] + written[6:] == [(name, name.upper()) for name in NAMES[:5] + NAMES[6:]]
+    assert stats.nb_written == len(NAMES)
+
+
+def test_collector_pipeline(tmp_path, corpus):
+    reference = cc.CreditCollector(corpus)
+    reference.write_objects(str(tmp_path), "reference", records=reference.iter_objects(types_to_collect=3))
+    collector = cc.CreditCollector(corpus)
+    stats = collector.run_pipeline(str(tmp_path), "pipeline", types_to_collect=3, workers=2, queue_size=2)
+    assert stats.nb_written == len(collector.timing_table)
+    writer = wr.CsvTableWriter()
+    for suffix in ["documents", "companies", "credit_requests"]:
+        pd.testing.assert_frame_equal(writer.read(str(tmp_path), "pipeline", suffix),
+                                      writer.read(str(tmp_path), "reference", suffix))
+    assert collector.stats_table.loc["Pipeline", "Nb_written"] == stats.nb_written
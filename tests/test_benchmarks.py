@@ -0,0 +1,36 @@
+import math
+import os
+
+import credit.credit_collector as cc
+from benchmarks import bench_collect as bc
+from benchmarks import synthetic_reports as sr
+
+
+def test_percentile():
+    assert bc.percentile([3.0, 1.0, 2.0], 50) == 2.0
+    assert bc.percentile([3.0, 1.0, 2.0], 99) == 3.0
+    assert bc.percentile([1.0], 0) == 1.0
+    assert math.isnan(bc.percentile([], 50))
+
+
+def test_generate_corpus(tmp_path):
+    names = sr.generate_corpus(str(tmp_path), 5, (2, 4), seed=1)
+    assert sorted(os.listdir(str(tmp_path))) == names
+    # reports are the same for the same seed
+    assert sr.generate_corpus(str(tmp_path / "again"), 5, (2, 4), seed=1) == names
+    for name in names:
+        with open(os.path.join(str(tmp_path), name), "rb") as f, \
+                open(os.path.join(str(tmp_path / "again"), name), "rb") as g:
+            assert f.read() == g.read()
+    collector = cc.CreditCollector(str(tmp_path))
+    collector.collect_objects(doclist=names, types_to_collect=3)
+    assert 2 <= collector.document_table["NbPages"].min() <= collector.document_table["NbPages"].max() <= 4
+
+
+def test_bench_collect(tmp_path):
+    names = sr.generate_corpus(str(tmp_path), 3, (2, 3), seed=2)
+    # only the pdf files of the corpus are collected
+    open(str(tmp_path / "notes.txt"), "w").close()
+    assert bc.bench_collect(str(tmp_path), names, workers=1) > 0
+    latencies = bc.bench_stages(str(tmp_path), names)
+    assert all(len(values) == len(names) for values in latencies.values())
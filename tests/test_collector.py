@@ -0,0 +1,65 @@
+import credit.credit_collector as cc
+import credit.tables as tb
+
+TABLES = ["document_table", "company_table", "credit_request_table"]
+
+
+def test_collect_in_pool(corpus, corpus_names):
+    reference = cc.CreditCollector(corpus)
+    reference.collect_objects(types_to_collect=3)
+    assert sorted(reference.document_table.index) == corpus_names
+    for workers in [2, 3]:
+        collector = cc.CreditCollector(corpus)
+        collector.collect_objects(types_to_collect=3, workers=workers)
+        # the tables of a pool run are the tables of a serial run, rows in the same order
+        for table in TABLES:
+            assert getattr(collector, table).equals(getattr(reference, table)), (workers, table)
+        for idx in ["Companies", "Requests"]:
+            assert collector.stats_table.loc[idx, "Nb_parsed"] == reference.stats_table.loc[idx, "Nb_parsed"]
+
+
+def test_collect_some_documents(corpus):
+    reference = cc.CreditCollector(corpus)
+    reference.collect_objects(types_to_collect=3)
+    names = list(reference.document_table.index)
+    collector = cc.CreditCollector(corpus)
+    collector.collect_objects(istart=2, iend=5, types_to_collect=3, workers=2)
+    assert list(collector.document_table.index) == names[2:6]
+    collector = cc.CreditCollector(corpus)
+    collector.collect_objects(doclist=names[7:3:-1], types_to_collect=3, workers=2)
+    assert list(collector.document_table.index) == names[7:3:-1]
+
+
+def test_iter_objects(corpus):
+    reference = cc.CreditCollector(corpus)
+    reference.collect_objects(types_to_collect=3)
+    for workers in [1, 2]:
+        collector = cc.CreditCollector(corpus)
+        records = list(collector.iter_objects(types_to_collect=3, workers=workers))
+        # the records of a document follow one another, its timing record last, in listing order
+        names = list(dict.fromkeys(record.name for record in records))
+        assert names == list(reference.document_table.index)
+        assert [record.table for record in records if record.name == names[0]] == \
+            ["documents", "companies", "credit_requests", "timings"]
+        tables = {"documents": tb.TableBuffer(), "companies": tb.TableBuffer(), "credit_requests": tb.TableBuffer()}
+        for record in records:
+            if record.table in tables:
+                tables[record.table].insert_row(record.name, record.row)
+        assert tables["documents"].to_frame().equals(reference.document_table)
+        assert tables["companies"].to_frame().equals(reference.company_table)
+        assert tables["credit_requests"].to_frame().equals(reference.credit_request_table)
+        # only the timing rows are kept by the collector, and the stats are complete
+        assert collector.document_table.empty
+        assert sorted(collector.timing_table.index) == sorted(names)
+        assert collector.stats_table.loc["Companies", "Nb_parsed"] == \
+            reference.stats_table.loc["Companies", "Nb_parsed"]
+
+
+def test_iter_objects_stopped(corpus):
+    collector = cc.CreditCollector(corpus)
+    records = collector.iter_objects(types_to_collect=3, workers=2, lookahead=2)
+    first = next(records)
+    assert first.table == "documents"
+    # the pool is shut down when the consumer stops early
+    records.close()
+    assert len(collector.timing_table) == 0
@@ -0,0 +1,169 @@
+import os
+import random
+from typing import List
+
+import pandas as pd
+import pytest
+
+import credit.credit_document as cd
+import credit.layout_priors as lp
+import credit.textutils as tu
+from benchmarks import synthetic_reports as sr
+
+
+def all_tags(document: cd.CreditDocument):
+    return list(dict.fromkeys(tag for section in document.sections for tag in section.start_tags + section.end_tags))
+
+
+def test_find_tags_in_pages(corpus, corpus_names):
+    for name in corpus_names:
+        document = cd.CreditDocument(path=corpus, name=name)
+        tags = all_tags(document)
+        occurrences = document.find_tags_in_pages(tags)
+        assert set(occurrences.keys()) == set(tu.compact_tag(tag) for tag in tags)
+        for tag in tags:
+            for min_page in range(document.nb_pages):
+                for max_page in range(min_page, document.nb_pages):
+                    assert (document.find_tag_in_occurrences(tag, occurrences, min_page, max_page) ==
+                            document.find_tag_in_document(tag, min_page, max_page))
+
+
+def test_extract_fields_in_section(corpus, corpus_names):
+    nb_found = 0
+    for name in corpus_names:
+        document = cd.CreditDocument(path=corpus, name=name)
+        document.locate_sections()
+        for section in document.sections:
+            section_name = section.spec.name
+            fields = document.extract_fields_in_section(section_name)
+            assert fields == {field_name: document.locate_field_in_section(section_name, field_name)
+                              for field_name in section.fields.keys()}
+            nb_found += len([field for field in fields.values() if field != ""])
+    assert nb_found > 0
+
+
+def locations(document: cd.CreditDocument):
+    return [(section.spec.name, section.is_located, section.start_tag, section.start_page, section.start_position,
+             section.end_tag, section.end_page, section.end_position) for section in document.sections]
+
+
+def full_scan(corpus: str, name: str):
+    # locations of the sections when every page is searched for every tag
+    document = cd.CreditDocument(path=corpus, name=name)
+    for section in document.sections:
+        section.locate_section_in_document(document)
+    return locations(document)
+
+
+def test_locate_sections(corpus, corpus_names):
+    nb_lazy = 0
+    for name in corpus_names:
+        document = cd.CreditDocument(path=corpus, name=name)
+        document.locate_sections()
+        assert locations(document) == full_scan(corpus, name)
+        # pages after the last section are not extracted
+        nb_lazy += len(document._pages_index) < document.nb_pages
+    assert nb_lazy > 0
+
+
+@pytest.mark.parametrize("section_names", [["Summary"], ["Identity", "Bank"], ["BFR"], ["BillingAnalysis"]])
+def test_locate_some_sections(corpus, corpus_names, section_names):
+    for name in corpus_names:
+        document = cd.CreditDocument(path=corpus, name=name)
+        document.locate_sections(section_names)
+        assert ([location for location in locations(document) if location[0] in section_names] ==
+                [location for location in full_scan(corpus, name) if location[0] in section_names])
+
+
+def test_locate_sections_in_layout_order(tmp_path):
+    # a title of higher priority repeated after the next section started does not start the section again
+    pages = sr.SyntheticReport(seed=3, nb_pages=4, language="FR", template="Etude garantie").pages + [["Etude client"]]
+    with open(os.path.join(str(tmp_path), "Enquete_1.pdf"), "wb") as f:
+        f.write(sr.write_pdf(pages))
+    document = cd.CreditDocument(path=str(tmp_path), name="Enquete_1.pdf")
+    document.locate_sections()
+    assert (document.summary_section.start_tag, document.summary_section.start_page) == ("Etude garantie", 0)
+    assert len(document._pages_index) < document.nb_pages
+    # a full scan takes the first title found in the whole document, in order of priority
+    assert full_scan(str(tmp_path), "Enquete_1.pdf")[0][2:4] == ("Etude client", len(pages) - 1)
+
+
+def prior_windows(nb_pages: int, section_pages: List[int], seed: int) -> List[List[int]]:
+    # windows of pages scanned first: right, partial, wrong or out of range
+    rng = random.Random(seed)
+    return [[0], [nb_pages - 1], [0, 1], sorted(set(section_pages)), sorted(set(section_pages))[1:],
+            list(range(0, nb_pages, 2)), list(range(1, nb_pages, 2)), list(reversed(range(nb_pages))),
+            [-3, nb_pages + 5], sorted(rng.sample(range(nb_pages), k=rng.randint(1, nb_pages))),
+            sorted(rng.sample(range(nb_pages), k=rng.randint(1, nb_pages)))]
+
+
+def test_locate_sections_from_first_pages(corpus, corpus_names):
+    nb_hits = 0
+    for iname, name in enumerate(corpus_names):
+        expected = full_scan(corpus, name)
+        nb_pages = cd.CreditDocument(path=corpus, name=name).nb_pages
+        section_pages = [page for location in expected for page in (location[3], location[6]) if page >= 0]
+        for first_pages in prior_windows(nb_pages, section_pages, iname):
+            document = cd.CreditDocument(path=corpus, name=name)
+            nb_hits += document.locate_sections(first_pages=first_pages)
+            assert locations(document) == expected, first_pages
+    assert nb_hits > 0
+
+
+def test_locate_sections_with_priors(corpus, corpus_names):
+    priors = lp.LayoutPriors()
+    for name in corpus_names[:len(corpus_names) // 2]:
+        document = cd.CreditDocument(path=corpus, name=name)
+        document.locate_sections()
+        priors.record(document.template, document.nb_pages, document.section_locations())
+    for name in corpus_names:
+        document = cd.CreditDocument(path=corpus, name=name)
+        hit = document.locate_sections_with_priors(priors)
+        if hit is not None:
+            priors.record_lookup(hit)
+        assert locations(document) == full_scan(corpus, name)
+    assert priors.nb_lookups > 0
+
+
+def test_template(corpus, corpus_names):
+    document = cd.CreditDocument(path=corpus, name=corpus_names[0])
+    # reading the template does not locate the summary section
+    assert document.template == ""
+    assert not document.summary_section.is_located
+    document.locate_sections(["Summary"])
+    assert document.template in sr.TEMPLATES
+
+
+def test_priors_round_trip(tmp_path, corpus, corpus_names):
+    priors = lp.LayoutPriors(str(tmp_path / "priors.json"))
+    for name in corpus_names:
+        document = cd.CreditDocument(path=corpus, name=name)
+        document.locate_sections()
+        priors.record(document.template, document.nb_pages, document.section_locations())
+    priors.save()
+    loaded = lp.LayoutPriors(str(tmp_path / "priors.json"))
+    assert loaded.templates == priors.templates
+    pd.testing.assert_frame_equal(loaded.to_frame(), priors.to_frame())
+    for template in priors.templates:
+        assert loaded.window(template, ["Identity"], 10) == priors.window(template, ["Identity"], 10)
+
+
+def test_find_tag_in_page(corpus, corpus_names):
+    document = cd.CreditDocument(path=corpus, name=corpus_names[-1])
+    nb_found = 0
+    for tag in all_tags(document):
+        for page_number in range(document.nb_pages):
+            text = document.get_page_text(page_number)
+            _, page, position, iline, position_in_line = document.find_tag_in_page(tag, page_number)
+            assert page == page_number
+            compact_text = tu.normalize(text, compactform=True)
+            if position < 0:
+                assert tu.compact_tag(tag) not in compact_text
+                assert iline == position_in_line == -1
+                continue
+            nb_found += 1
+            # positions are offsets in the page text, where the tag starts up to spaces and line breaks
+            assert tu.normalize(text[position:], compactform=True).startswith(tu.compact_tag(tag))
+            assert len(tu.normalize(text[:position], compactform=True)) == compact_text.find(tu.compact_tag(tag))
+            assert text.split("\n")[iline][position_in_line:] == text[position:].split("\n")[0]
+    assert nb_found > 0
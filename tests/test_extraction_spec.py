@@ -0,0 +1,35 @@
+import pytest
+
+import credit.extraction_spec as es
+
+LANGUAGES = ["FR", "PT", "ES"]
+
+
+def test_language_tags():
+    summary = es.get_credit_report_spec().section("Summary")
+    assert summary.field_candidate_tags("RequestedAmount", "PT") == ["pedida"]
+    assert summary.field_candidate_tags("GrantedAmount", "ES") == ["concedida", "aprobada"]
+    # each language only tries its own tags
+    for name in ["RequestedAmount", "GrantedAmount"]:
+        tags = {language: summary.field_candidate_tags(name, language) for language in LANGUAGES}
+        for language in LANGUAGES:
+            others = [tag for other in LANGUAGES if other != language for tag in tags[other]]
+            assert not set(tags[language]) & set(others), (name, language)
+        # an unknown language, or one without tags for the field, tries the tags of all languages
+        all_tags = [tag for language in LANGUAGES for tag in tags[language]]
+        assert summary.field_candidate_tags(name) == all_tags
+        assert summary.field_candidate_tags(name, "EN") == all_tags
+
+
+def test_neutral_tags():
+    section = es.SectionSpec("Summary", ["Etude"], ["Identité"])
+    section.declare_field("RequestDate", ["Date"])
+    section.declare_field("RequestDate", ["Data do pedido"], language="PT")
+    assert section.field_candidate_tags("RequestDate", "PT") == ["Data do pedido", "Date"]
+    # a language without tags for the field tries all of its tags
+    assert section.field_candidate_tags("RequestDate", "FR") == ["Date", "Data do pedido"]
+    section.compile()
+    assert [matcher.search("data do pedido : 2021")[0] for matcher in
+            section.candidate_matchers("RequestDate", "PT")] == [0, -1]
+    with pytest.raises(ValueError):
+        section.declare_field("StartDate", ["Date debut"])
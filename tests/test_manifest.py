@@ -0,0 +1,68 @@
+import os
+import shutil
+
+import pytest
+
+import credit.credit_collector as cc
+import credit.manifest as mf
+
+
+@pytest.fixture
+def documents(tmp_path, corpus, corpus_names):
+    """
+    Copy of the corpus, whose documents the tests change
+    """
+    path = str(tmp_path / "documents")
+    os.mkdir(path)
+    for name in corpus_names:
+        shutil.copy2(os.path.join(corpus, name), os.path.join(path, name))
+    return path
+
+
+def test_needs_processing(tmp_path, documents, corpus_names):
+    manifest = mf.CollectionManifest(str(tmp_path / "manifest.csv"))
+    name = corpus_names[0]
+    assert manifest.needs_processing(documents, name, "1")
+    manifest.record(documents, name, "1")
+    assert name in manifest
+    assert not manifest.needs_processing(documents, name, "1")
+    assert manifest.needs_processing(documents, name, "2")
+    # a file touched without changing its content is not processed again
+    fullpath = os.path.join(documents, name)
+    os.utime(fullpath, (0, 1000000))
+    assert not manifest.needs_processing(documents, name, "1")
+    assert manifest.get(name).mtime == 1000000
+    # a changed file is
+    with open(os.path.join(documents, corpus_names[1]), "rb") as f:
+        data = f.read()
+    with open(fullpath, "wb") as f:
+        f.write(data)
+    assert manifest.needs_processing(documents, name, "1")
+    # the manifest is kept on disk
+    manifest.record(documents, name, "1")
+    manifest.save()
+    loaded = mf.CollectionManifest(manifest.path)
+    assert len(loaded) == 1
+    assert loaded.get(name) == manifest.get(name)
+    assert loaded.get(name).content_hash == mf.file_hash(fullpath)
+
+
+def test_incremental_collection(tmp_path, documents, corpus_names):
+    manifest = mf.CollectionManifest(str(tmp_path / "manifest.csv"))
+    reference = cc.CreditCollector(documents)
+    reference.collect_objects(types_to_collect=3, manifest=manifest)
+    assert sorted(reference.document_table.index) == corpus_names
+    assert len(manifest) == len(corpus_names)
+    # unchanged documents are skipped
+    collector = cc.CreditCollector(documents)
+    assert list(collector.iter_objects(types_to_collect=3, manifest=manifest)) == []
+    # a changed document is collected again, alone
+    changed = corpus_names[2]
+    with open(os.path.join(documents, corpus_names[3]), "rb") as f:
+        data = f.read()
+    with open(os.path.join(documents, changed), "wb") as f:
+        f.write(data)
+    collector = cc.CreditCollector(documents)
+    collector.collect_objects(types_to_collect=3, manifest=manifest)
+    assert list(collector.document_table.index) == [changed]
+    assert not manifest.needs_processing(documents, changed, cc.PARSER_VERSION)
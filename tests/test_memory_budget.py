@@ -0,0 +1,53 @@
+import pickle
+
+import pytest
+
+import credit.company as cp
+import credit.credit_collector as cc
+import credit.credit_document as cd
+import credit.memory_budget as mb
+import credit.page_cache as pc
+
+
+def test_budget_released(tmp_path, corpus, corpus_names):
+    budget = mb.MemoryBudget(2 ** 30, pc.PageTextCache(str(tmp_path)))
+    collected = cc.collect_document(corpus_names[0], corpus, memory_budget=budget)
+    assert collected.nb_pages > 0
+    assert budget.nb_bytes == 0
+
+
+def test_budget_released_on_failure(tmp_path, corpus, corpus_names, monkeypatch):
+    budget = mb.MemoryBudget(2 ** 30, pc.PageTextCache(str(tmp_path)))
+
+    def failing_parse(company):
+        raise ValueError("unexpected company text")
+
+    monkeypatch.setattr(cp.Company, "parse", failing_parse)
+    # the document is still referenced by the traceback: its pages are released by collect_document
+    with pytest.raises(ValueError, match="unexpected company text"):
+        cc.collect_document(corpus_names[0], corpus, memory_budget=budget)
+    assert budget.nb_bytes == 0
+
+
+def test_spilled_pages(tmp_path, corpus, corpus_names):
+    budget = mb.MemoryBudget(4000, pc.PageTextCache(str(tmp_path)))
+    for name in corpus_names:
+        document = cd.CreditDocument(path=corpus, name=name, memory_budget=budget)
+        reference = cd.CreditDocument(path=corpus, name=name)
+        texts = [document.get_page_text(page) for page in range(document.nb_pages)]
+        assert budget.nb_bytes <= budget.max_bytes
+        # spilled pages are read back from the page cache
+        assert [document.get_page_text(page) for page in range(document.nb_pages)] == texts
+        assert texts == [reference.get_page_text(page) for page in range(reference.nb_pages)]
+        document.release()
+        assert budget.nb_bytes == 0
+    assert budget.nb_spilled > 0
+
+
+def test_budget_per_process(tmp_path):
+    budget = mb.MemoryBudget(1000, pc.PageTextCache(str(tmp_path)))
+    # a budget sent again to the same process is one budget, shared by its tasks
+    copy = pickle.loads(pickle.dumps(budget))
+    assert copy is pickle.loads(pickle.dumps(budget))
+    assert copy is not budget
+    assert copy.max_bytes == budget.max_bytes
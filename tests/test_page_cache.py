@@ -0,0 +1,90 @@
+import os
+import shutil
+import sqlite3
+import time
+
+import credit.document as doc
+import credit.page_cache as pc
+
+
+def last_accesses(path: str):
+    with sqlite3.connect(os.path.join(path, "page_texts.sqlite")) as connection:
+        return dict(((doc_hash, page), access) for doc_hash, page, access in
+                    connection.execute("SELECT doc_hash, page, last_access FROM pages"))
+
+
+def test_get_put(tmp_path):
+    cache = pc.PageTextCache(str(tmp_path))
+    assert cache.get("a", 0) is None
+    assert cache.get_nb_pages("a") == -1
+    cache.put_nb_pages("a", 2)
+    cache.put("a", 0, "Identité")
+    cache.put("a", 1, "")
+    assert cache.get_nb_pages("a") == 2
+    assert cache.get("a", 0) == "Identité"
+    assert cache.get("a", 1) == ""
+    assert cache.get("a", 2) is None
+    assert cache.get("b", 0) is None
+    cache.close()
+    # the cache is kept on disk
+    cache = pc.PageTextCache(str(tmp_path))
+    assert cache.get("a", 0) == "Identité"
+    cache.clear()
+    assert cache.get("a", 0) is None
+    assert cache.get_nb_pages("a") == -1
+    assert cache.nb_bytes == 0
+
+
+def test_deferred_accesses(tmp_path):
+    cache = pc.PageTextCache(str(tmp_path))
+    cache.put("a", 0, "x")
+    accesses = last_accesses(str(tmp_path))
+    time.sleep(0.01)
+    # cache hits do not write to the database until the next document is opened
+    assert cache.get("a", 0) == "x"
+    assert last_accesses(str(tmp_path)) == accesses
+    cache.get_nb_pages("b")
+    assert last_accesses(str(tmp_path))[("a", 0)] > accesses[("a", 0)]
+
+
+def test_size_and_eviction(tmp_path):
+    cache = pc.PageTextCache(str(tmp_path), max_bytes=100)
+    for page in range(4):
+        cache.put("a", page, "x" * 20)
+        # pages are written at distinct times
+        time.sleep(0.002)
+    assert cache.nb_bytes == 80
+    # a replaced page is counted once, multibyte characters by their encoded size
+    cache.put("a", 3, "é" * 10)
+    assert cache.nb_bytes == 80
+    time.sleep(0.002)
+    # page 0, read since it was written, is kept; page 1, the least recently used, is evicted
+    assert cache.get("a", 0) == "x" * 20
+    cache.put("b", 0, "y" * 30)
+    assert cache.nb_bytes <= 100
+    assert cache.get("a", 1) is None
+    assert cache.get("a", 0) == "x" * 20
+    assert cache.get("b", 0) == "y" * 30
+    cache.close()
+    # the size is read from its row, and matches the pages
+    with sqlite3.connect(os.path.join(str(tmp_path), "page_texts.sqlite")) as connection:
+        nb_bytes = connection.execute("SELECT nb_bytes FROM cache_size").fetchone()[0]
+        assert nb_bytes == connection.execute("SELECT SUM(size) FROM pages").fetchone()[0]
+    assert pc.PageTextCache(str(tmp_path)).nb_bytes == nb_bytes
+
+
+def test_document_pages(tmp_path, corpus, corpus_names):
+    cache = pc.PageTextCache(str(tmp_path / "cache"))
+    name = corpus_names[0]
+    document = doc.DocumentWithSections(path=corpus, name=name, page_cache=cache)
+    texts = [document.get_page_text(page) for page in range(document.nb_pages)]
+    # pages are keyed on the content of the document, whatever its name
+    copy = tmp_path / "copy"
+    copy.mkdir()
+    shutil.copy(os.path.join(corpus, name), str(copy / "Enquete_1.pdf"))
+    content_hash = pc.content_hash((copy / "Enquete_1.pdf").read_bytes())
+    cache.put(content_hash, 0, "cached text")
+    document = doc.DocumentWithSections(path=str(copy), name="Enquete_1.pdf", page_cache=cache)
+    assert document.nb_pages == len(texts)
+    assert document.get_page_text(0) == "cached text"
+    assert [document.get_page_text(page) for page in range(1, document.nb_pages)] == texts[1:]
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import credit.credit_collector as cc
+import credit.scheduling as sc
+import credit.writers as wr
+
+TABLES = ["documents", "companies", "credit_requests"]
+
+
+def test_estimate_costs():
+    sizes = {"a.pdf": 1000, "b.pdf": 3000, "c.pdf": 4000, "d.pdf": 500}
+    # a and b have 100 bytes per page
+    costs = sc.estimate_costs(sizes, {"a.pdf": 10, "b.pdf": 30, "e.pdf": 7})
+    assert costs == {"a.pdf": 10.0, "b.pdf": 30.0, "c.pdf": 40.0, "d.pdf": 5.0}
+    assert sc.estimate_costs(sizes, {}) == {name: float(size) for name, size in sizes.items()}
+    assert sc.largest_first(["a.pdf", "d.pdf", "x.pdf", "c.pdf", "b.pdf"], costs) == \
+        ["c.pdf", "b.pdf", "a.pdf", "d.pdf", "x.pdf"]
+
+
+def simulate(keys, dispatch_order, window, nb_workers, durations):
+    """
+    Run items through a reorder buffer as a pool of nb_workers would, each item taking its duration
+    :return: keys in dispatch order, keys in release order, largest number of items held back
+    """
+    order = sc.ReorderBuffer(keys, dispatch_order=dispatch_order, window=window)
+    ranks = {key: rank for rank, key in enumerate(dispatch_order if dispatch_order is not None else keys)}
+    dispatched, released, max_held = [], [], 0
+    # (end time, key) of the items in flight
+    running = []
+    time = 0.0
+    while order.nb_to_dispatch > 0 or running:
+        while len(running) < nb_workers:
+            key = order.next_dispatch()
+            if key is None:
+                break
+            # the item is the first in dispatch order among the window following the first item not released
+            end = len(keys) if window <= 0 else len(released) + window
+            assert keys.index(key) < end
+            assert ranks[key] == min(ranks[other] for other in keys[:end] if other not in dispatched)
+            dispatched.append(key)
+            running.append((time + durations[key], key))
+        running.sort()
+        time, key = running.pop(0)
+        released.extend(order.push(key, key))
+        max_held = max(max_held, order.nb_held)
+    return dispatched, released, max_held
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("window", [1, 4, 16])
+def test_reorder_buffer_window(seed, window):
+    rng = np.random.default_rng(seed)
+    keys = [f"Enquete_{number}.pdf" for number in range(300000, 300060)]
+    durations = {key: float(rng.pareto(1.5)) for key in keys}
+    dispatch_order = sc.largest_first(keys, durations)
+    dispatched, released, max_held = simulate(keys, dispatch_order, window, 4, durations)
+    assert released == keys
+    assert sorted(dispatched) == keys
+    # the buffer holds back no more than the items of the window after the first one not released
+    assert max_held <= window - 1
+
+
+def test_reorder_buffer_without_window():
+    keys = list(range(10))
+    dispatch_order = [9, 3, 0, 8, 1, 2, 7, 4, 6, 5]
+    durations = {key: 1.0 for key in keys}
+    dispatched, released, max_held = simulate(keys, dispatch_order, 0, 3, durations)
+    assert dispatched == dispatch_order
+    assert released == keys
+    # without a window, released items arrive in listing order
+    assert simulate(keys, None, 0, 3, durations)[2] == 0
+
+
+def test_collect_largest_first(tmp_path, corpus):
+    reference = cc.CreditCollector(corpus)
+    reference.collect_objects(types_to_collect=3)
+    collector = cc.CreditCollector(corpus, largest_first=True, reorder_window=3)
+    collector.collect_objects(types_to_collect=3, workers=2)
+    # rows come out in listing order, as in a serial run
+    assert collector.document_table.equals(reference.document_table)
+    assert collector.company_table.equals(reference.company_table)
+    assert collector.credit_request_table.equals(reference.credit_request_table)
+    reference.write_objects(str(tmp_path), "reference")
+    collector = cc.CreditCollector(corpus, largest_first=True, reorder_window=3)
+    collector.run_pipeline(str(tmp_path), "pipeline", types_to_collect=3, workers=2)
+    writer = wr.CsvTableWriter()
+    for suffix in TABLES:
+        pd.testing.assert_frame_equal(writer.read(str(tmp_path), "pipeline", suffix),
+                                      writer.read(str(tmp_path), "reference", suffix))
@@ -0,0 +1,94 @@
+import datetime
+import os
+
+import pandas as pd
+import pytest
+
+import credit.credit_collector as cc
+import credit.layout_priors as lp
+import credit.sharding as sh
+import credit.writers as wr
+
+TABLES = ["documents", "companies", "credit_requests"]
+
+
+def test_parse_shard():
+    assert sh.parse_shard("2/5") == (2, 5)
+    assert sh.parse_shard("1/1") == (1, 1)
+    for shard in ["0/3", "4/3", "1/0", "2", "a/b", "1/2/3"]:
+        with pytest.raises(ValueError):
+            sh.parse_shard(shard)
+
+
+def test_select_shard():
+    names = [f"Enquete_{number}.pdf" for number in range(300000, 300500)]
+    for nb_shards in [1, 2, 3, 7]:
+        shards = [sh.select_shard(list(reversed(names)), (k, nb_shards)) for k in range(1, nb_shards + 1)]
+        # every document is in exactly one shard, whatever the listing order
+        assert sorted(name for shard in shards for name in shard) == names
+        assert all(shard == sorted(shard) for shard in shards)
+        assert all(sh.shard_of(name, nb_shards) == k for k, shard in enumerate(shards, 1) for name in shard)
+        # shards are balanced
+        assert min(len(shard) for shard in shards) > len(names) / nb_shards * 0.7
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_merge_shards(tmp_path, corpus, output_format):
+    path = str(tmp_path)
+    writer = wr.get_writer(output_format)
+    nb_shards = 3
+    nb_lookups = 0
+    for k in range(1, nb_shards + 1):
+        name = sh.shard_name("collect", (k, nb_shards))
+        collector = cc.CreditCollector(corpus, layout_priors=lp.LayoutPriors(), shard=(k, nb_shards))
+        collector.collect_objects(types_to_collect=3)
+        collector.write_objects(path, name, writer=writer)
+        collector.write_stats(path, name)
+        nb_lookups += collector.stats_table.loc["LayoutPriors", "Nb_lookups"]
+    stats = cc.merge_shards(path, "collect", nb_shards, writer=writer)
+    # the whole collection, collected at once
+    collector = cc.CreditCollector(corpus, layout_priors=lp.LayoutPriors())
+    collector.collect_objects(types_to_collect=3)
+    collector.write_objects(path, "whole", writer=writer)
+    for suffix in TABLES:
+        whole = writer.read(path, "whole", suffix)
+        # categories are dictionary encoded in order of appearance, which differs once shards are merged
+        pd.testing.assert_frame_equal(writer.read(path, "collect", suffix), whole.sort_index(),
+                                      check_categorical=False)
+    assert sorted(writer.read(path, "collect", "timings").index) == sorted(collector.timing_table.index)
+    assert pd.read_csv(cc.stats_path(path, "collect"), index_col=0).index.equals(stats.index)
+    expected = collector.stats_table
+    for idx in ["Companies", "Requests"]:
+        assert stats.loc[idx, "Nb_parsed"] == expected.loc[idx, "Nb_parsed"]
+    # each shard learns its own layout priors
+    assert stats.loc["LayoutPriors", "Nb_lookups"] == nb_lookups
+    assert set(stats.index) == set(expected.index)
+
+
+def test_merge_missing_shard(tmp_path, corpus):
+    collector = cc.CreditCollector(corpus, shard=(1, 2))
+    collector.collect_objects(types_to_collect=3)
+    collector.write_objects(str(tmp_path), sh.shard_name("collect", (1, 2)))
+    with pytest.raises(FileNotFoundError):
+        cc.merge_shards(str(tmp_path), "collect", 2)
+
+
+def test_merge_tables_duplicates():
+    tables = [pd.DataFrame({"NbPages": [3]}, index=["Enquete_1.pdf"]),
+              pd.DataFrame({"NbPages": [4]}, index=["Enquete_1.pdf"])]
+    with pytest.raises(ValueError):
+        sh.merge_tables(tables)
+
+
+def test_latest_stats_path(tmp_path):
+    path = str(tmp_path)
+    assert cc.latest_stats_path(path, "collect_shard1of3") == ""
+    days = [datetime.date(2025, 12, 31), datetime.date(2026, 2, 1), datetime.date(2026, 1, 15)]
+    for name in ["collect_shard1of3", "collect_shard1of30", "other_collect_shard1of3"]:
+        for day in days:
+            pd.DataFrame().to_csv(cc.stats_path(path, name, day))
+    # a later day of another name starting alike is not taken
+    pd.DataFrame().to_csv(cc.stats_path(path, "collect_shard1of30", datetime.date(2026, 3, 1)))
+    open(os.path.join(path, "Collect_stats_collect_shard1of3_notes.csv"), "w").close()
+    assert cc.latest_stats_path(path, "collect_shard1of3") == cc.stats_path(path, "collect_shard1of3",
+                                                                           datetime.date(2026, 2, 1))
@@ -0,0 +1,61 @@
+import os
+import pickle
+import tarfile
+import zipfile
+
+import pytest
+
+import credit.credit_collector as cc
+import credit.sources as src
+
+
+@pytest.fixture(scope="module")
+def archives(tmp_path_factory, corpus, corpus_names):
+    """
+    Paths of zip, tar and compressed tar archives of the corpus
+    """
+    path = tmp_path_factory.mktemp("archives")
+    paths = [str(path / "corpus.zip"), str(path / "corpus.tar"), str(path / "corpus.tar.gz")]
+    with zipfile.ZipFile(paths[0], "w") as archive:
+        for name in corpus_names:
+            archive.write(os.path.join(corpus, name), name)
+    for fullpath, mode in zip(paths[1:], ["w", "w:gz"]):
+        with tarfile.open(fullpath, mode) as archive:
+            for name in corpus_names:
+                archive.add(os.path.join(corpus, name), name)
+    return paths
+
+
+def test_abstract_source():
+    with pytest.raises(TypeError):
+        src.DocumentSource("corpus")
+
+
+def test_archive_sources(archives, corpus, corpus_names):
+    directory = src.open_source(corpus)
+    assert isinstance(directory, src.DirectorySource)
+    for path, source_type in zip(archives, [src.ZipSource, src.TarSource, src.TarSource]):
+        source = src.open_source(path)
+        assert isinstance(source, source_type)
+        assert source.names() == corpus_names
+        assert source.sizes() == directory.sizes()
+        for name in corpus_names:
+            assert source.is_file(name)
+            assert source.read(name) == directory.read(name)
+            with source.open(name) as f:
+                assert f.read() == directory.read(name)
+            assert source.stat(name)[0] == directory.stat(name)[0]
+        assert not source.is_file("missing.pdf")
+        # a source sent to a worker process opens the archive again
+        assert pickle.loads(pickle.dumps(source)).read(corpus_names[0]) == directory.read(corpus_names[0])
+
+
+def test_collect_from_archives(archives, corpus):
+    reference = cc.CreditCollector(corpus)
+    reference.collect_objects(types_to_collect=3)
+    for path in archives:
+        collector = cc.CreditCollector(path)
+        collector.collect_objects(types_to_collect=3, workers=2)
+        assert collector.document_table.sort_index().equals(reference.document_table.sort_index())
+        assert collector.company_table.sort_index().equals(reference.company_table.sort_index())
+        assert collector.credit_request_table.sort_index().equals(reference.credit_request_table.sort_index())
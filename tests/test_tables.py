@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+import credit.tables as tb
+
+ROWS = [("Enquete_1.pdf", {"Language": "FR", "NbPages": 3}),
+        ("Enquete_2.pdf", {"Language": "PT"}),
+        ("Enquete_3.pdf", {"NbPages": 7, "FailureReason": "timeout"}),
+        # a row inserted again is updated, as with DataFrame.loc
+        ("Enquete_1.pdf", {"NbPages": 4, "FailureReason": ""}),
+        ("Enquete_4.pdf", {})]
+
+
+def loc_table(rows) -> pd.DataFrame:
+    # the tables were built cell by cell before rows were buffered
+    table = pd.DataFrame()
+    for idx, row in rows:
+        for column, value in row.items():
+            table.loc[idx, column] = value
+    return table
+
+
+def test_insert_row():
+    buffer = tb.TableBuffer()
+    for idx, row in ROWS:
+        buffer.insert_row(idx, row)
+    assert len(buffer) == 4
+    assert buffer.columns == ["Language", "NbPages", "FailureReason"]
+    frame = buffer.to_frame()
+    expected = loc_table(ROWS)
+    # a row without values is kept by the buffer, DataFrame.loc does not add it
+    assert list(frame.index) == list(expected.index) + ["Enquete_4.pdf"]
+    pd.testing.assert_frame_equal(frame.loc[expected.index], expected, check_dtype=False)
+    assert frame.loc["Enquete_4.pdf"].isna().all()
+    assert np.isnan(frame.loc["Enquete_2.pdf", "NbPages"])
+
+
+def test_frame_is_rebuilt():
+    buffer = tb.TableBuffer()
+    assert buffer.to_frame().empty
+    buffer.insert_row("Enquete_1.pdf", {"NbPages": 3})
+    frame = buffer.to_frame()
+    assert buffer.to_frame() is frame
+    buffer.insert_row("Enquete_2.pdf", {"NbPages": 5})
+    assert list(buffer.to_frame()["NbPages"]) == [3, 5]
+
+
+def test_insert_frame():
+    frame = loc_table(ROWS[:3])
+    buffer = tb.TableBuffer()
+    buffer.insert_frame(frame)
+    pd.testing.assert_frame_equal(buffer.to_frame(), frame)
+    # rows of another frame update the buffered rows
+    buffer.insert_frame(loc_table(ROWS[3:4]))
+    pd.testing.assert_frame_equal(buffer.to_frame(), loc_table(ROWS[:4]), check_dtype=False)
+
+
+def test_insert_row_in_frame():
+    table = pd.DataFrame()
+    buffer = tb.TableBuffer()
+    for idx, row in ROWS[:4]:
+        tb.insert_row(table, idx, row)
+        tb.insert_row(buffer, idx, row)
+    pd.testing.assert_frame_equal(table, loc_table(ROWS[:4]))
+    pd.testing.assert_frame_equal(buffer.to_frame(), table, check_dtype=False)
@@ -0,0 +1,158 @@
+import re
+
+import numpy as np
+import pytest
+from unidecode import unidecode
+
+import credit.credit_document as cd
+import credit.extraction_spec as es
+import credit.textutils as tu
+
+TEXTS = ["",
+         "Société Générale",
+         "Raison sociale : ÉTABLISSEMENTS DUPONT & FILS\nCapital social : 10 000 €\n",
+         "Œuvre de l'hôtel, Straße, Ærø\n\nfiançailles déjà reçues",
+         "Chiffre d’affaires : 1 250 k€ – ½ de l’exercice",
+         "Sociedade por quotas, São João, endereço: Rua Augusta n.º 3",
+         "ﬁnancement ﬂux 北京 Москва ✓ 😀",
+         "\tÁccent combinant, è,  espaces insécables\n"]
+
+
+def baseline_normalize(text: str) -> str:
+    # normalization of the text before the translation table: unidecode, then lower case
+    return unidecode(text).lower()
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_normalize(text):
+    assert tu.normalize(text) == baseline_normalize(text)
+    assert tu.normalize(text, compactform=True) == tu.compactify(baseline_normalize(text))
+
+
+def test_normalize_characters():
+    # characters of the precomputed table, and characters out of it, normalized on first use
+    for code in list(range(0x0000, 0x0800)) + list(range(0x1E00, 0x2200)) + list(range(0x4E00, 0x4E40)):
+        char = chr(code)
+        assert tu.normalize(char) == baseline_normalize(char), hex(code)
+        assert tu.normalize(char + "É" + char) == baseline_normalize(char + "É" + char), hex(code)
+    assert tu.normalize(None) is None
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_normalize_with_map(text):
+    normalized, offsets = tu.normalize_with_map(text)
+    assert normalized == baseline_normalize(text)
+    assert len(offsets) == len(normalized)
+    assert np.all(np.diff(offsets) >= 0)
+    # the normalized characters coming from a character are its normalized form
+    for position, char in enumerate(text):
+        assert "".join(normalized[k] for k in np.flatnonzero(offsets == position)) == baseline_normalize(char)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_text_index_forms(text):
+    index = tu.TextIndex(text)
+    assert index.text == text
+    assert index.normalized == baseline_normalize(text)
+    assert index.compact == tu.compactify(baseline_normalize(text))
+    assert index.nb_lines == text.count("\n") + 1
+    for start in range(len(text) + 1):
+        for end in range(start, len(text) + 1):
+            assert index.normalized_slice(start, end) == baseline_normalize(text[start:end])
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_text_index_positions(text):
+    index = tu.TextIndex(text)
+    compact = tu.compactify(baseline_normalize(text))
+    for cposition in range(len(compact)):
+        position = index.original_position_from_compact(cposition)
+        # the compact character comes from the character at position
+        assert len(tu.compactify(baseline_normalize(text[:position]))) <= cposition
+        assert cposition < len(tu.compactify(baseline_normalize(text[:position + 1])))
+        iline, position_in_line = index.line_position(position)
+        assert iline == text[:position].count("\n")
+        assert position_in_line == position - (text.rfind("\n", 0, position) + 1)
+    assert index.original_position_from_compact(len(compact)) == len(text)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_text_index_find_compact(text):
+    index = tu.TextIndex(text)
+    compact = tu.compactify(baseline_normalize(text))
+    for tag in ["societe", "capital social:", "d'affaires", "eur", "sao joao", "missing tag"]:
+        ctag = tu.compact_tag(tag)
+        cposition = compact.find(ctag)
+        position = index.find_compact(ctag)
+        if cposition < 0:
+            assert position == -1
+        else:
+            assert position == index.original_position_from_compact(cposition)
+            assert tu.compactify(baseline_normalize(text[position:])).startswith(ctag)
+
+
+def reference_occurrences(tag: str, text: str):
+    # positions of all occurrences of tag, overlapping ones included
+    return [position for position in range(len(text) - len(tag) + 1) if text.startswith(tag, position)]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_multi_tag_matcher(seed):
+    rng = np.random.default_rng(seed)
+    # a small alphabet, so that tags overlap, are prefixes of one another and occur many times
+    text = "".join(rng.choice(list("abc:"), size=200))
+    tags = tuple("".join(rng.choice(list("abc:"), size=rng.integers(1, 5))) for _ in range(12)) + ("",)
+    matcher = tu.MultiTagMatcher(tags)
+    assert matcher.tags == tuple(sorted(set(tags) - {""}))
+    expected = {tag: reference_occurrences(tag, text) for tag in matcher.tags}
+    assert matcher.first_occurrences(text) == {tag: positions[0] for tag, positions in expected.items() if positions}
+    assert matcher.all_occurrences(text) == {tag: positions for tag, positions in expected.items() if positions}
+
+
+def test_multi_tag_matcher_special_characters():
+    matcher = tu.MultiTagMatcher(("c.a(k)", "c.a", "(*)", "|"))
+    text = "ca(k) c.a(k) (*) a|b"
+    assert matcher.all_occurrences(text) == {tag: reference_occurrences(tag, text) for tag in matcher.tags}
+    assert tu.MultiTagMatcher(("",)).first_occurrences(text) == {}
+
+
+def baseline_search(ntag: str, ntext: str, space_sensitive: bool, max_spaces_number: int):
+    # search of search_for_tag before tag patterns were compiled, on normalized tag and text
+    if len(ntext) < len(ntag):
+        return -1, ""
+    if space_sensitive:
+        return ntext.find(ntag), ntag
+    if max_spaces_number == 1:
+        pattern = "".join([f"{c}\\s?" for c in ntag])
+    else:
+        pattern = "".join([f"{c}\\s{{0,{max_spaces_number}}}" for c in ntag])
+    res = re.search(pattern + "\\s*:?", ntext)
+    if res is None:
+        return -1, ""
+    istart, iend = res.span()
+    return istart, ntext[istart:iend]
+
+
+@pytest.mark.parametrize("space_sensitive, max_spaces_number", [(True, 1), (False, 1), (False, 3)])
+def test_tag_matcher(corpus, corpus_names, space_sensitive, max_spaces_number):
+    tags = list(dict.fromkeys(tag for section in es.get_credit_report_spec().sections
+                              for tags in section.fields.values() for tag in tags))
+    for name in corpus_names:
+        document = cd.CreditDocument(path=corpus, name=name)
+        document.locate_sections()
+        for section in document.sections:
+            if not section.is_located:
+                continue
+            ntext = section.normalized_text
+            for tag in tags:
+                ntag = tu.normalize_tag(tag)
+                expected = baseline_search(ntag, ntext, space_sensitive, max_spaces_number)
+                assert tu.TagMatcher(ntag, space_sensitive, max_spaces_number).search(ntext) == expected
+                assert tu.search_for_tag(tag, section.full_text, True, space_sensitive, max_spaces_number) == expected
+
+
+def test_tag_matcher_special_characters():
+    # tags are matched literally, whatever characters they hold
+    assert tu.search_for_tag("C.A. (K)", "ca  k   c. a. (k) : 12", space_sensitive=False) == (8, "c. a. (k) :")
+    assert tu.search_for_tag("n.*", "nom : n.* 3", space_sensitive=False) == (6, "n.* ")
+    assert tu.search_for_tag("[x]", "x [x]", space_sensitive=True) == (2, "[x]")
@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+import credit.credit_collector as cc
+import credit.timing as tm
+
+
+def test_stage_timer():
+    timer = tm.StageTimer()
+    with timer.stage("locate_sections"):
+        time.sleep(0.02)
+        # time of an inner stage is not counted in the outer one
+        with timer.stage("extract"):
+            time.sleep(0.05)
+    with timer.stage("extract"):
+        time.sleep(0.01)
+    assert 0.06 <= timer.wall("extract") < 0.5
+    assert 0.02 <= timer.wall("locate_sections") < 0.06
+    assert timer.cpu("extract") < timer.wall("extract")
+    assert timer.wall("parse") == 0.0
+    row = timer.to_row()
+    assert [column for column in row.keys()][:2 * len(tm.STAGES)] == \
+        [f"{stage}_{clock}" for stage in tm.STAGES for clock in ["wall", "cpu"]]
+    assert row["total_wall"] == timer.wall("extract") + timer.wall("locate_sections")
+    assert row["SlowestStage"] == "extract"
+    assert tm.StageTimer().to_row()["SlowestStage"] == ""
+
+
+def test_aggregate_timings():
+    timings = pd.DataFrame({"extract_wall": [1.0, 3.0, 2.0], "extract_cpu": [0.5, 1.0, 1.5],
+                            "SlowestStage": ["extract"] * 3}, index=["a.pdf", "b.pdf", "c.pdf"])
+    stats = tm.aggregate_timings(timings)
+    assert list(stats.index) == ["Stage_extract"]
+    assert stats.loc["Stage_extract", "Wall_total"] == 6.0
+    assert stats.loc["Stage_extract", "Cpu_total"] == 3.0
+    assert stats.loc["Stage_extract", "Wall_p50"] == 2.0
+    assert stats.loc["Stage_extract", "Wall_max"] == 3.0
+    assert tm.aggregate_timings(pd.DataFrame()).empty
+
+
+def test_collector_timings(corpus, corpus_names):
+    collector = cc.CreditCollector(corpus)
+    collector.collect_objects(types_to_collect=3)
+    timings = collector.timing_table
+    assert sorted(timings.index) == corpus_names
+    for stage in tm.STAGES:
+        assert (timings[f"{stage}_wall"] >= 0).all(), stage
+    # every document is opened, extracted, and its sections located
+    for stage in ["open", "extract", "locate_sections", "extract_fields"]:
+        assert (timings[f"{stage}_wall"] > 0).all(), stage
+    stage_walls = timings[[f"{stage}_wall" for stage in tm.STAGES]].sum(axis=1)
+    np.testing.assert_allclose(timings["total_wall"], stage_walls)
+    stats = collector.stats_table
+    for stage in tm.STAGES + ["total"]:
+        np.testing.assert_allclose(stats.loc[f"Stage_{stage}", "Wall_total"], timings[f"{stage}_wall"].sum())
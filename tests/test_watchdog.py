@@ -0,0 +1,97 @@
+import os
+import time
+
+import pytest
+
+import credit.credit_collector as cc
+import credit.watchdog as wd
+
+
+def slow_page(page_number: int, seconds: float):
+    # a page extraction stuck in the pdf reader, which swallows the errors it meets
+    with wd.page_time_limit(page_number):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            try:
+                time.sleep(0.01)
+            except Exception:
+                pass
+    return page_number
+
+
+def failing_task(message: str):
+    raise ValueError(message)
+
+
+def test_task_results():
+    with wd.WatchdogExecutor(max_workers=2, budget=wd.TimeBudget(document_seconds=10.0)) as executor:
+        futures = [executor.submit(pow, 2, n) for n in range(8)]
+        assert [future.result() for future in futures] == [2 ** n for n in range(8)]
+        assert executor.nb_killed == 0
+
+
+def test_task_errors():
+    with wd.WatchdogExecutor(budget=wd.TimeBudget(document_seconds=10.0)) as executor:
+        with pytest.raises(wd.DocumentFailure, match="ValueError: bad page"):
+            executor.submit(failing_task, "bad page").result()
+        with pytest.raises(wd.DocumentFailure, match="worker died with exit code 3"):
+            executor.submit(os._exit, 3).result()
+        # the worker is replaced
+        assert executor.submit(pow, 2, 3).result() == 8
+        assert executor.nb_killed == 0
+
+
+def test_document_timeout():
+    with wd.WatchdogExecutor(max_workers=2, budget=wd.TimeBudget(document_seconds=0.5)) as executor:
+        start = time.monotonic()
+        stuck = executor.submit(time.sleep, 30)
+        other = executor.submit(pow, 2, 5)
+        with pytest.raises(wd.DocumentTimeout, match="document exceeded the budget of 0.5s"):
+            stuck.result()
+        assert time.monotonic() - start < 5
+        assert other.result() == 32
+        assert executor.nb_killed == 1
+        # the killed worker is replaced
+        assert [executor.submit(pow, 3, n).result() for n in range(3)] == [1, 3, 9]
+
+
+def test_page_timeout():
+    budget = wd.TimeBudget(document_seconds=10.0, page_seconds=0.2)
+    with wd.WatchdogExecutor(budget=budget) as executor:
+        assert executor.submit(slow_page, 2, 0.05).result() == 2
+        with pytest.raises(wd.DocumentFailure, match="page 3 exceeded the page budget of 0.2s") as error:
+            executor.submit(slow_page, 3, 30).result()
+        assert not isinstance(error.value, wd.DocumentTimeout)
+        # the worker goes on with the next task, with its page budget
+        assert executor.submit(slow_page, 4, 0.05).result() == 4
+        with pytest.raises(wd.DocumentFailure, match="page 5 exceeded"):
+            executor.submit(slow_page, 5, 30).result()
+        assert executor.nb_killed == 0
+
+
+def test_no_page_budget():
+    # outside watchdog workers, page_time_limit has no effect
+    assert slow_page(1, 0.3) == 1
+
+
+def test_collect_with_page_timeout(corpus, corpus_names):
+    # pages taking more than a microsecond to extract fail their document, which is recorded as failed
+    collector = cc.CreditCollector(corpus, time_budget=wd.TimeBudget(document_seconds=60.0, page_seconds=1e-6))
+    collector.collect_objects(types_to_collect=3)
+    documents = collector.document_table
+    assert sorted(documents.index) == corpus_names
+    assert documents["FailureReason"].str.match(r"page \d+ exceeded the page budget").all()
+    assert len(collector.company_table) == 0
+
+
+def test_collect_with_time_budget(corpus, corpus_names):
+    # documents within their budget are collected as without a budget
+    collector = cc.CreditCollector(corpus, time_budget=wd.TimeBudget(document_seconds=60.0, page_seconds=10.0))
+    collector.collect_objects(types_to_collect=3, workers=2)
+    reference = cc.CreditCollector(corpus)
+    reference.collect_objects(types_to_collect=3)
+    documents = collector.document_table
+    assert (documents["FailureReason"] == "").all()
+    assert documents.drop(columns=["FailureReason"]).equals(reference.document_table)
+    assert collector.company_table.equals(reference.company_table)
+    assert collector.credit_request_table.equals(reference.credit_request_table)